@@ -118,6 +118,9 @@ class TestClient:
                 resp = make_error(
                     "Internal error", id=req.id, code=-32603, data=str(exc)
                 )
+        if req.id is None:
+            # notifications never get a reply
+            return
         self.client.publish(f"espdisplay/{self.uuid}/client", resp)
 
     # -------- handshake --------
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from internal_states.internal_state_handler import InternalStateHandler
+from models.models import (
+    ComputedState,
+    FullConfig,
+    InternalState,
+    StoredInternalState,
+    build_computed_order,
+)
+from utils.expressions import Expression, compile_expression
+from utils.utils import log_task_failure
+
+
+class ComputedNode:
+    __slots__ = ("state", "expression", "position")
+
+    def __init__(self, state: InternalState, expression: Expression, position: int):
+        self.state = state
+        self.expression = expression
+        self.position = position  # index in topological order
+
+
+def computed_value(value: Any) -> float | bool | str:
+    return value if isinstance(value, (bool, str)) else float(value)
+
+
+class ComputedStates:
+    """
+    Keeps `computed` internal states up to date.
+
+    Computed states form a DAG over the states they read. A write to any
+    state recomputes only the computed states downstream of it, in
+    topological order, and writes back the ones whose value changed in a
+    single bulk write.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._nodes: Dict[str, ComputedNode] = {}
+        self._dependents: Dict[str, Set[str]] = {}  # state -> computed readers
+        self._values: Dict[str, Any] = {}  # last value written per computed state
+
+    def configure(self, config: FullConfig) -> None:
+        computed = {
+            state.name: (state, compile_expression(state.definition.expression))
+            for state in config.internal_states.states
+            if isinstance(state.definition, ComputedState)
+        }
+        order = build_computed_order(
+            {name: expression.deps for name, (_, expression) in computed.items()}
+        )
+        self._nodes = {
+            name: ComputedNode(*computed[name], position)
+            for position, name in enumerate(order)
+        }
+        self._dependents = {}
+        for name, node in self._nodes.items():
+            for dep in node.expression.deps:
+                self._dependents.setdefault(dep, set()).add(name)
+        self._values = {
+            name: value for name, value in self._values.items() if name in self._nodes
+        }
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def affected(self, changed: Iterable[str]) -> List[ComputedNode]:
+        """Computed states downstream of `changed`, in topological order."""
+        seen: Set[str] = set()
+        stack = list(changed)
+        while stack:
+            for name in self._dependents.get(stack.pop(), ()):
+                if name not in seen:
+                    seen.add(name)
+                    stack.append(name)
+        return sorted((self._nodes[name] for name in seen), key=lambda n: n.position)
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        if self._loop is None:
+            return
+        changed = [
+            state.name
+            for state in states
+            if state.name in self._dependents
+            # our own writes were propagated when they were computed
+            and not (
+                state.name in self._values and self._values[state.name] == state.value
+            )
+        ]
+        if changed:
+            self._loop.call_soon_threadsafe(self._schedule, changed)
+
+    def _schedule(self, changed: List[str]) -> None:
+        task = asyncio.ensure_future(self.recompute(changed))
+        task.add_done_callback(log_task_failure("Recomputing states failed"))
+
+    async def recompute_all(self) -> None:
+        await self._evaluate(sorted(self._nodes.values(), key=lambda n: n.position))
+
+    async def recompute(self, changed: Iterable[str]) -> None:
+        await self._evaluate(self.affected(changed))
+
+    async def _evaluate(self, nodes: List[ComputedNode]) -> None:
+        if not nodes:
+            return
+        names = {dep for node in nodes for dep in node.expression.deps}
+        names.update(node.state.name for node in nodes)
+        stored = await InternalStateHandler().get_many(list(names))
+        values = {name: state.value for name, state in stored.items()}
+
+        writes: List[StoredInternalState] = []
+        for node in nodes:
+            name = node.state.name
+            try:
+                value = computed_value(node.expression(values))
+            except Exception as exc:
+                logging.warning(f"Computed state '{name}' not updated: {exc!r}")
+                continue
+            self._values[name] = value
+            if values.get(name) == value:
+                continue
+            # later nodes read the fresh value
+            values[name] = value
+            writes.append(node.state.to_stored_internal_state(value))
+        if writes:
+            await InternalStateHandler().bulk_set(writes)
@@ -1,15 +1,35 @@
 import asyncio
-from typing import List, Optional
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
 import aiosqlite
 from models.models import StoredInternalState
 from utils.utils import singleton
 
+type StateListener = Callable[[List[StoredInternalState]], None]
+
 
 @singleton
 class InternalStateHandler:
     def __init__(self, path: str = "internal_state.db"):
         self.path = path
         self._initialized = False
+        self._listeners: List[StateListener] = []
+
+    def add_listener(self, listener: StateListener) -> None:
+        """Register a callback invoked with every batch of written states."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: StateListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, states: List[StoredInternalState]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(states)
+            except Exception:
+                logging.exception("Internal state listener failed")
 
     async def _init(self):
         if self._initialized:
@@ -39,6 +59,7 @@ class InternalStateHandler:
                 (state.name, value),
             )
             await db.commit()
+        self._notify([state])
 
     async def get(self, name: str) -> Optional[StoredInternalState]:
         await self._init()
@@ -51,6 +72,33 @@ class InternalStateHandler:
             return None
         return StoredInternalState.model_validate_json(row[0])
 
+    async def get_many(self, names: Iterable[str]) -> Dict[str, StoredInternalState]:
+        """Fetch several states with a single query; missing names are omitted."""
+        await self._init()
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        placeholders = ",".join("?" * len(names))
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute(
+                f"SELECT key, value FROM internal_state WHERE key IN ({placeholders})",
+                names,
+            )
+            rows = await cursor.fetchall()
+        return {
+            key: StoredInternalState.model_validate_json(value) for key, value in rows
+        }
+
+    async def snapshot(self) -> Dict[str, StoredInternalState]:
+        """Fetch every stored state with a single query."""
+        await self._init()
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute("SELECT key, value FROM internal_state")
+            rows = await cursor.fetchall()
+        return {
+            key: StoredInternalState.model_validate_json(value) for key, value in rows
+        }
+
     async def delete(self, key: str):
         await self._init()
         async with aiosqlite.connect(self.path) as db:
@@ -80,6 +128,7 @@ class InternalStateHandler:
                         (state.name, value),
                     )
                 await db.commit()
+        self._notify(states)
 
     async def set_if_not_exists(self, state: StoredInternalState):
         """Insert a state only if the key does not exist."""
@@ -114,15 +163,25 @@ class InternalStateHandler:
 
 @singleton
 class SyncInternalStateHandler:
+    """
+    Blocking wrapper for threads without a running loop (MQTT callbacks,
+    publisher timers). Each thread drives its own event loop, so calls
+    from different threads never share one.
+    """
+
     def __init__(self):
         self._async = InternalStateHandler()
-        self._loop = None
+        self._local = threading.local()
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._lock = threading.Lock()
 
     def _run(self, coro):
-        if self._loop is None:
-            self._loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self._loop)
-        return self._loop.run_until_complete(coro)
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+            with self._lock:
+                self._loops.append(loop)
+        return loop.run_until_complete(coro)
 
     def set(self, state: StoredInternalState):
         return self._run(self._async.set(state))
@@ -130,6 +189,12 @@ class SyncInternalStateHandler:
     def get(self, name: str) -> Optional[StoredInternalState]:
         return self._run(self._async.get(name))
 
+    def get_many(self, names: Iterable[str]) -> Dict[str, StoredInternalState]:
+        return self._run(self._async.get_many(names))
+
+    def snapshot(self) -> Dict[str, StoredInternalState]:
+        return self._run(self._async.snapshot())
+
     def delete(self, key: str):
         return self._run(self._async.delete(key))
 
@@ -146,6 +211,8 @@ class SyncInternalStateHandler:
         return self._run(self._async.bulk_set_if_not_exists(states))
 
     def close(self):
-        if self._loop is not None:
-            self._loop.close()
-            self._loop = None
+        with self._lock:
+            loops, self._loops = self._loops, []
+        for loop in loops:
+            loop.close()
+        self._local = threading.local()
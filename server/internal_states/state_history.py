@@ -0,0 +1,305 @@
+import logging
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from models.models import FullConfig, HistoryConfig, StoredInternalState
+from storage.config_diff import ConfigDiff
+from utils.utils import AsyncLoopBase, singleton
+
+MINUTE = 60.0
+HOUR = 3600.0
+RESOLUTIONS = ("raw", "minute", "hour")
+
+_MAGIC = b"ESH1"
+_HEADER = struct.Struct("<4sI")
+_RING_HEADER = struct.Struct("<IIIB")
+_BUCKET = struct.Struct("<5d")
+
+
+class Ring:
+    """
+    Fixed-size ring of rows backed by a single `array("d")`. Each row is a
+    timestamp followed by `width` values, stored interleaved.
+    """
+
+    def __init__(self, size: int, width: int):
+        self.size = size
+        self.width = width
+        self.stride = width + 1
+        self.data = array("d", bytes(8 * size * self.stride))
+        self.start = 0
+        self.count = 0
+
+    def append(self, row: Sequence[float]) -> None:
+        index = (self.start + self.count) % self.size
+        if self.count == self.size:
+            self.start = (self.start + 1) % self.size
+        else:
+            self.count += 1
+        offset = index * self.stride
+        self.data[offset : offset + self.stride] = array("d", row)
+
+    def rows(self) -> Iterator[Tuple[float, ...]]:
+        """Yield rows oldest first."""
+        for i in range(self.count):
+            offset = ((self.start + i) % self.size) * self.stride
+            yield tuple(self.data[offset : offset + self.stride])
+
+    def oldest(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return self.data[self.start * self.stride]
+
+    def to_bytes(self) -> bytes:
+        header = _RING_HEADER.pack(self.size, self.start, self.count, self.width)
+        return header + self.data.tobytes()
+
+    @classmethod
+    def from_bytes(cls, raw: memoryview) -> Tuple["Ring", int]:
+        size, start, count, width = _RING_HEADER.unpack_from(raw)
+        ring = cls(size, width)
+        length = 8 * size * ring.stride
+        offset = _RING_HEADER.size
+        ring.data = array("d", raw[offset : offset + length].tobytes())
+        ring.start, ring.count = start, count
+        return ring, offset + length
+
+    def resized(self, size: int) -> "Ring":
+        """Copy into a ring of a new size, keeping the newest rows."""
+        ring = Ring(size, self.width)
+        for row in self.rows():
+            ring.append(row)
+        return ring
+
+
+class Bucket:
+    """Open aggregation bucket: start, sum, count, min, max."""
+
+    def __init__(self, start: float = 0.0):
+        self.start = start
+        self.total = 0.0
+        self.count = 0.0
+        self.low = float("inf")
+        self.high = float("-inf")
+
+    def add(self, total: float, count: float, low: float, high: float) -> None:
+        self.total += total
+        self.count += count
+        self.low = min(self.low, low)
+        self.high = max(self.high, high)
+
+    def row(self) -> Tuple[float, float, float, float]:
+        return (self.start, self.total / self.count, self.low, self.high)
+
+    def pack(self) -> bytes:
+        return _BUCKET.pack(self.start, self.total, self.count, self.low, self.high)
+
+    @classmethod
+    def unpack(cls, raw: memoryview) -> "Bucket":
+        bucket = cls()
+        bucket.start, bucket.total, bucket.count, bucket.low, bucket.high = (
+            _BUCKET.unpack_from(raw)
+        )
+        return bucket
+
+
+class StateSeries:
+    """
+    History of one number state in three tiers: raw samples, 1-minute and
+    1-hour aggregates (avg, min, max). Closed buckets roll into the next tier.
+    """
+
+    def __init__(self, config: HistoryConfig):
+        self.raw = Ring(config.raw_size, 1)
+        self.minute = Ring(config.minute_size, 3)
+        self.hour = Ring(config.hour_size, 3)
+        self.minute_bucket = Bucket()
+        self.hour_bucket = Bucket()
+
+    def resize(self, config: HistoryConfig) -> None:
+        if self.raw.size != config.raw_size:
+            self.raw = self.raw.resized(config.raw_size)
+        if self.minute.size != config.minute_size:
+            self.minute = self.minute.resized(config.minute_size)
+        if self.hour.size != config.hour_size:
+            self.hour = self.hour.resized(config.hour_size)
+
+    def record(self, timestamp: float, value: float) -> None:
+        self.raw.append((timestamp, value))
+        start = timestamp - timestamp % MINUTE
+        if self.minute_bucket.count and start != self.minute_bucket.start:
+            self._close_minute()
+        if not self.minute_bucket.count:
+            self.minute_bucket = Bucket(start)
+        self.minute_bucket.add(value, 1, value, value)
+
+    def _close_minute(self) -> None:
+        closed = self.minute_bucket
+        self.minute.append(closed.row())
+        start = closed.start - closed.start % HOUR
+        if self.hour_bucket.count and start != self.hour_bucket.start:
+            self.hour.append(self.hour_bucket.row())
+            self.hour_bucket = Bucket()
+        if not self.hour_bucket.count:
+            self.hour_bucket = Bucket(start)
+        self.hour_bucket.add(closed.total, closed.count, closed.low, closed.high)
+        self.minute_bucket = Bucket()
+
+    def _tier(self, resolution: str) -> Tuple[Ring, Optional[Bucket]]:
+        if resolution == "raw":
+            return self.raw, None
+        if resolution == "minute":
+            return self.minute, self.minute_bucket
+        return self.hour, self.hour_bucket
+
+    def pick_resolution(self, start: float) -> str:
+        """Finest tier that still reaches back to `start`."""
+        for resolution in RESOLUTIONS:
+            ring, _ = self._tier(resolution)
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= start:
+                return resolution
+        # nothing reaches that far back, fall back to the longest tier with data
+        for resolution in reversed(RESOLUTIONS):
+            if self._tier(resolution)[0].count:
+                return resolution
+        return "raw"
+
+    def query(
+        self, start: float, end: float, resolution: Optional[str] = None
+    ) -> Tuple[str, List[Tuple[float, ...]]]:
+        resolution = resolution or self.pick_resolution(start)
+        ring, bucket = self._tier(resolution)
+        points = [row for row in ring.rows() if start <= row[0] <= end]
+        if bucket is not None and bucket.count and start <= bucket.start <= end:
+            points.append(bucket.row())
+        return resolution, points
+
+    def pack(self) -> bytes:
+        return b"".join(
+            (
+                self.raw.to_bytes(),
+                self.minute.to_bytes(),
+                self.hour.to_bytes(),
+                self.minute_bucket.pack(),
+                self.hour_bucket.pack(),
+            )
+        )
+
+    @classmethod
+    def unpack(cls, raw: memoryview) -> Tuple["StateSeries", int]:
+        series = cls.__new__(cls)
+        offset = 0
+        for tier in ("raw", "minute", "hour"):
+            ring, used = Ring.from_bytes(raw[offset:])
+            setattr(series, tier, ring)
+            offset += used
+        series.minute_bucket = Bucket.unpack(raw[offset:])
+        series.hour_bucket = Bucket.unpack(raw[offset + _BUCKET.size :])
+        return series, offset + 2 * _BUCKET.size
+
+
+@singleton
+class StateHistory:
+    """
+    In-memory time series for states that declare `history`, persisted as a
+    compact binary file next to `internal_state.db`.
+    """
+
+    def init(self, path: str | Path = "state_history.bin") -> None:
+        self.path = Path(path)
+        self.series: Dict[str, StateSeries] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def configure(self, config: FullConfig, diff: Optional[ConfigDiff] = None) -> None:
+        """Create series for newly tracked states, resize or drop the rest."""
+        if diff is not None and not diff.full and not diff.states:
+            return
+        tracked = {
+            state.name: state.history
+            for state in config.internal_states.states
+            if state.history is not None
+        }
+        with self._lock:
+            for name in list(self.series):
+                if name not in tracked:
+                    del self.series[name]
+            for name, history in tracked.items():
+                if name in self.series:
+                    self.series[name].resize(history)
+                else:
+                    self.series[name] = StateSeries(history)
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        """InternalStateHandler listener recording every tracked value."""
+        now = time.time()
+        with self._lock:
+            for state in states:
+                series = self.series.get(state.name)
+                if series is not None and isinstance(state.value, (int, float)):
+                    series.record(now, float(state.value))
+
+    def query(
+        self,
+        name: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        resolution: Optional[str] = None,
+    ) -> Tuple[str, List[Tuple[float, ...]]]:
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution}")
+        with self._lock:
+            series = self.series.get(name)
+            if series is None:
+                raise KeyError(f"State {name} keeps no history")
+            return series.query(
+                start if start is not None else 0.0,
+                end if end is not None else time.time(),
+                resolution,
+            )
+
+    def save(self) -> None:
+        with self._lock:
+            chunks = [_HEADER.pack(_MAGIC, len(self.series))]
+            for name, series in self.series.items():
+                encoded = name.encode("utf-8")
+                chunks.append(struct.pack("<H", len(encoded)) + encoded)
+                chunks.append(series.pack())
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_bytes(b"".join(chunks))
+        tmp.replace(self.path)
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        raw = memoryview(self.path.read_bytes())
+        try:
+            magic, count = _HEADER.unpack_from(raw)
+            if magic != _MAGIC:
+                raise ValueError("bad magic")
+            offset = _HEADER.size
+            series: Dict[str, StateSeries] = {}
+            for _ in range(count):
+                (length,) = struct.unpack_from("<H", raw, offset)
+                offset += 2
+                name = bytes(raw[offset : offset + length]).decode("utf-8")
+                offset += length
+                series[name], used = StateSeries.unpack(raw[offset:])
+                offset += used
+        except (struct.error, ValueError) as exc:
+            logging.warning(f"Ignoring unreadable state history {self.path}: {exc}")
+            return
+        with self._lock:
+            self.series = series
+
+
+class HistoryPersister(AsyncLoopBase):
+    """Periodically flushes StateHistory to disk."""
+
+    def on_iteration(self):
+        StateHistory().save()
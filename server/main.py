@@ -1,5 +1,7 @@
 import os
 
+from dotenv import load_dotenv
+
 if os.path.exists("local.env"):
     ENV_FILE = "local.env"
 elif os.path.exists("prod.env"):
@@ -9,16 +11,28 @@ elif os.path.exists(".env"):
 else:
     ENV_FILE = None
 
+# before the project imports: modules such as storage_manager read the
+# environment when they are imported
+load_dotenv(ENV_FILE)
+
 import asyncio
 import logging
-import time
-from dotenv import load_dotenv
+from pathlib import Path
+from typing import List
+from internal_states.internal_state_handler import InternalStateHandler
+from internal_states.state_history import HistoryPersister, StateHistory
 from protocol.mqtt import MQTT
 from rpc.rpc_handler import RPCHandler
 from protocol.session_handler import SessionHandler
+from state_publisher.frame_publisher import FramePublisher
+from state_publisher.screen_documents import ScreenDocuments
+from state_publisher.state_publisher import StatePublisher
 from state_scheduler.state_scheduler import StateScheduler
-
-load_dotenv(ENV_FILE)
+from storage.asset_store import AssetStore
+from storage.config_manager import ConfigError, ConfigManager
+from storage.config_versions import ConfigVersions
+from storage.file_watcher import FileWatcher
+from storage.template_manager import TemplateError, TemplateManager
 
 MQTT_SERVER = os.environ.get("MQTT_SERVER", "localhost")
 MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
@@ -32,6 +46,11 @@ assert BASE_API_URL, "BASE_API_URL is a required environment field!"
 assert LONG_LIVED_TOKEN, "LONG_LIVED_TOKEN is a required environment field!"
 
 BASE_LOGGING_LEVEL = os.environ.get("BASE_LOGGING_LEVEL", "INFO")
+HISTORY_SAVE_INTERVAL = float(os.environ.get("HISTORY_SAVE_INTERVAL", "60"))
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", "1"))
+CONFIG_VERSIONS = int(os.environ.get("CONFIG_VERSIONS", "8"))
+ASSETS_DIR = Path(os.environ.get("ASSETS_DIR", "assets"))
+OUTBOX_TTL = float(os.environ.get("OUTBOX_TTL", "3600"))
 
 logging.basicConfig(
     level=getattr(logging, BASE_LOGGING_LEVEL),  # Minimum log level
@@ -40,6 +59,27 @@ logging.basicConfig(
 )
 
 
+def watched_paths() -> List[Path]:
+    return [*ConfigManager().watch_paths(), *TemplateManager().watch_paths()]
+
+
+def reload_changed_file(path: Path, watcher: FileWatcher) -> None:
+    """Hot-reload the config (or one of its fragments) or templates.yaml."""
+    for manager, error in (
+        (ConfigManager(), ConfigError),
+        (TemplateManager(), TemplateError),
+    ):
+        if path not in manager.watch_paths():
+            continue
+        try:
+            manager.reload()
+            logging.info(f"Reloaded {path.name}")
+        except error as exc:
+            logging.error(f"Keeping the previous {path.name}: {exc}")
+    # fragments may have been added to or removed from the include list
+    watcher.set_paths(watched_paths())
+
+
 def main():
     logging.info(f"Starting ESP Display Server on MQTT({MQTT_SERVER}:{MQTT_PORT})")
 
@@ -50,16 +90,67 @@ def main():
     logging.info("Started MQTT client")
 
     SessionHandler(client)
-    RPCHandler().init(client)
+    RPCHandler().init(client, outbox_ttl=OUTBOX_TTL)
     RPCHandler().update_subscriptions()
     logging.info("Started Session Handler")
 
-    StateScheduler(BASE_API_URL, LONG_LIVED_TOKEN).start()
+    ConfigVersions().init(ConfigManager().get(), keep=CONFIG_VERSIONS)
+    # before the publisher's listener, which pushes the recorded update
+    ConfigManager().add_reload_listener(ConfigVersions().on_config_reload)
+    AssetStore().init()
+    if ASSETS_DIR.is_dir():
+        count = AssetStore().import_directory(ASSETS_DIR)
+        logging.info(f"Imported {count} assets from {ASSETS_DIR}")
+    publisher = StatePublisher()
+    publisher.init()
+    ConfigManager().add_reload_listener(publisher.on_config_reload)
+    TemplateManager().add_reload_listener(publisher.on_config_reload)
+    InternalStateHandler().add_listener(publisher.on_states_changed)
+    documents = ScreenDocuments()
+    documents.init()
+    ConfigManager().add_reload_listener(documents.on_config_reload)
+    TemplateManager().add_reload_listener(documents.on_config_reload)
+    InternalStateHandler().add_listener(documents.on_states_changed)
+    frames = FramePublisher()
+    frames.init()
+    ConfigManager().add_reload_listener(frames.on_config_reload)
+    TemplateManager().add_reload_listener(frames.on_config_reload)
+    InternalStateHandler().add_listener(frames.on_states_changed)
+    logging.info("Started State Publisher")
+
+    history = StateHistory()
+    history.init(Path(InternalStateHandler().path).with_name("state_history.bin"))
+    history.configure(ConfigManager().get())
+    ConfigManager().add_reload_listener(history.configure)
+    InternalStateHandler().add_listener(history.on_states_changed)
+    persister = HistoryPersister(HISTORY_SAVE_INTERVAL)
+    loop.call_soon(persister.start)
+    logging.info("Started State History")
+
+    scheduler = StateScheduler(BASE_API_URL, LONG_LIVED_TOKEN)
+    scheduler_task = loop.create_task(scheduler.start())
+    logging.info("Started State Scheduler")
+
+    watcher = FileWatcher(
+        watched_paths(),
+        lambda path: loop.call_soon_threadsafe(reload_changed_file, path, watcher),
+        interval=CONFIG_POLL_INTERVAL,
+    )
+    watcher.start()
     try:
-        while True:
-            time.sleep(0.1)
+        loop.run_forever()
     except KeyboardInterrupt:
         logging.info("Shutting Down...")
+        watcher.stop()
+        scheduler_task.cancel()
+        scheduler.services.close()
+        scheduler.timers.stop()
+        loop.run_until_complete(persister.stop())
+        history.save()
+        publisher.stop()
+        frames.stop()
+        RPCHandler().stop()
+        AssetStore().close()
         client.stop()
 
 
@@ -1,6 +1,25 @@
 from __future__ import annotations
-from typing import Annotated, List, Optional, Literal, Union
-from pydantic import BaseModel, Field, StringConstraints, model_validator
+from types import MappingProxyType
+from typing import (
+    Annotated,
+    Dict,
+    FrozenSet,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Union,
+)
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PrivateAttr,
+    StringConstraints,
+    model_validator,
+)
+
+from utils.expressions import as_expression, compile_expression
 
 
 # -------------------------------------
@@ -40,7 +59,44 @@ class CallbackState(BaseModel):
     callback_id: str
 
 
-StateDefinition = Union[NumberState, BooleanState, EnumState, CallbackState]
+class ComputedState(BaseModel):
+    """A state derived from other internal states, e.g. `avg(a, b, c)`."""
+
+    type: Literal["computed"] = "computed"
+    expression: str
+    default: Union[bool, float, str] = 0.0  # until first computed
+
+    @model_validator(mode="after")
+    def validate_expression(self):
+        compile_expression(self.expression)
+        return self
+
+
+StateDefinition = Union[
+    NumberState, BooleanState, EnumState, CallbackState, ComputedState
+]
+
+
+def build_computed_order(computed: Dict[str, FrozenSet[str]]) -> List[str]:
+    """
+    Topologically sort computed states (name -> states it reads) so every
+    state comes after the computed states it depends on.
+    """
+    waiting = {
+        name: {dep for dep in deps if dep in computed}
+        for name, deps in computed.items()
+    }
+    order = [name for name, deps in waiting.items() if not deps]
+    for name in order:
+        for other, deps in waiting.items():
+            if name in deps:
+                deps.discard(name)
+                if not deps:
+                    order.append(other)
+    if len(order) != len(computed):
+        loop = sorted(name for name in computed if name not in order)
+        raise ValueError(f"Computed states depend on each other: {', '.join(loop)}")
+    return order
 
 
 # -------------------------------------
@@ -48,10 +104,38 @@ StateDefinition = Union[NumberState, BooleanState, EnumState, CallbackState]
 # -------------------------------------
 
 
+class HistoryConfig(BaseModel):
+    """Ring buffer sizes for each history tier (raw samples, 1m and 1h buckets)."""
+
+    raw_size: int = Field(default=360, gt=0)
+    minute_size: int = Field(default=1440, gt=0)
+    hour_size: int = Field(default=720, gt=0)
+
+
 class InternalState(BaseModel):
     name: str
     definition: StateDefinition = Field(discriminator="type")
     bind: Optional[Annotated[str, StringConstraints(pattern=r"^ha:.*")]] = None
+    history: Optional[HistoryConfig] = None
+    # throttling of values coming from `bind`
+    min_interval: Optional[float] = Field(default=None, gt=0)  # seconds
+    deadband: Optional[float] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def validate_options(self):
+        if self.history is not None and self.definition.type != "number":
+            raise ValueError(
+                f"State '{self.name}' keeps history but is not a number state"
+            )
+        if (self.min_interval or self.deadband) and not self.bind:
+            raise ValueError(
+                f"State '{self.name}' sets min_interval/deadband without a bind"
+            )
+        if self.deadband is not None and self.definition.type != "number":
+            raise ValueError(
+                f"State '{self.name}' sets a deadband but is not a number state"
+            )
+        return self
 
     def to_stored_internal_state(
         self, value: Optional[Union[float, bool, str]] = None
@@ -64,7 +148,7 @@ class InternalState(BaseModel):
             name=self.name,
             definition=self.definition,
             bind=self.bind,
-            value=value or self.definition.default,
+            value=self.definition.default if value is None else value,
         )
 
 
@@ -75,11 +159,26 @@ class StoredInternalState(InternalState):
 class InternalStates(BaseModel):
     states: List[InternalState]
 
+    _by_name: Dict[str, InternalState] = PrivateAttr(default_factory=dict)
+    _by_bind: Dict[str, InternalState] = PrivateAttr(default_factory=dict)
+
+    @model_validator(mode="after")
+    def build_indexes(self):
+        self._by_name = {state.name: state for state in self.states}
+        self._by_bind = {state.bind: state for state in self.states if state.bind}
+        return self
+
+    @property
+    def by_name(self) -> Mapping[str, InternalState]:
+        return MappingProxyType(self._by_name)
+
+    @property
+    def by_bind(self) -> Mapping[str, InternalState]:
+        """States keyed by their `bind` target (e.g. `ha:sensor.power`)."""
+        return MappingProxyType(self._by_bind)
+
     def find_state_by_name(self, name: str) -> Optional[InternalState]:
-        for state in self.states:
-            if state.name == name:
-                return state
-        return None
+        return self._by_name.get(name)
 
 
 # -------------------------------------
@@ -108,6 +207,20 @@ class Screen(BaseModel):
     template: str
     state_bindings: dict  # mapping: screen_field -> internal_state
 
+    def resolve_bindings(self, template: Optional[Template]) -> Dict[str, str]:
+        """
+        Return the field -> internal state mapping of this screen. Template
+        fields with `bind_to_internal` act as defaults, `state_bindings`
+        override them.
+        """
+        bindings: Dict[str, str] = {}
+        if template is not None:
+            for field in template.fields:
+                if field.bind_to_internal:
+                    bindings[field.name] = field.bind_to_internal
+        bindings.update(self.state_bindings)
+        return bindings
+
 
 # -------------------------------------
 # Callback triggered action
@@ -117,6 +230,7 @@ class Screen(BaseModel):
 class OnCallback(BaseModel):
     callback_id: str
     actions: List[str]  # list of Action ids to execute
+    parallel: bool = False  # run consecutive call_script actions concurrently
 
 
 # -------------------------------------
@@ -151,13 +265,30 @@ class Action(BaseModel):
     on_callback: Optional[OnCallback] = None
 
 
+class StateBasedAction(BaseModel):
+    on_state: str
+    actions: List[str]
+    # what to do when on_state changes while the actions are still running
+    policy: Literal["queue", "restart", "drop"] = "queue"
+
+
 class Actions(BaseModel):
     actions: List[Action]
+    state_actions: List[StateBasedAction] = []
 
+    _by_id: Dict[str, Action] = PrivateAttr(default_factory=dict)
 
-class StateBasedAction(BaseModel):
-    on_state: str
-    actions: List[str]
+    @model_validator(mode="after")
+    def build_indexes(self):
+        self._by_id = {action.id: action for action in self.actions}
+        return self
+
+    @property
+    def by_id(self) -> Mapping[str, Action]:
+        return MappingProxyType(self._by_id)
+
+    def find_action(self, action_id: str) -> Optional[Action]:
+        return self._by_id.get(action_id)
 
 
 # -------------------------------------
@@ -168,6 +299,8 @@ class StateBasedAction(BaseModel):
 class TimerModule(BaseModel):
     callback: Optional[str]
     time_state: str
+    # seconds between time_state updates while the timer counts down
+    granularity: float = Field(default=1.0, gt=0)
 
 
 class Module(BaseModel):
@@ -180,18 +313,54 @@ class Module(BaseModel):
 # -------------------------------------
 
 
+def _plain(value):
+    """Dump models nested in `value` to dicts, leaving everything else."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
 class FullConfig(BaseModel):
     screens: List[Screen]
     internal_states: InternalStates
     actions: Actions
     modules: List[Module]
 
+    _screens_by_id: Dict[str, Screen] = PrivateAttr(default_factory=dict)
+    _modules_by_id: Dict[str, Module] = PrivateAttr(default_factory=dict)
+
+    @model_validator(mode="after")
+    def build_indexes(self):
+        self._screens_by_id = {screen.id: screen for screen in self.screens}
+        self._modules_by_id = {module.id: module for module in self.modules}
+        return self
+
+    @property
+    def screens_by_id(self) -> Mapping[str, Screen]:
+        return MappingProxyType(self._screens_by_id)
+
+    @property
+    def modules_by_id(self) -> Mapping[str, Module]:
+        return MappingProxyType(self._modules_by_id)
+
+    def find_screen(self, screen_id: str) -> Optional[Screen]:
+        return self._screens_by_id.get(screen_id)
+
     @model_validator(mode="before")
     def validate_references(cls, values):
-        states = values.get("internal_states", {}).get("states", [])
+        if not isinstance(values, dict):
+            return values
+        # merged config fragments arrive as validated models; check a plain copy
+        # and return them untouched so they are not validated again
+        refs = _plain(values)
+        states = refs.get("internal_states", {}).get("states", [])
         state_names = {state["name"] for state in states}
 
-        actions = values.get("actions", {}).get("actions", [])
+        actions = refs.get("actions", {}).get("actions", [])
         action_ids = {action["id"] for action in actions if "id" in action}
 
         def check_state(state: str):
@@ -217,6 +386,13 @@ class FullConfig(BaseModel):
                     raise ValueError(
                         f"Action '{action_id}' update_state target '{target}' references unknown internal state '{target}'"
                     )
+                expression = as_expression(action["update_state"].get("value"))
+                for name in expression.deps if expression else ():
+                    if name not in state_names:
+                        raise ValueError(
+                            f"Action '{action_id}' update_state value references "
+                            f"unknown internal state '{name}'"
+                        )
 
             if action.get("compare"):
                 left = action["compare"].get("left")
@@ -230,6 +406,15 @@ class FullConfig(BaseModel):
                         f"Action '{action_id}' compare right '{right}' references unknown internal state '{right}'"
                     )
 
+            if action.get("compare"):
+                for branch in ("on_true", "on_false"):
+                    act_id = action["compare"].get(branch)
+                    if act_id and act_id not in action_ids:
+                        raise ValueError(
+                            f"Action '{action_id}' compare {branch} references "
+                            f"unknown action id '{act_id}'"
+                        )
+
             if action.get("on_callback"):
                 for act_id in action["on_callback"].get("actions", []):
                     if act_id not in action_ids:
@@ -238,7 +423,7 @@ class FullConfig(BaseModel):
                         )
 
         # validate screens reference existing states
-        for screen in values.get("screens", []):
+        for screen in refs.get("screens", []):
             for bound_state in screen.get("state_bindings", {}).values():
                 if bound_state not in state_names:
                     raise ValueError(
@@ -249,8 +434,52 @@ class FullConfig(BaseModel):
         for action in actions:
             check_action(action)
 
+        for rule in refs.get("actions", {}).get("state_actions", []):
+            on_state = rule.get("on_state")
+            if on_state not in state_names:
+                raise ValueError(
+                    f"State action references unknown internal state '{on_state}'"
+                )
+            for act_id in rule.get("actions", []):
+                if act_id not in action_ids:
+                    raise ValueError(
+                        f"State action on '{on_state}' references "
+                        f"unknown action id '{act_id}'"
+                    )
+
+        # actions reachable from each other must not form a loop
+        edges = {
+            action["id"]: [
+                *(action.get("on_callback") or {}).get("actions", []),
+                *(
+                    ref
+                    for ref in (
+                        (action.get("compare") or {}).get("on_true"),
+                        (action.get("compare") or {}).get("on_false"),
+                    )
+                    if ref
+                ),
+            ]
+            for action in actions
+            if "id" in action
+        }
+        done: set = set()
+
+        def check_cycle(action_id: str, path: List[str]):
+            if action_id in path:
+                cycle = path[path.index(action_id) :] + [action_id]
+                raise ValueError(f"Action cycle: {' -> '.join(cycle)}")
+            if action_id in done:
+                return
+            for next_id in edges.get(action_id, []):
+                check_cycle(next_id, path + [action_id])
+            done.add(action_id)
+
+        for action_id in edges:
+            check_cycle(action_id, [])
+
         # validate modules reference existing states (e.g., timer.time_state)
-        for module in values.get("modules", []):
+        for module in refs.get("modules", []):
             timer = (module or {}).get("timer") or {}
             time_state = timer.get("time_state")
             if time_state and time_state not in state_names:
@@ -258,6 +487,25 @@ class FullConfig(BaseModel):
                     f"Module '{module.get('id')}' references unknown time_state '{time_state}'"
                 )
 
+        # computed states may only read known states and must not form a loop
+        computed = {}
+        for state in states:
+            definition = state.get("definition")
+            if not isinstance(definition, dict) or definition.get("type") != "computed":
+                continue
+            expression = definition.get("expression")
+            # malformed entries are reported by field validation
+            if isinstance(expression, str) and "name" in state:
+                computed[state["name"]] = compile_expression(expression).deps
+        for name, deps in computed.items():
+            for dep in deps:
+                if dep not in state_names:
+                    raise ValueError(
+                        f"Computed state '{name}' references "
+                        f"unknown internal state '{dep}'"
+                    )
+        build_computed_order(computed)
+
         # ensure no duplicate external binds among internal states
         binds = set()
         for state in states:
@@ -272,6 +520,22 @@ class FullConfig(BaseModel):
         return values
 
 
+class ConfigFragment(BaseModel):
+    """
+    One file of a config split with `include`. Same layout as FullConfig with
+    every section optional; references are only checked once all fragments
+    are merged. Unknown top-level keys are rejected.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    include: List[str] = []  # globs or directories, relative to the root file
+    screens: List[Screen] = []
+    internal_states: InternalStates = InternalStates(states=[])
+    actions: Actions = Actions(actions=[])
+    modules: List[Module] = []
+
+
 # --------------------------------------
 # Template configuration
 # --------------------------------------
@@ -279,3 +543,29 @@ class FullConfig(BaseModel):
 
 class TemplateConfig(BaseModel):
     templates: List[Template]
+
+    _by_name: Dict[str, Template] = PrivateAttr(default_factory=dict)
+    _fields: Dict[str, Dict[str, TemplateField]] = PrivateAttr(default_factory=dict)
+
+    @model_validator(mode="after")
+    def build_indexes(self):
+        self._by_name = {template.name: template for template in self.templates}
+        self._fields = {
+            template.name: {field.name: field for field in template.fields}
+            for template in self.templates
+        }
+        return self
+
+    @property
+    def by_name(self) -> Mapping[str, Template]:
+        return MappingProxyType(self._by_name)
+
+    def find_template(self, name: str) -> Optional[Template]:
+        return self._by_name.get(name)
+
+    def template_for(self, screen: Screen) -> Optional[Template]:
+        return self._by_name.get(screen.template)
+
+    def fields_of(self, template_name: str) -> Mapping[str, TemplateField]:
+        """Fields of a template keyed by name (empty for unknown templates)."""
+        return MappingProxyType(self._fields.get(template_name, {}))
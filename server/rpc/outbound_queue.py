@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from storage.storage_manager import Storage
+
+
+def merge_params(old: Any, new: Any) -> Any:
+    """Deep-merge `new` into `old`; the newer value wins wherever both set one."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    merged = dict(old)
+    for name, value in new.items():
+        merged[name] = merge_params(merged.get(name), value)
+    return merged
+
+
+class OutboundQueue:
+    """
+    Notifications for one device that is asleep or disconnected, kept in
+    `outbox/{uuid}.json` until it appears again.
+
+    Every entry expires `ttl` seconds after it was queued. Entries given the
+    same `key` are coalesced: the params are deep-merged (latest value per
+    state wins) and the entry moves to the end with a fresh expiry. At most
+    `max_entries` are kept; the oldest are dropped first.
+    """
+
+    def __init__(
+        self,
+        store: Storage,
+        uuid: int,
+        ttl: float = 3600.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.filename = f"{uuid}.json"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        raw = store.read_bytes(self.filename)
+        self._entries: List[Dict[str, Any]] = json.loads(raw) if raw else []
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._entries)
+
+    def put(
+        self,
+        method: str,
+        params: Any,
+        key: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        with self._lock:
+            self._expire()
+            if key is not None:
+                for i, entry in enumerate(self._entries):
+                    if entry["key"] == key:
+                        params = merge_params(self._entries.pop(i)["params"], params)
+                        break
+            self._entries.append(
+                {
+                    "key": key,
+                    "method": method,
+                    "params": params,
+                    "expires": self._clock() + (self.ttl if ttl is None else ttl),
+                }
+            )
+            del self._entries[: -self.max_entries]
+            self._save()
+
+    def drain(self) -> List[Tuple[str, Any]]:
+        """Remove and return the live entries as (method, params), oldest first."""
+        with self._lock:
+            self._expire()
+            entries, self._entries = self._entries, []
+            if entries:
+                self._save()
+        return [(entry["method"], entry["params"]) for entry in entries]
+
+    def _expire(self) -> None:
+        now = self._clock()
+        live = [entry for entry in self._entries if entry["expires"] > now]
+        if len(live) != len(self._entries):
+            self._entries = live
+            self._save()
+
+    def _save(self) -> None:
+        if self._entries:
+            self.store.write_json(self.filename, self._entries)
+        else:
+            self.store.delete(self.filename)
@@ -1,15 +1,25 @@
-from typing import List
+from typing import List, Optional
 from protocol.mqtt import MQTT
 from storage.session_manager import SessionManager
+from storage.storage_manager import Storage, storage
 from utils.utils import singleton
+from rpc.outbound_queue import OutboundQueue
 from rpc.rpc_session_handler import RPCSessionHandler
 
 
 @singleton
 class RPCHandler:
-    def init(self, client: MQTT, default_timeout: float = 5.0):
+    def init(
+        self,
+        client: MQTT,
+        default_timeout: float = 5.0,
+        outbox: Optional[Storage] = None,
+        outbox_ttl: float = 3600.0,
+    ):
         self.client = client
         self.default_timeout = default_timeout
+        self.outbox = outbox or storage.namespace("outbox", indent=None, coalesce=0.5)
+        self.outbox_ttl = outbox_ttl
         self.handlers: List[RPCSessionHandler] = []
 
     def update_subscriptions(self):
@@ -17,7 +27,10 @@ class RPCHandler:
         for uuid in SessionManager().list_sessions():
             if not self.handler_exists(uuid):
                 handler = RPCSessionHandler(
-                    uuid, self.client, default_timeout=self.default_timeout
+                    uuid,
+                    self.client,
+                    default_timeout=self.default_timeout,
+                    outbox=OutboundQueue(self.outbox, uuid, ttl=self.outbox_ttl),
                 )
                 self.handlers.append(handler)
 
@@ -29,3 +42,6 @@ class RPCHandler:
             if h.uuid == uuid:
                 return h
         raise ValueError(f"No RPC handler for uuid {uuid}")
+
+    def stop(self) -> None:
+        self.outbox.flush()
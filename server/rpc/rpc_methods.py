@@ -1,17 +1,38 @@
+import base64
+
 from internal_states.internal_state_handler import (
     SyncInternalStateHandler,
 )
+from internal_states.state_history import StateHistory
+from rpc.rpc_protocol import RawResult
+from state_publisher.frame_publisher import FramePublisher
+from state_publisher.screen_documents import ScreenDocuments
 from utils.utils import register_rpc, set_value_by_string
+from storage.asset_store import AssetStore
 from storage.config_manager import ConfigManager, ConfigError
+from storage.config_versions import ConfigVersions, config_version
+from storage.template_manager import TemplateManager
 
 
 @register_rpc()
 def get_config(params, handler):
+    """The full config and its `version` (see `get_config_update`)."""
     try:
         config = ConfigManager().get()
     except ConfigError as exc:
         return {"error": str(exc)}
-    return config.model_dump()
+    dump = config.model_dump(mode="json")
+    return {**dump, "version": config_version(dump)}
+
+
+@register_rpc()
+def get_config_update(params, handler):
+    """
+    Bring a device from the config `version` it has to the current one:
+    `{"version", "patch"}` with RFC 6902 operations, or `{"version",
+    "config"}` when its version is unknown or too old.
+    """
+    return ConfigVersions().update_for((params or {}).get("version"))
 
 
 @register_rpc()
@@ -30,3 +51,125 @@ def set_state(params, handler):
     state = ConfigManager().get().internal_states.find_state_by_name(name)
     assert state
     SyncInternalStateHandler().set(set_value_by_string(value, state))
+
+
+@register_rpc()
+def get_states(params, handler):
+    """Return every value bound to a screen in one round trip."""
+    screen_id = params["screen"]
+    screen = ConfigManager().get().find_screen(screen_id)
+    if screen is None:
+        return {"error": f"Unknown screen {screen_id}"}
+    bindings = screen.resolve_bindings(TemplateManager().get().template_for(screen))
+    states = SyncInternalStateHandler().get_many(bindings.values())
+    fields = {
+        field: states[name].value for field, name in bindings.items() if name in states
+    }
+    return {"screens": {screen_id: fields}}
+
+
+@register_rpc()
+def set_interest(params, handler):
+    """
+    Declare the screen(s) and/or states this device shows. Deltas and screen
+    change notifications are then only sent for those; an empty declaration
+    stops them.
+    """
+    # the publisher imports RPCHandler, which imports this module
+    from state_publisher.state_publisher import StatePublisher
+
+    params = params or {}
+    screens = params.get("screens") or (
+        [params["screen"]] if "screen" in params else []
+    )
+    states = params.get("states") or []
+    config = ConfigManager().get()
+    unknown = [s for s in screens if config.find_screen(s) is None] + [
+        s for s in states if config.internal_states.find_state_by_name(s) is None
+    ]
+    if unknown:
+        return {"error": f"Unknown screens or states: {', '.join(unknown)}"}
+    return {
+        "states": sorted(StatePublisher().set_interest(handler.uuid, screens, states))
+    }
+
+
+@register_rpc()
+def get_screen(params, handler):
+    """
+    Return the render-ready document of a screen: its template fields with
+    their bound values and callbacks. Shared by every device on the screen.
+    """
+    screen_id = params["screen"]
+    document = ScreenDocuments().render(screen_id)
+    if document is None:
+        return {"error": f"Unknown screen {screen_id}"}
+    return RawResult(document)
+
+
+@register_rpc()
+def subscribe_frames(params, handler):
+    """
+    Render `screen` on the server for this device: `width` x `height` pixels
+    in `format` ("rgb565" or "mono"). Changed tiles follow on the frame topic.
+    """
+    try:
+        return FramePublisher().subscribe(
+            handler,
+            params["screen"],
+            int(params["width"]),
+            int(params["height"]),
+            params.get("format", "rgb565"),
+        )
+    except ValueError as exc:
+        return {"error": str(exc)}
+
+
+@register_rpc()
+def unsubscribe_frames(params, handler):
+    FramePublisher().unsubscribe(handler.uuid)
+    return {}
+
+
+@register_rpc()
+def get_asset_manifest(params, handler):
+    """Asset name -> `{"sha256", "size"}`; devices skip hashes they already have."""
+    return {"assets": AssetStore().manifest()}
+
+
+@register_rpc()
+def get_asset_chunk(params, handler):
+    """
+    Return `length` bytes (base64) of the asset `sha256` from `offset`, so
+    downloads can be split up and resumed. `eof` marks the last chunk.
+    """
+    length = params.get("length")
+    try:
+        chunk = AssetStore().chunk(
+            params["sha256"],
+            int(params.get("offset", 0)),
+            None if length is None else int(length),
+        )
+    except KeyError:
+        return {"error": f"Unknown asset {params['sha256']}"}
+    except (TypeError, ValueError) as exc:
+        return {"error": str(exc)}
+    chunk["data"] = base64.b64encode(chunk["data"]).decode()
+    return chunk
+
+
+@register_rpc()
+def get_state_history(params, handler):
+    """
+    Return history points of a number state between `start` and `end` (unix
+    seconds). Raw points are `[t, value]`, aggregates `[t, avg, min, max]`.
+    """
+    name = params["state"]
+    resolution, points = StateHistory().query(
+        name, params.get("start"), params.get("end"), params.get("resolution")
+    )
+    return {
+        "state": name,
+        "resolution": resolution,
+        "points": [list(point) for point in points],
+    }
@@ -11,7 +11,7 @@ class JSONRPCBase(BaseModel):
 class JSONRPCRequest(JSONRPCBase):
     method: str
     params: Any = None
-    id: str
+    id: Optional[str] = None  # None marks a notification (no reply expected)
 
 
 class JSONRPCError(BaseModel):
@@ -19,10 +19,25 @@ def make_request(method: str, params: Any, id: Optional[str] = None) -> JSONRPCR
     return JSONRPCRequest(method=method, params=params, id=id or make_id())
 
 
+def make_notification(method: str, params: Any) -> JSONRPCRequest:
+    return JSONRPCRequest(method=method, params=params)
+
+
 def make_response(result: Any, id: str) -> JSONRPCResult:
     return JSONRPCResult(result=result, id=id)
 
 
+class RawResult(bytes):
+    """An already serialized JSON result, sent without re-encoding it."""
+
+
+def make_raw_response(result: RawResult, id: Optional[str]) -> bytes:
+    return b'{"jsonrpc":"2.0","result":%s,"id":%s}' % (
+        result,
+        json.dumps(id).encode(),
+    )
+
+
 def make_error(
     message: str, id: Optional[str] = None, code: int = -32000, data: Any = None
 ) -> JSONRPCErrorResponse:
@@ -1,15 +1,29 @@
 from __future__ import annotations
 import logging
 import threading
+import time
 from typing import Dict, Callable, Any, Optional
 
 from protocol.mqtt import MQTT
-from rpc.rpc_protocol import make_request, make_response, make_error, deserialize
+from rpc.outbound_queue import OutboundQueue
+from rpc.rpc_protocol import (
+    make_request,
+    make_notification,
+    make_response,
+    make_raw_response,
+    RawResult,
+    make_error,
+    deserialize,
+)
 from rpc.rpc_models import JSONRPCRequest, JSONRPCMessage
 from utils.utils import rpc_functions
 import rpc.rpc_methods as _  # noqa: F401
 
 
+class DeviceOffline(TimeoutError):
+    """The device is known to be away; the call was not sent."""
+
+
 class RPCSessionHandler:
     """
     Handles JSON-RPC over MQTT for a single UUID.
@@ -18,12 +32,28 @@ class RPCSessionHandler:
       - Server receives responses from /espdisplay/{uuid}/client
       - Device publishes requests to /espdisplay/{uuid}/client
       - Device receives responses from /espdisplay/{uuid}/server
+
+    With an `outbox`, a device that timed out or announced `sleep` is
+    offline: calls fail at once with `DeviceOffline` and notifications are
+    queued. Its next message marks it online again and the queued
+    notifications are sent first, in order.
     """
 
-    def __init__(self, uuid: int, client: MQTT, default_timeout: float = 5.0) -> None:
+    def __init__(
+        self,
+        uuid: int,
+        client: MQTT,
+        default_timeout: float = 5.0,
+        outbox: Optional[OutboundQueue] = None,
+    ) -> None:
         self.uuid = uuid
         self.client = client
         self.default_timeout = default_timeout
+        self.outbox = outbox
+        # a device that still has queued messages was away when we stopped
+        self.online = outbox is None or not len(outbox)
+        self.last_seen: Optional[float] = None
+        self._presence_lock = threading.Lock()
 
         self._pending_events: Dict[str, threading.Event] = {}
         self._pending_results: Dict[str, Any] = {}
@@ -34,6 +64,7 @@ class RPCSessionHandler:
         logging.debug(f"{self.logging_prefix}Subscribing to espdisplay/{uuid}/client")
         self.client.subscribe(f"espdisplay/{uuid}/client", self._on_message)
         self.register_method("ping", self._ping)
+        self.register_method("sleep", self._sleep)
         for key, func in rpc_functions.items():
             self.register_method(key, func)
             logging.debug(f"{self.logging_prefix}Registed method {key}")
@@ -44,6 +75,10 @@ class RPCSessionHandler:
         logging.debug(
             f"{self.logging_prefix}Making call: {method} with params: {params}"
         )
+        if not self.online:
+            raise DeviceOffline(
+                f"RPC call={method} skipped, device={self.uuid} is offline"
+            )
         req = make_request(method, params)
         event = threading.Event()
         self._pending_events[req.id] = event
@@ -61,6 +96,7 @@ class RPCSessionHandler:
             )
             self._pending_events.pop(req.id, None)
             self._pending_results.pop(req.id, None)
+            self.go_offline()
             raise TimeoutError(
                 f"RPC call={method} in device={self.uuid} timed out after {wait_for} seconds"
             )
@@ -81,6 +117,56 @@ class RPCSessionHandler:
 
         return result
 
+    # -------- outgoing notification --------
+    def notify(self, method: str, params: Any, key: Optional[str] = None) -> None:
+        """
+        Fire-and-forget request; the device does not reply. While the device
+        is offline it is queued instead, coalesced with earlier ones of `key`.
+        """
+        with self._presence_lock:
+            if not self.online and self.outbox is not None:
+                logging.debug(f"{self.logging_prefix}Offline, queueing {method}")
+                self.outbox.put(method, params, key=key)
+                return
+        self._publish_notification(method, params)
+
+    def _publish_notification(self, method: str, params: Any) -> None:
+        note = make_notification(method, params)
+        logging.debug(
+            f"{self.logging_prefix}Publishing notification to "
+            f"espdisplay/{self.uuid}/server: {note}"
+        )
+        # notifications carry no id member at all (JSON-RPC 2.0 section 4.1)
+        self.client.publish(
+            f"espdisplay/{self.uuid}/server", note.model_dump_json(exclude_none=True)
+        )
+
+    # -------- presence --------
+    def go_offline(self) -> None:
+        """Stop sending until the device is heard from again."""
+        if self.outbox is None:
+            return
+        with self._presence_lock:
+            if self.online:
+                logging.info(f"{self.logging_prefix}Device went offline")
+            self.online = False
+
+    def _seen(self) -> None:
+        self.last_seen = time.time()
+        if self.online:
+            return
+        with self._presence_lock:
+            if self.online:
+                return
+            self.online = True
+            queued = self.outbox.drain() if self.outbox is not None else []
+            logging.info(
+                f"{self.logging_prefix}Device is back, "
+                f"sending {len(queued)} queued notifications"
+            )
+            for method, params in queued:
+                self._publish_notification(method, params)
+
     # -------- incoming request from device --------
     def _handle_request(self, req: JSONRPCRequest) -> None:
         logging.debug(f"{self.logging_prefix}Handling incoming request: {req}")
@@ -97,11 +183,18 @@ class RPCSessionHandler:
                 logging.debug(
                     f"{self.logging_prefix}Method {method} returned: {result}"
                 )
-                resp = make_response(result, id=req_id)
+                if isinstance(result, RawResult):
+                    resp = make_raw_response(result, req_id)
+                else:
+                    resp = make_response(result, id=req_id)
             except Exception as e:
                 logging.debug(f"{self.logging_prefix}Error in method {method}: {e}")
                 resp = make_error("Internal error", id=req_id, code=-32603, data=str(e))
 
+        if req_id is None:
+            logging.debug(f"{self.logging_prefix}Notification {method} handled")
+            return
+
         # reply on server topic (device is listening)
         logging.debug(
             f"{self.logging_prefix}Publishing response to espdisplay/{self.uuid}/server: {resp}"
@@ -117,6 +210,7 @@ class RPCSessionHandler:
         except Exception as e:
             logging.error(f"{self.logging_prefix}Invalid JSON-RPC payload: {e}")
             return
+        self._seen()
 
         if msg.request is not None:
             logging.debug(f"{self.logging_prefix}Message is a request")
@@ -159,3 +253,9 @@ class RPCSessionHandler:
     def _ping(params: Any, handler: "RPCSessionHandler") -> Any:
         """Simple health check method."""
         return {"pong": params}
+
+    @staticmethod
+    def _sleep(params: Any, handler: "RPCSessionHandler") -> Any:
+        """The device is about to sleep; queue for it until it is back."""
+        handler.go_offline()
+        return None
@@ -0,0 +1,170 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from models.models import StoredInternalState
+from state_publisher.framebuffer import (
+    TileCache,
+    check_geometry,
+    compose_frame,
+    dirty_tiles,
+    encode_frame,
+)
+from state_publisher.screen_documents import ScreenDocuments
+from storage.config_diff import ConfigDiff
+from utils.utils import singleton
+
+type ViewKey = Tuple[str, int, int, str]  # (screen id, width, height, format)
+
+
+def frame_topic(uuid: int) -> str:
+    return f"espdisplay/{uuid}/frame"
+
+
+class FrameView:
+    """One rendering of a screen at a size and format, shared by its devices."""
+
+    __slots__ = ("screen_id", "width", "height", "fmt", "frame", "sequence", "devices")
+
+    def __init__(self, key: ViewKey):
+        self.screen_id, self.width, self.height, self.fmt = key
+        self.frame: Optional[bytes] = None
+        self.sequence = 0
+        self.devices: Dict[int, Any] = {}  # uuid -> RPC session handler
+
+
+@singleton
+class FramePublisher:
+    """
+    Server-side rendering for devices that cannot lay out screens.
+
+    A device subscribes with a screen, size and pixel format, receives the
+    full frame and from then on only the tiles that changed, zlib
+    compressed, as binary messages on `espdisplay/{uuid}/frame` (layout in
+    `framebuffer.encode_frame`). Changes are coalesced for `window` seconds.
+    """
+
+    def init(
+        self,
+        window: float = 0.05,
+        tile: int = 16,
+        row_height: int = 16,
+        cache_size: int = 4096,
+    ) -> None:
+        self.window = window
+        self.tile = tile
+        self.row_height = row_height
+        self.cache = TileCache(cache_size)
+        self.views: Dict[ViewKey, FrameView] = {}
+        self.device_views: Dict[int, ViewKey] = {}
+        self._pending: Set[str] = set()  # screens to re-render
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()  # one render of a view at a time
+        self._timer: Optional[threading.Timer] = None
+
+    def subscribe(
+        self, handler: Any, screen_id: str, width: int, height: int, fmt: str
+    ) -> Dict[str, Any]:
+        """Attach the device behind RPC session `handler` and send it a full frame."""
+        check_geometry(width, height, fmt, self.tile)
+        key = (screen_id, width, height, fmt)
+        with self._lock:
+            self._detach(handler.uuid)
+            view = self.views.setdefault(key, FrameView(key))
+            view.devices[handler.uuid] = handler
+            self.device_views[handler.uuid] = key
+        payload = self._full_frame(view)
+        self._send(handler, payload)
+        return {"topic": frame_topic(handler.uuid), "bytes": len(payload)}
+
+    def unsubscribe(self, uuid: int) -> None:
+        with self._lock:
+            self._detach(uuid)
+
+    def _detach(self, uuid: int) -> None:
+        key = self.device_views.pop(uuid, None)
+        if key is None:
+            return
+        view = self.views[key]
+        view.devices.pop(uuid, None)
+        if not view.devices:
+            del self.views[key]
+
+    def _render(self, view: FrameView) -> bytes:
+        fields = ScreenDocuments().fields(view.screen_id) or []
+        return compose_frame(fields, view.width, view.height, view.fmt, self.row_height)
+
+    def _encode(self, view: FrameView, frame: bytes, tiles, full: bool) -> bytes:
+        return encode_frame(
+            frame,
+            tiles,
+            view.width,
+            view.height,
+            view.fmt,
+            self.tile,
+            view.sequence,
+            self.cache,
+            full=full,
+        )
+
+    def _full_frame(self, view: FrameView) -> bytes:
+        with self._render_lock:
+            if view.frame is None:
+                view.frame = self._render(view)
+            tiles = dirty_tiles(
+                None, view.frame, view.width, view.height, view.fmt, self.tile
+            )
+            return self._encode(view, view.frame, tiles, full=True)
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        """InternalStateHandler listener; re-renders the screens showing `states`."""
+        if not self.views:
+            return
+        screens = ScreenDocuments().screens_for(state.name for state in states)
+        self._mark(screens)
+
+    def on_config_reload(self, _config: Any, diff: ConfigDiff) -> None:
+        """Reload listener; unchanged tiles are not sent again anyway."""
+        self._mark({view.screen_id for view in list(self.views.values())})
+
+    def _mark(self, screens: Set[str]) -> None:
+        with self._lock:
+            self._pending.update(
+                screens & {view.screen_id for view in self.views.values()}
+            )
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._timer = None
+            views = [view for view in self.views.values() if view.screen_id in pending]
+        for view in views:
+            with self._render_lock:
+                frame = self._render(view)
+                tiles = dirty_tiles(
+                    view.frame, frame, view.width, view.height, view.fmt, self.tile
+                )
+                view.frame = frame
+                if not tiles:
+                    continue
+                view.sequence += 1
+                payload = self._encode(view, frame, tiles, full=False)
+            for handler in list(view.devices.values()):
+                self._send(handler, payload)
+
+    def _send(self, handler: Any, payload: bytes) -> None:
+        try:
+            handler.client.publish(frame_topic(handler.uuid), payload)
+        except Exception:
+            logging.exception(f"Failed to push frame tiles to {handler.uuid}")
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = set()
@@ -0,0 +1,226 @@
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from state_publisher.font5x7 import GLYPH_HEIGHT, GLYPH_WIDTH, glyph
+
+# pixel formats: rgb565 is 2 bytes per pixel (big endian), mono 1 bit per
+# pixel, MSB first. Rows are never padded because widths must fit a byte.
+FORMATS = {"rgb565": 0, "mono": 1}
+FOREGROUND = 0xFFFF
+BACKGROUND = 0x0000
+PADDING = 2  # pixels left of the text
+
+# b"FB", format, flags, sequence, width, height, tile width, tile height, count
+FRAME_HEADER = struct.Struct(">2sBBHHHBBH")
+TILE_HEADER = struct.Struct(">HHH")  # tile column, tile row, compressed length
+FLAG_FULL = 0x01
+
+type TilePos = Tuple[int, int]
+
+
+def stride(width: int, fmt: str) -> int:
+    return width * 2 if fmt == "rgb565" else width // 8
+
+
+def check_geometry(width: int, height: int, fmt: str, tile: int) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown pixel format {fmt!r}, use one of {list(FORMATS)}")
+    if not (8 <= width <= 2048 and 8 <= height <= 2048):
+        raise ValueError("Width and height must be between 8 and 2048 pixels")
+    if width % 8 or tile % 8:
+        raise ValueError("Width and tile size must be multiples of 8")
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return "--"
+    if isinstance(value, bool):
+        return "ON" if value else "OFF"
+    if isinstance(value, float):
+        return f"{value:.1f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def widget_text(field: str, value: Any) -> str:
+    return f"{field.replace('_', ' ')}: {format_value(value)}"
+
+
+@lru_cache(maxsize=256)
+def _rgb565_table(foreground: int, background: int) -> Tuple[bytes, ...]:
+    """Mono byte -> the 8 rgb565 pixels it stands for."""
+    on, off = foreground.to_bytes(2, "big"), background.to_bytes(2, "big")
+    return tuple(
+        b"".join(on if byte & (0x80 >> bit) else off for bit in range(8))
+        for byte in range(256)
+    )
+
+
+def mono_to_rgb565(
+    mono: bytes, foreground: int = FOREGROUND, background: int = BACKGROUND
+) -> bytes:
+    table = _rgb565_table(foreground, background)
+    return b"".join(table[byte] for byte in mono)
+
+
+@lru_cache(maxsize=4096)
+def render_widget(text: str, width: int, height: int, fmt: str) -> bytes:
+    """
+    Rasterize one text row, `width` x `height` pixels, in `fmt`. Cached, so
+    a widget showing the same value is drawn once for every device.
+    """
+    scale = max(1, height // (GLYPH_HEIGHT + 2))
+    advance = (GLYPH_WIDTH + 1) * scale
+    text = text[: max(0, (width - PADDING) // advance)]
+    rows = [0] * height
+    top = (height - GLYPH_HEIGHT * scale) // 2
+    run = (1 << scale) - 1  # one font pixel, `scale` screen pixels wide
+    for index, char in enumerate(text):
+        left = PADDING + index * advance
+        for glyph_row, bits in enumerate(glyph(char)):
+            line = 0
+            for column in range(GLYPH_WIDTH):
+                if bits & (0x10 >> column):
+                    line |= run << (width - left - (column + 1) * scale)
+            for dy in range(scale):
+                rows[top + glyph_row * scale + dy] |= line
+    mono = b"".join(row.to_bytes(width // 8, "big") for row in rows)
+    return mono if fmt == "mono" else mono_to_rgb565(mono)
+
+
+def compose_frame(
+    fields: Iterable[Tuple[str, Any]],
+    width: int,
+    height: int,
+    fmt: str,
+    row_height: int,
+) -> bytes:
+    """Stack one widget per field from the top; fields that do not fit are dropped."""
+    line = stride(width, fmt)
+    frame = bytearray(line * height)
+    for index, (field, value) in enumerate(fields):
+        top = index * row_height
+        if top + row_height > height:
+            break
+        frame[top * line : (top + row_height) * line] = render_widget(
+            widget_text(field, value), width, row_height, fmt
+        )
+    return bytes(frame)
+
+
+def tile_bytes(
+    frame: bytes, width: int, height: int, fmt: str, tile: int, pos: TilePos
+) -> bytes:
+    line = stride(width, fmt)
+    column, row = pos
+    start = stride(column * tile, fmt)
+    end = stride(min(width, (column + 1) * tile), fmt)
+    return b"".join(
+        frame[y * line + start : y * line + end]
+        for y in range(row * tile, min(height, (row + 1) * tile))
+    )
+
+
+def dirty_tiles(
+    old: Optional[bytes], new: bytes, width: int, height: int, fmt: str, tile: int
+) -> List[TilePos]:
+    """Tiles whose pixels differ between `old` and `new` (all of them without `old`)."""
+    columns = -(-width // tile)
+    rows = -(-height // tile)
+    line = stride(width, fmt)
+    dirty = []
+    for row in range(rows):
+        band = slice(row * tile * line, min(height, (row + 1) * tile) * line)
+        if old is not None and old[band] == new[band]:
+            continue  # the whole band is unchanged
+        for column in range(columns):
+            pos = (column, row)
+            if old is None or tile_bytes(
+                old, width, height, fmt, tile, pos
+            ) != tile_bytes(new, width, height, fmt, tile, pos):
+                dirty.append(pos)
+    return dirty
+
+
+class TileCache:
+    """LRU of compressed tiles by raw content, shared by every view."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._tiles: "OrderedDict[bytes, bytes]" = OrderedDict()
+
+    def compress(self, raw: bytes) -> bytes:
+        with self._lock:
+            compressed = self._tiles.get(raw)
+            if compressed is not None:
+                self._tiles.move_to_end(raw)
+                return compressed
+        compressed = zlib.compress(raw, 6)
+        with self._lock:
+            self._tiles[raw] = compressed
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+        return compressed
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+
+def encode_frame(
+    frame: bytes,
+    tiles: List[TilePos],
+    width: int,
+    height: int,
+    fmt: str,
+    tile: int,
+    sequence: int,
+    cache: TileCache,
+    full: bool = False,
+) -> bytes:
+    parts = [
+        FRAME_HEADER.pack(
+            b"FB",
+            FORMATS[fmt],
+            FLAG_FULL if full else 0,
+            sequence & 0xFFFF,
+            width,
+            height,
+            tile,
+            tile,
+            len(tiles),
+        )
+    ]
+    for pos in tiles:
+        data = cache.compress(tile_bytes(frame, width, height, fmt, tile, pos))
+        parts.append(TILE_HEADER.pack(*pos, len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_frame(payload: bytes) -> Tuple[Dict[str, Any], Dict[TilePos, bytes]]:
+    """Inverse of `encode_frame`: the header and the raw bytes of every tile."""
+    magic, fmt, flags, sequence, width, height, tile_w, tile_h, count = (
+        FRAME_HEADER.unpack_from(payload)
+    )
+    if magic != b"FB":
+        raise ValueError("Not a framebuffer update")
+    header = {
+        "format": next(name for name, code in FORMATS.items() if code == fmt),
+        "full": bool(flags & FLAG_FULL),
+        "sequence": sequence,
+        "width": width,
+        "height": height,
+        "tile": (tile_w, tile_h),
+    }
+    tiles = {}
+    offset = FRAME_HEADER.size
+    for _ in range(count):
+        column, row, length = TILE_HEADER.unpack_from(payload, offset)
+        offset += TILE_HEADER.size
+        tiles[(column, row)] = zlib.decompress(payload[offset : offset + length])
+        offset += length
+    return header, tiles
@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, Optional, Set
+
+
+class InterestIndex:
+    """
+    What each device currently shows, and the reverse index from internal
+    state to the devices that need it. A device declares the screens it
+    displays and/or individual states; devices that never declared anything
+    are treated as interested in every screen.
+
+    Not thread-safe on its own; `StatePublisher` guards it with its lock.
+    """
+
+    def __init__(self) -> None:
+        self._screen_states: Dict[str, Set[str]] = {}  # screen -> bound states
+        self._screens: Dict[int, Set[str]] = {}
+        self._states: Dict[int, Set[str]] = {}  # declared outside of screens
+        self._by_state: Dict[str, Set[int]] = {}
+
+    def rebuild(self, screen_states: Dict[str, Set[str]]) -> None:
+        """Re-resolve every declaration after screens or templates changed."""
+        self._screen_states = screen_states
+        self._by_state = {}
+        for uuid in self._screens:
+            self._add(uuid)
+
+    def declare(
+        self,
+        uuid: int,
+        screens: Iterable[str] = (),
+        states: Iterable[str] = (),
+    ) -> Set[str]:
+        """Replace the interest of `uuid`; returns the states it now receives."""
+        self.forget(uuid)
+        self._screens[uuid] = set(screens)
+        self._states[uuid] = set(states)
+        return self._add(uuid)
+
+    def forget(self, uuid: int) -> None:
+        for state in self.states_of(uuid) or ():
+            devices = self._by_state.get(state)
+            if devices is not None:
+                devices.discard(uuid)
+                if not devices:
+                    del self._by_state[state]
+        self._screens.pop(uuid, None)
+        self._states.pop(uuid, None)
+
+    def _add(self, uuid: int) -> Set[str]:
+        states = self.states_of(uuid) or set()
+        for state in states:
+            self._by_state.setdefault(state, set()).add(uuid)
+        return states
+
+    def declared(self, uuid: int) -> bool:
+        return uuid in self._screens
+
+    def states_of(self, uuid: int) -> Optional[Set[str]]:
+        """States `uuid` receives; None when it never declared (everything)."""
+        if uuid not in self._screens:
+            return None
+        states = set(self._states.get(uuid, ()))
+        for screen in self._screens[uuid]:
+            states.update(self._screen_states.get(screen, ()))
+        return states
+
+    def wants_screen(self, uuid: int, screen_id: str) -> bool:
+        screens = self._screens.get(uuid)
+        return screens is None or screen_id in screens
+
+    def wants_state(self, uuid: int, state: str) -> bool:
+        """True if `state` was declared directly, not through a screen."""
+        return state in self._states.get(uuid, ())
+
+    def devices_for(self, state: str) -> Set[int]:
+        """Declared devices that need `state`."""
+        return self._by_state.get(state, set())
@@ -0,0 +1,204 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from internal_states.internal_state_handler import SyncInternalStateHandler
+from models.models import Screen, StoredInternalState, Template
+from storage.config_diff import ConfigDiff
+from storage.config_manager import ConfigManager
+from storage.template_manager import TemplateManager
+from utils.utils import singleton
+
+
+class ScreenDocument:
+    """
+    Render-ready view of one screen: every field with the state it shows,
+    that state's current value and the callback it triggers.
+
+        {"screen": "ac_screen", "template": "ac_template", "revision": 3,
+         "fields": {"fan_button": {"state": "fan", "value": false,
+                                   "callback": "fan_toggle"}, ...}}
+
+    The serialized bytes are cached until a bound value changes.
+    """
+
+    __slots__ = ("screen_id", "template", "fields", "revision", "missing", "_bytes")
+
+    def __init__(self, screen: Screen, template: Optional[Template], revision: int):
+        self.screen_id = screen.id
+        self.template = screen.template
+        self.revision = revision
+        self.fields: Dict[str, Dict[str, Any]] = {}
+        bindings = screen.resolve_bindings(template)
+        for field in template.fields if template else []:
+            self.fields[field.name] = {
+                "state": bindings.get(field.name),
+                "value": None,
+                "callback": field.callback,
+            }
+        for name, state in bindings.items():
+            self.fields.setdefault(
+                name, {"state": state, "value": None, "callback": None}
+            )
+        self.missing: Set[str] = set(bindings.values())  # values not loaded yet
+        self._bytes: Optional[bytes] = None
+
+    def bindings(self) -> Iterable[Tuple[str, str]]:
+        for name, field in self.fields.items():
+            if field["state"] is not None:
+                yield field["state"], name
+
+    def set_value(self, field: str, value: Any) -> None:
+        self.fields[field]["value"] = value
+        self.missing.discard(self.fields[field]["state"])
+
+    def invalidate(self) -> None:
+        self._bytes = None
+
+    def touch(self) -> None:
+        self.revision += 1
+        self.invalidate()
+
+    def to_bytes(self) -> bytes:
+        if self._bytes is None:
+            self._bytes = json.dumps(
+                {
+                    "screen": self.screen_id,
+                    "template": self.template,
+                    "revision": self.revision,
+                    "fields": self.fields,
+                },
+                separators=(",", ":"),
+            ).encode()
+        return self._bytes
+
+
+@singleton
+class ScreenDocuments:
+    """
+    Materialized `ScreenDocument`s for every configured screen.
+
+    State changes update the affected fields in place, and reloads rebuild
+    only the screens (or templates) that changed. Devices showing the same
+    screen share one serialized copy.
+    """
+
+    def init(self) -> None:
+        self._lock = threading.Lock()
+        self._docs: Dict[str, ScreenDocument] = {}
+        # state -> (screen id, field) pairs showing it
+        self._index: Dict[str, List[Tuple[str, str]]] = {}
+        self._values: Dict[str, Any] = {}  # last known value per bound state
+        self.rebuild()
+
+    def rebuild(self, screen_ids: Optional[Iterable[str]] = None) -> None:
+        """Rebuild the given screens, or all of them, from the current config."""
+        config = ConfigManager().get()
+        templates = TemplateManager().get()
+        wanted = None if screen_ids is None else set(screen_ids)
+        with self._lock:
+            docs = {}
+            for screen in config.screens:
+                old = self._docs.get(screen.id)
+                if old is not None and wanted is not None and screen.id not in wanted:
+                    docs[screen.id] = old
+                    continue
+                doc = ScreenDocument(
+                    screen,
+                    templates.template_for(screen),
+                    old.revision + 1 if old else 0,
+                )
+                for state, field in doc.bindings():
+                    if state in self._values:
+                        doc.set_value(field, self._values[state])
+                docs[screen.id] = doc
+            self._docs = docs
+            self._index = {}
+            for doc in docs.values():
+                for state, field in doc.bindings():
+                    self._index.setdefault(state, []).append((doc.screen_id, field))
+            self._values = {
+                name: value
+                for name, value in self._values.items()
+                if name in self._index
+            }
+        logging.debug(f"Materialized {len(docs)} screens")
+
+    def on_config_reload(self, _config: Any, diff: ConfigDiff) -> None:
+        """Reload listener for both config and templates."""
+        if diff.full:
+            self.rebuild()
+            return
+        screens = set(diff.screens)
+        if diff.templates:
+            screens.update(
+                screen.id
+                for screen in ConfigManager().get().screens
+                if screen.template in diff.templates
+            )
+        if screens:
+            self.rebuild(screens)
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        """InternalStateHandler listener; patches the fields bound to `states`."""
+        with self._lock:
+            touched: Dict[str, ScreenDocument] = {}
+            for state in states:
+                refs = self._index.get(state.name)
+                if not refs:
+                    continue
+                self._values[state.name] = state.value
+                for screen_id, field in refs:
+                    doc = self._docs[screen_id]
+                    doc.set_value(field, state.value)
+                    touched[screen_id] = doc
+            for doc in touched.values():
+                doc.touch()
+
+    def screens_for(self, names: Iterable[str]) -> Set[str]:
+        """Screens showing any of the states `names`."""
+        with self._lock:
+            return {
+                screen_id
+                for name in names
+                for screen_id, _ in self._index.get(name, ())
+            }
+
+    def _loaded(self, screen_id: str) -> Optional[ScreenDocument]:
+        """The document of `screen_id` with every bound value loaded."""
+        with self._lock:
+            doc = self._docs.get(screen_id)
+            if doc is None or not doc.missing:
+                return doc
+            missing = list(doc.missing)
+        stored = SyncInternalStateHandler().get_many(missing)
+        with self._lock:
+            for name, state in stored.items():
+                # a change that arrived meanwhile is newer than the read
+                self._values.setdefault(name, state.value)
+            doc = self._docs.get(screen_id)
+            if doc is None:
+                return None
+            for state, field in doc.bindings():
+                if state in doc.missing and state in self._values:
+                    doc.set_value(field, self._values[state])
+            doc.missing.difference_update(missing)  # never stored: keep None
+            doc.invalidate()
+        return doc
+
+    def render(self, screen_id: str) -> Optional[bytes]:
+        """Serialized document of `screen_id`, or None for an unknown screen."""
+        doc = self._loaded(screen_id)
+        if doc is None:
+            return None
+        with self._lock:
+            return doc.to_bytes()
+
+    def fields(self, screen_id: str) -> Optional[List[Tuple[str, Any]]]:
+        """(field, value) pairs of `screen_id` in display order."""
+        doc = self._loaded(screen_id)
+        if doc is None:
+            return None
+        with self._lock:
+            return [(name, field["value"]) for name, field in doc.fields.items()]
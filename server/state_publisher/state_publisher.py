@@ -0,0 +1,185 @@
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from models.models import FullConfig, StoredInternalState, TemplateConfig
+from rpc.rpc_handler import RPCHandler
+from state_publisher.interest_index import InterestIndex
+from storage.config_diff import ConfigDiff
+from storage.config_manager import ConfigManager
+from storage.config_versions import ConfigVersions
+from storage.template_manager import TemplateManager
+from utils.utils import singleton
+
+type FieldRef = Tuple[str, str]  # (screen id, field name)
+type StateIndex = Dict[str, List[FieldRef]]
+
+DELTA_METHOD = "state_delta"
+SCREENS_CHANGED_METHOD = "screens_changed"
+CONFIG_CHANGED_METHOD = "config_changed"
+
+
+def build_state_index(config: FullConfig, templates: TemplateConfig) -> StateIndex:
+    """Map every internal state to the (screen, field) pairs that display it."""
+    index: StateIndex = {}
+    for screen in config.screens:
+        template = templates.template_for(screen)
+        for field, state in screen.resolve_bindings(template).items():
+            index.setdefault(state, []).append((screen.id, field))
+    return index
+
+
+@singleton
+class StatePublisher:
+    """
+    Pushes internal state changes to the devices showing them.
+
+    Changes are collected for `window` seconds and then sent as a single
+    `state_delta` notification per device on `espdisplay/{uuid}/server`:
+
+        {"screens": {"ac_screen": {"temp_display": 22.5}}, "states": {...}}
+
+    Only devices whose declared interest (`set_interest`) covers a state
+    are looked up and notified; `states` carries states declared directly.
+    Deltas for an offline device are merged into a single queued one.
+    """
+
+    def init(self, window: float = 0.05) -> None:
+        self.window = window
+        self.index: StateIndex = {}
+        self.interest = InterestIndex()
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.rebuild_index()
+
+    def rebuild_index(self, *_: Any) -> None:
+        index = build_state_index(ConfigManager().get(), TemplateManager().get())
+        screen_states: Dict[str, Set[str]] = {}
+        for state, refs in index.items():
+            for screen_id, _ in refs:
+                screen_states.setdefault(screen_id, set()).add(state)
+        with self._lock:
+            self.index = index
+            self.interest.rebuild(screen_states)
+        logging.debug(f"State publisher indexed {len(index)} bound states")
+
+    def on_config_reload(self, config: Any, diff: ConfigDiff) -> None:
+        """
+        Reload listener for both config and templates: push a config patch,
+        re-index when screens or templates changed and tell only the devices
+        showing them.
+        """
+        if isinstance(config, FullConfig) and not diff.full:
+            self.notify_config_changed(ConfigVersions().latest)
+        screens = set(diff.screens)
+        if diff.templates:
+            screens.update(
+                screen.id
+                for screen in ConfigManager().get().screens
+                if screen.template in diff.templates
+            )
+        if not (diff.full or screens):
+            return
+        self.rebuild_index()
+        if not diff.full:
+            self.notify_screens_changed(screens)
+
+    def notify_screens_changed(self, screen_ids: Iterable[str]) -> None:
+        screen_ids = sorted(screen_ids)
+        for handler in list(RPCHandler().handlers):
+            wanted = [s for s in screen_ids if self._wants_screen(handler.uuid, s)]
+            if not wanted:
+                continue
+            try:
+                handler.notify(SCREENS_CHANGED_METHOD, {"screens": wanted})
+            except Exception:
+                logging.exception(f"Failed to notify {handler.uuid} of screen changes")
+
+    def notify_config_changed(self, update: Dict[str, Any]) -> None:
+        """
+        Push the RFC 6902 patch from the previous config version. Devices on
+        another version ignore it and ask for `get_config_update`.
+        """
+        if "base" not in update:
+            return
+        for handler in list(RPCHandler().handlers):
+            try:
+                handler.notify(CONFIG_CHANGED_METHOD, update)
+            except Exception:
+                logging.exception(f"Failed to push config patch to {handler.uuid}")
+
+    def set_interest(
+        self,
+        uuid: int,
+        screens: Iterable[str] = (),
+        states: Iterable[str] = (),
+    ) -> Set[str]:
+        """Declare what `uuid` shows; returns the states it will be sent."""
+        with self._lock:
+            return self.interest.declare(uuid, screens, states)
+
+    def devices_for_screen(self, screen_id: str) -> List[int]:
+        return [
+            handler.uuid
+            for handler in RPCHandler().handlers
+            if self._wants_screen(handler.uuid, screen_id)
+        ]
+
+    def _wants_screen(self, uuid: int, screen_id: str) -> bool:
+        with self._lock:
+            return self.interest.wants_screen(uuid, screen_id)
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        """InternalStateHandler listener; latest value per state wins."""
+        with self._lock:
+            for state in states:
+                if state.name in self.index or self.interest.devices_for(state.name):
+                    self._pending[state.name] = state.value
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _deltas(
+        self, pending: Dict[str, Any], uuids: Iterable[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """Per-device `state_delta` params, visiting only interested devices."""
+        undeclared = [uuid for uuid in uuids if not self.interest.declared(uuid)]
+        deltas: Dict[int, Dict[str, Any]] = {}
+        for name, value in pending.items():
+            refs = self.index.get(name, [])
+            for uuid in (*self.interest.devices_for(name), *undeclared):
+                delta = deltas.setdefault(uuid, {})
+                if self.interest.wants_state(uuid, name):
+                    delta.setdefault("states", {})[name] = value
+                for screen_id, field in refs:
+                    if self.interest.wants_screen(uuid, screen_id):
+                        screens = delta.setdefault("screens", {})
+                        screens.setdefault(screen_id, {})[field] = value
+        return {uuid: delta for uuid, delta in deltas.items() if delta}
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+        if not pending:
+            return
+        handlers = {handler.uuid: handler for handler in list(RPCHandler().handlers)}
+        with self._lock:
+            deltas = self._deltas(pending, handlers)
+        for uuid, delta in deltas.items():
+            handler = handlers.get(uuid)
+            if handler is None:
+                continue
+            try:
+                handler.notify(DELTA_METHOD, delta, key=DELTA_METHOD)
+            except Exception:
+                logging.exception(f"Failed to push state delta to {uuid}")
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = {}
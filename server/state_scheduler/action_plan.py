@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import operator
+from typing import Any, Callable, Dict, List, Optional, Protocol, Set, Tuple, Union
+
+from internal_states.computed_states import computed_value
+from internal_states.internal_state_handler import InternalStateHandler
+from models.models import Action, FullConfig, InternalState
+from state_scheduler.service_executor import HAServiceExecutor, ServiceCall
+from utils.expressions import Expression, as_expression, truthy
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "gt": operator.gt,
+    "le": operator.le,
+    "ge": operator.ge,
+}
+
+
+class ActionEngine(Protocol):
+    services: HAServiceExecutor
+
+    async def run_plan(self, plan: Plan) -> None: ...
+
+
+class ScriptStep:
+    __slots__ = ("call",)
+
+    def __init__(self, call: ServiceCall):
+        self.call = call
+
+    async def run(self, engine: ActionEngine) -> None:
+        domain, service, args = self.call
+        await engine.services.call(domain, service, **args)
+
+
+class ScriptBatchStep:
+    """Independent service calls of a `parallel` on_callback, run concurrently."""
+
+    __slots__ = ("calls",)
+
+    def __init__(self, calls: List[ServiceCall]):
+        self.calls = calls
+
+    async def run(self, engine: ActionEngine) -> None:
+        await engine.services.call_many(self.calls)
+
+
+class UpdateStep:
+    __slots__ = ("state", "value")
+
+    def __init__(self, state: InternalState, value: Any):
+        self.state = state
+        self.value = value
+
+    async def run(self, engine: ActionEngine) -> None:
+        await InternalStateHandler().set(
+            self.state.to_stored_internal_state(self.value)
+        )
+
+
+class ExpressionUpdateStep:
+    """update_state whose value is an expression over other states."""
+
+    __slots__ = ("state", "expression", "names")
+
+    def __init__(self, state: InternalState, expression: Expression):
+        self.state = state
+        self.expression = expression
+        self.names = tuple(expression.deps)
+
+    async def run(self, engine: ActionEngine) -> None:
+        stored = await InternalStateHandler().get_many(self.names)
+        value = self.expression({name: s.value for name, s in stored.items()})
+        await InternalStateHandler().set(
+            self.state.to_stored_internal_state(coerce_value(value, self.state))
+        )
+
+
+def coerce_value(value: Any, state: InternalState) -> float | bool | str:
+    """Fit an expression result to the type of the state it is written to."""
+    if state.definition.type == "number":
+        return float(value)
+    if state.definition.type == "boolean":
+        return truthy(value)
+    if state.definition.type == "computed":
+        return computed_value(value)
+    return str(value)
+
+
+class CompareStep:
+    __slots__ = ("names", "compare", "right", "on_true", "on_false")
+
+    def __init__(
+        self,
+        left: str,
+        compare: Callable[[Any, Any], bool],
+        right: Union[str, float, int],
+        on_true: Optional[Plan],
+        on_false: Optional[Plan],
+    ):
+        # right is either a state name (fetched with left) or a constant
+        self.names = (left, right) if isinstance(right, str) else (left,)
+        self.compare = compare
+        self.right = None if isinstance(right, str) else float(right)
+        self.on_true = on_true
+        self.on_false = on_false
+
+    async def run(self, engine: ActionEngine) -> None:
+        stored = await InternalStateHandler().get_many(self.names)
+        left = float(stored[self.names[0]].value)
+        right = (
+            self.right if self.right is not None else float(stored[self.names[1]].value)
+        )
+        branch = self.on_true if self.compare(left, right) else self.on_false
+        if branch is not None:
+            await engine.run_plan(branch)
+
+
+class UnsupportedStep:
+    """
+    A step that cannot run in this server (e.g. a non-HA script). Compiling it
+    must not fail the whole config, so the error is raised when it runs.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    async def run(self, engine: ActionEngine) -> None:
+        raise self.error
+
+
+type Step = Union[
+    ScriptStep,
+    ScriptBatchStep,
+    UpdateStep,
+    ExpressionUpdateStep,
+    CompareStep,
+    UnsupportedStep,
+]
+type Plan = Tuple[Step, ...]
+
+
+class ActionCycleError(ValueError):
+    """Raised when actions reference each other in a loop."""
+
+
+def parse_service(script_name: str) -> ServiceCall:
+    if not script_name.startswith("ha:"):
+        raise NotImplementedError("Currently, only HA scripts are supported")
+    service_ = script_name.removeprefix("ha:").split(".")
+    if len(service_) != 2:
+        raise ValueError(f"Can't call {''.join(service_)} HA service; Invalid format!")
+    return service_[0], service_[1], {}
+
+
+def compile_actions(config: FullConfig) -> Dict[str, Plan]:
+    """
+    Compile every action into a flat tuple of pre-resolved steps: on_callback
+    lists are inlined, state references are bound to their InternalState and
+    compare branches point straight at the compiled plan they run. Cycles are
+    rejected here, so execution never needs a guard.
+    """
+    actions = config.actions.by_id
+    states = config.internal_states.by_name
+    plans: Dict[str, Plan] = {}
+    visiting: List[str] = []
+    visiting_set: Set[str] = set()
+
+    def compile_one(action_id: str) -> Plan:
+        if action_id in plans:
+            return plans[action_id]
+        if action_id in visiting_set:
+            cycle = visiting[visiting.index(action_id) :] + [action_id]
+            raise ActionCycleError(f"Action cycle: {' -> '.join(cycle)}")
+        action = actions.get(action_id)
+        if action is None:
+            raise KeyError(f"Action {action_id} not found")
+        visiting.append(action_id)
+        visiting_set.add(action_id)
+        try:
+            plan = compile_steps(action)
+        finally:
+            visiting.pop()
+            visiting_set.discard(action_id)
+        plans[action_id] = plan
+        return plan
+
+    def compile_steps(action: Action) -> Plan:
+        if action.call_script:
+            try:
+                domain, service, _ = parse_service(action.call_script.script_name)
+            except (NotImplementedError, ValueError) as exc:
+                return (UnsupportedStep(exc),)
+            return (ScriptStep((domain, service, action.call_script.args or {})),)
+        if action.update_state:
+            act = action.update_state
+            if act.target.startswith("ha:"):
+                # writing the literal into the local mirror would corrupt it
+                return (
+                    UnsupportedStep(
+                        NotImplementedError(
+                            f"Can't update HA entity '{act.target}' from an action"
+                        )
+                    ),
+                )
+            state = states.get(act.target)
+            if state is None:
+                return (
+                    UnsupportedStep(
+                        KeyError(f"No internal state for target '{act.target}'")
+                    ),
+                )
+            expression = as_expression(act.value)
+            if expression is None:
+                return (UpdateStep(state, act.value),)
+            if expression.constant:
+                return (UpdateStep(state, coerce_value(expression({}), state)),)
+            return (ExpressionUpdateStep(state, expression),)
+        if action.compare:
+            cmp = action.compare
+            return (
+                CompareStep(
+                    cmp.left,
+                    OPERATORS[cmp.operator],
+                    cmp.right,
+                    compile_one(cmp.on_true) if cmp.on_true else None,
+                    compile_one(cmp.on_false) if cmp.on_false else None,
+                ),
+            )
+        if action.on_callback:
+            steps: List[Step] = []
+            batch: List[ServiceCall] = []
+            for sub_id in action.on_callback.actions:
+                sub_plan = compile_one(sub_id)
+                if action.on_callback.parallel:
+                    if all(isinstance(step, ScriptStep) for step in sub_plan):
+                        batch.extend(step.call for step in sub_plan)
+                        continue
+                    if batch:
+                        steps.append(_batch(batch))
+                        batch = []
+                steps.extend(sub_plan)
+            if batch:
+                steps.append(_batch(batch))
+            return tuple(steps)
+        return ()
+
+    for action_id in actions:
+        compile_one(action_id)
+    return plans
+
+
+def compile_callbacks(config: FullConfig, plans: Dict[str, Plan]) -> Dict[str, Plan]:
+    """Map every callback id to the combined plan of its on_callback actions."""
+    callbacks: Dict[str, Plan] = {}
+    for action in config.actions.actions:
+        if action.on_callback:
+            callback_id = action.on_callback.callback_id
+            callbacks[callback_id] = callbacks.get(callback_id, ()) + plans[action.id]
+    return callbacks
+
+
+def _batch(calls: List[ServiceCall]) -> Step:
+    return ScriptStep(calls[0]) if len(calls) == 1 else ScriptBatchStep(list(calls))
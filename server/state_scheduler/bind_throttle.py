@@ -0,0 +1,86 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable
+
+from models.models import InternalState, StoredInternalState
+from utils.utils import log_task_failure
+
+type StateWriter = Callable[[StoredInternalState], Awaitable[None]]
+
+
+class BindThrottle:
+    """
+    Latest-wins rate limiter for values arriving through `InternalState.bind`.
+
+    - `min_interval`: a value arriving sooner than this after the previous
+      write is parked and written when the interval ends; newer values
+      replace the parked one, so only the latest is ever written.
+    - `deadband`: number values closer than this to the last written value
+      are dropped (and cancel any parked value).
+    """
+
+    def __init__(self, write: StateWriter, clock: Callable[[], float] = time.monotonic):
+        self._write_state = write
+        self._clock = clock
+        self._last_write: Dict[str, float] = {}
+        self._last_value: Dict[str, float | bool | str] = {}
+        self._pending: Dict[str, StoredInternalState] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def submit(self, state: InternalState, stored: StoredInternalState) -> None:
+        name = state.name
+        if state.deadband is not None and self._within_deadband(
+            name, stored.value, state.deadband
+        ):
+            self._discard_pending(name)
+            return
+        if state.min_interval is None:
+            await self._write(stored)
+            return
+
+        elapsed = self._clock() - self._last_write.get(name, float("-inf"))
+        if elapsed >= state.min_interval and name not in self._pending:
+            await self._write(stored)
+            return
+        self._pending[name] = stored
+        if name not in self._timers:
+            delay = max(0.0, state.min_interval - elapsed)
+            self._timers[name] = asyncio.get_running_loop().call_later(
+                delay, self._flush, name
+            )
+
+    def synced(self, stored: Iterable[StoredInternalState]) -> None:
+        """
+        Record values written around the throttle (a full resync): they
+        become the last written values and replace anything parked.
+        """
+        now = self._clock()
+        for value in stored:
+            self._discard_pending(value.name)
+            self._last_write[value.name] = now
+            self._last_value[value.name] = value.value
+
+    def _within_deadband(self, name: str, value, deadband: float) -> bool:
+        last = self._last_value.get(name)
+        if not isinstance(last, (int, float)) or not isinstance(value, (int, float)):
+            return False
+        return abs(float(value) - float(last)) < deadband
+
+    def _discard_pending(self, name: str) -> None:
+        self._pending.pop(name, None)
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _flush(self, name: str) -> None:
+        self._timers.pop(name, None)
+        stored = self._pending.pop(name, None)
+        if stored is None:
+            return
+        task = asyncio.ensure_future(self._write(stored))
+        task.add_done_callback(log_task_failure("Throttled state write failed"))
+
+    async def _write(self, stored: StoredInternalState) -> None:
+        self._last_write[stored.name] = self._clock()
+        self._last_value[stored.name] = stored.value
+        await self._write_state(stored)
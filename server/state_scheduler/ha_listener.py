@@ -1,38 +1,141 @@
 import asyncio
-from typing import Callable, cast
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional
 
 from homeassistant_api import WebsocketClient
+from utils.utils import log_task_failure
+
+_log_failure = log_task_failure("Handling a Home Assistant state change failed")
+
+type StateCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+type SyncCallback = Callable[[Dict[str, Dict[str, Any]]], Awaitable[None]]
 
 
 class AsyncWrapperHAListener:
-    def __init__(self, client: WebsocketClient):
-        self.client = client
-        self.triggers = []
+    """
+    Listens to Home Assistant through a single `state_changed` event
+    subscription running on one reader thread. Events are filtered locally
+    against the watched entity ids and handed to an async callback on the
+    asyncio loop, so the cost stays constant however many entities are bound.
+
+    Every time the connection is (re)established the current state of all
+    watched entities is fetched with one `get_states` request and handed to
+    the sync callback, then the listener reconnects with backoff on failure.
+    """
 
-    def add_trigger(
-        self, trigger_type: str, callback: Callable[[str, str], None], **kwargs
+    def __init__(
+        self,
+        client: WebsocketClient,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 60.0,
     ):
-        self.triggers.append((trigger_type, kwargs, callback))
-
-    async def _run_trigger(self, trigger_type: str, kwargs, callback):
-        # Run the blocking generator in a thread
-        def generator():
-            with self.client.listen_trigger(trigger_type, **kwargs) as gen:
-                for event in gen:
-                    # Schedule the async callback in the main asyncio loop
-                    asyncio.run_coroutine_threadsafe(
-                        callback(
-                            kwargs.get("entity_id"),
-                            cast(dict, event["data"])["new_state"]["state"],
-                        ),
-                        asyncio.get_running_loop(),
-                    )
-
-        await asyncio.to_thread(generator)
+        self.client = client
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.entity_ids: FrozenSet[str] = frozenset()
+        self.callback: Optional[StateCallback] = None
+        self.sync_callback: Optional[SyncCallback] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._synced = False
+
+    def watch(
+        self,
+        entity_ids: Iterable[str],
+        callback: StateCallback,
+        sync_callback: Optional[SyncCallback] = None,
+    ) -> None:
+        """Replace the watched entity set; safe to call while running."""
+        self.callback = callback
+        self.sync_callback = sync_callback
+        # rebinding a frozenset is atomic, the reader thread never sees a partial set
+        self.entity_ids = frozenset(entity_ids)
+
+    def _dispatch(self, entity_id: str, new_state: Dict[str, Any]) -> None:
+        if self.callback is None:
+            return
+        task = asyncio.ensure_future(self.callback(entity_id, new_state))
+        task.add_done_callback(_log_failure)
+
+    def _dispatch_sync(self, states: Dict[str, Dict[str, Any]]) -> None:
+        if self.sync_callback is None:
+            return
+        task = asyncio.ensure_future(self.sync_callback(states))
+        task.add_done_callback(_log_failure)
+
+    def handle_event(self, data: Dict[str, Any]) -> None:
+        """Filter one `state_changed` payload; runs on the reader thread."""
+        entity_id = data.get("entity_id")
+        if entity_id not in self.entity_ids:
+            return
+        new_state = data.get("new_state")
+        if not new_state:
+            # the entity was removed from Home Assistant
+            return
+        assert self._loop
+        self._loop.call_soon_threadsafe(self._dispatch, entity_id, new_state)
+
+    def sync_states(self) -> None:
+        """Fetch every watched entity in one request; runs on the reader thread."""
+        watched = self.entity_ids
+        states = {
+            state.entity_id: {"state": state.state, "attributes": state.attributes}
+            for state in self.client.get_states()
+            if state.entity_id in watched
+        }
+        logging.info(
+            f"Synced {len(states)}/{len(watched)} bound Home Assistant entities"
+        )
+        assert self._loop
+        self._loop.call_soon_threadsafe(self._dispatch_sync, states)
+        self._synced = True
+
+    def _read_events(self) -> None:
+        with self.client:
+            with self.client.listen_events("state_changed") as events:
+                # subscribed first, so changes racing the sync are buffered, not lost
+                self.sync_states()
+                for event in events:
+                    self.handle_event(event.data)
 
     async def start(self):
-        tasks = [
-            asyncio.create_task(self._run_trigger(trigger_type, kwargs, callback))
-            for trigger_type, kwargs, callback in self.triggers
-        ]
-        await asyncio.gather(*tasks)
+        """Follow Home Assistant forever, reconnecting with exponential backoff."""
+        delay = self.reconnect_delay
+        while True:
+            self._synced = False
+            try:
+                await self._run_reader()
+                logging.warning("Home Assistant subscription ended")
+            except Exception as exc:
+                logging.warning(f"Home Assistant connection lost: {exc}")
+            if self._synced:
+                delay = self.reconnect_delay
+            logging.info(f"Reconnecting to Home Assistant in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _run_reader(self):
+        """Run the reader thread until the subscription ends or fails."""
+        loop = self._loop = asyncio.get_running_loop()
+        finished: asyncio.Future = loop.create_future()
+
+        def settle(exc: Optional[BaseException]) -> None:
+            if finished.done():
+                return
+            if exc is None:
+                finished.set_result(None)
+            else:
+                finished.set_exception(exc)
+
+        def reader() -> None:
+            try:
+                self._read_events()
+            except BaseException as exc:
+                loop.call_soon_threadsafe(settle, exc)
+            else:
+                loop.call_soon_threadsafe(settle, None)
+
+        # a daemon thread, unlike asyncio.to_thread, never blocks interpreter exit
+        # while it sits in a blocking websocket recv
+        threading.Thread(target=reader, name="ha-listener", daemon=True).start()
+        await finished
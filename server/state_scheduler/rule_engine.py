@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from models.models import FullConfig, StateBasedAction, StoredInternalState
+from state_scheduler.action_plan import Plan
+
+type PlanRunner = Callable[[Plan], Awaitable[None]]
+
+
+class Rule:
+    """
+    A compiled `StateBasedAction` and its execution state.
+
+    policy:
+    - queue: a trigger while running schedules one more run after it;
+      further triggers fold into that pending run
+    - restart: a trigger cancels the running execution and starts over
+    - drop: triggers while running are ignored
+    """
+
+    __slots__ = ("on_state", "plan", "policy", "task", "pending")
+
+    def __init__(self, on_state: str, plan: Plan, policy: str):
+        self.on_state = on_state
+        self.plan = plan
+        self.policy = policy
+        self.task: Optional[asyncio.Task] = None
+        self.pending = False
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+def compile_rules(
+    state_actions: List[StateBasedAction], plans: Dict[str, Plan]
+) -> Dict[str, List[Rule]]:
+    """Index rules by the state that triggers them."""
+    index: Dict[str, List[Rule]] = {}
+    for rule in state_actions:
+        plan = tuple(step for action_id in rule.actions for step in plans[action_id])
+        index.setdefault(rule.on_state, []).append(
+            Rule(rule.on_state, plan, rule.policy)
+        )
+    return index
+
+
+class RuleEngine:
+    """
+    Runs `StateBasedAction` rules when the state they watch changes value.
+
+    State writes are reported from whichever thread wrote them and handed to
+    the engine's loop as they are; comparing against the last seen values
+    and all rule bookkeeping happen on the loop only. `seed` sets the values
+    a first write is compared against, so a write of the stored value (the
+    boot sync with Home Assistant) does not fire the rule.
+    """
+
+    def __init__(self, run: PlanRunner):
+        self._run_plan = run
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rules: Dict[str, List[Rule]] = {}
+        self._last: Dict[str, Any] = {}
+
+    @property
+    def watched(self) -> Set[str]:
+        return set(self._rules)
+
+    def reload(self, config: FullConfig, plans: Dict[str, Plan]) -> None:
+        for rules in self._rules.values():
+            for rule in rules:
+                if rule.running:
+                    rule.task.cancel()
+        self._rules = compile_rules(config.actions.state_actions, plans)
+        self._last = {
+            name: value for name, value in self._last.items() if name in self._rules
+        }
+
+    def unseeded(self) -> Set[str]:
+        return self.watched - self._last.keys()
+
+    def seed(self, states: Dict[str, StoredInternalState]) -> None:
+        """Remember stored values of watched states not seen yet."""
+        for name, state in states.items():
+            if name in self._rules:
+                self._last.setdefault(name, state.value)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        if self._loop is None:
+            return
+        rules = self._rules
+        values = [(state.name, state.value) for state in states if state.name in rules]
+        if values:
+            self._loop.call_soon_threadsafe(self._trigger_all, values)
+
+    def _trigger_all(self, values: List[Tuple[str, Any]]) -> None:
+        for name, value in values:
+            if name in self._last and self._last[name] == value:
+                continue
+            self._last[name] = value
+            for rule in self._rules.get(name, ()):
+                self.trigger(rule)
+
+    def trigger(self, rule: Rule) -> None:
+        if rule.running:
+            if rule.policy == "drop":
+                return
+            if rule.policy == "queue":
+                rule.pending = True
+                return
+            rule.task.cancel()
+        rule.pending = False
+        rule.task = asyncio.ensure_future(self._execute(rule))
+
+    async def _execute(self, rule: Rule) -> None:
+        try:
+            await self._run_plan(rule.plan)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception(f"State action on '{rule.on_state}' failed")
+        if rule.pending:
+            # the rule is still the running task here, so start the next run
+            # from a fresh callback once this one has finished
+            asyncio.get_running_loop().call_soon(self._run_pending, rule)
+
+    def _run_pending(self, rule: Rule) -> None:
+        if rule.pending and not rule.running:
+            self.trigger(rule)
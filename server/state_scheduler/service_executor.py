@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from homeassistant_api import WebsocketClient
+from homeassistant_api.errors import RequestError
+
+type ServiceCall = Tuple[str, str, Dict[str, Any]]  # (domain, service, data)
+type CallKey = Tuple[str, str, str]
+
+# services whose repeat has no further effect; only these are shared
+IDEMPOTENT_SERVICES = {
+    "turn_on",
+    "turn_off",
+    "open_cover",
+    "close_cover",
+    "lock",
+    "unlock",
+    "reload",
+}
+
+
+def is_idempotent(domain: str, service: str) -> bool:
+    return service in IDEMPOTENT_SERVICES or service.startswith(("set_", "select_"))
+
+
+class _SharedCall:
+    """One in-flight round trip and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class HAServiceExecutor:
+    """
+    Runs Home Assistant service calls off the event loop.
+
+    - at most `concurrency` calls run at once, each on its own pooled
+      websocket connection (a connection is not safe to share between threads)
+    - failed calls are retried `retries` times with exponential backoff;
+      errors reported by Home Assistant itself are not retried
+    - identical idempotent calls (`dedupe(domain, service)`) already in
+      flight share a single round trip; it keeps running for the others when
+      one caller is cancelled, and is cancelled once nobody awaits it
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], WebsocketClient],
+        concurrency: int = 4,
+        retries: int = 3,
+        backoff: float = 0.5,
+        dedupe: Callable[[str, str], bool] = is_idempotent,
+    ):
+        self.client_factory = client_factory
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.dedupe = dedupe
+        self._idle: List[WebsocketClient] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[CallKey, _SharedCall] = {}
+
+    @staticmethod
+    def _key(domain: str, service: str, data: Dict[str, Any]) -> CallKey:
+        return domain, service, json.dumps(data, sort_keys=True, default=str)
+
+    async def call(self, domain: str, service: str, **data: Any) -> Any:
+        if not self.dedupe(domain, service):
+            return await self._call_with_retries(domain, service, data)
+        key = self._key(domain, service, data)
+        shared = self._in_flight.get(key)
+        if shared is None:
+            task = asyncio.ensure_future(self._call_with_retries(domain, service, data))
+            shared = self._in_flight[key] = _SharedCall(task)
+            task.add_done_callback(lambda _: self._forget(key, shared))
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if not shared.waiters and not shared.task.done():
+                shared.task.cancel()  # every caller was cancelled
+
+    def _forget(self, key: CallKey, shared: _SharedCall) -> None:
+        if self._in_flight.get(key) is shared:
+            del self._in_flight[key]
+
+    async def call_many(self, calls: List[ServiceCall]) -> List[Any]:
+        """Run independent calls concurrently; results keep the input order."""
+        return await asyncio.gather(
+            *(self.call(domain, service, **data) for domain, service, data in calls)
+        )
+
+    async def _call_with_retries(
+        self, domain: str, service: str, data: Dict[str, Any]
+    ) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            attempt = 0
+            while True:
+                try:
+                    return await asyncio.to_thread(self._invoke, domain, service, data)
+                except RequestError:
+                    raise
+                except Exception as exc:
+                    if attempt >= self.retries:
+                        raise
+                    delay = self.backoff * 2**attempt
+                    attempt += 1
+                    logging.warning(
+                        f"HA service {domain}.{service} failed ({exc}), "
+                        f"retry {attempt}/{self.retries} in {delay}s"
+                    )
+                    await asyncio.sleep(delay)
+
+    def _invoke(self, domain: str, service: str, data: Dict[str, Any]) -> Any:
+        """Blocking call on a pooled connection; runs in a worker thread."""
+        client = self._idle.pop() if self._idle else None
+        if client is None:
+            client = self.client_factory()
+            client.__enter__()
+        try:
+            result = client.trigger_service_with_response(domain, service, **data)
+        except RequestError:
+            self._idle.append(client)
+            raise
+        except Exception:
+            # the connection is in an unknown state, drop it
+            self._discard(client)
+            raise
+        self._idle.append(client)
+        return result
+
+    @staticmethod
+    def _discard(client: WebsocketClient) -> None:
+        try:
+            client.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        while self._idle:
+            self._discard(self._idle.pop())
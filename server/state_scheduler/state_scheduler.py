@@ -1,16 +1,22 @@
-from typing import Dict, List, Optional
+import asyncio
+import logging
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Set, Tuple
 from homeassistant_api import WebsocketClient
-from internal_states.internal_state_handler import (
-    SyncInternalStateHandler,
-)
-from models.models import Action, InternalState, StoredInternalState
+from internal_states.computed_states import ComputedStates
+from internal_states.internal_state_handler import InternalStateHandler
+from models.models import FullConfig, InternalState, StoredInternalState
+from state_scheduler.action_plan import Plan, compile_actions, compile_callbacks
+from state_scheduler.bind_throttle import BindThrottle
 from state_scheduler.ha_listener import AsyncWrapperHAListener
+from state_scheduler.rule_engine import RuleEngine
+from state_scheduler.timer_modules import TimerService
+from state_scheduler.service_executor import HAServiceExecutor
+from storage.config_diff import ConfigDiff
 from storage.config_manager import ConfigManager
-from utils.utils import compare, set_value_by_string
-from typing import Callable
+from utils.utils import log_task_failure, set_value_by_string
 
-type TriggerCallback = Callable[[str, str], None]
 type ActionKey = str
+type BoundState = Tuple[InternalState, Optional[str]]  # (state, HA attribute)
 
 
 def states_to_stored_states(states: List[InternalState]) -> List[StoredInternalState]:
@@ -25,127 +31,206 @@ def get_ha_bind_dict(states: List[InternalState]) -> Dict[str, str]:
     }
 
 
-def bulk_add_trigger(
-    entity_ids: List[str],
-    listener: AsyncWrapperHAListener,
-    callback: TriggerCallback,
-    type: str = "state",
-) -> None:
-    for entity_id in entity_ids:
-        listener.add_trigger(type, callback, entity_id=entity_id)
+def build_entity_index(states: List[InternalState]) -> Dict[str, List[BoundState]]:
+    """Map every bound HA entity id to the internal states fed by it."""
+    index: Dict[str, List[BoundState]] = {}
+    for state in states:
+        if state.bind and state.bind.startswith("ha:"):
+            entity_id, attribute = split_ha_bind(state.bind.removeprefix("ha:"))
+            index.setdefault(entity_id, []).append((state, attribute))
+    return index
 
 
-class StateScheduler:
-    def __init__(self, base_url, token):
-        self.base_url = base_url
-        self.token = token
-        self.client = WebsocketClient(base_url, token)
+def split_ha_bind(bind: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a bind target (without the `ha:` prefix) into entity id and
+    attribute: `climate.living_room.temperature` -> (`climate.living_room`,
+    `temperature`). Plain entity ids bind to the entity state itself.
+    """
+    domain, object_id, *attribute = bind.split(".", 2)
+    return f"{domain}.{object_id}", attribute[0] if attribute else None
 
-        config = ConfigManager().get()
-
-        SyncInternalStateHandler().bulk_set_if_not_exists(
-            states_to_stored_states(config.internal_states.states)
-        )
 
-        self.ha_listener = AsyncWrapperHAListener(self.client)
+def bound_entity_ids(binds: Iterable[str]) -> Set[str]:
+    """HA entity ids behind a set of bind targets; other binds are ignored."""
+    return {
+        split_ha_bind(bind.removeprefix("ha:"))[0]
+        for bind in binds
+        if bind.startswith("ha:")
+    }
 
-        self.bind_dict = get_ha_bind_dict(config.internal_states.states)  # internal:ha
-        self.bind_list = list(self.bind_dict.values())
 
-        bulk_add_trigger(self.bind_list, self.ha_listener, self.handle_new_state)
+def extract_ha_value(new_state: Dict[str, Any], attribute: Optional[str]) -> Any:
+    if attribute is None:
+        return new_state.get("state")
+    return (new_state.get("attributes") or {}).get(attribute)
 
-        self.actions = self._get_all_actions()
 
-    def _get_bound_state_by_entity_id(self, entity_id: str) -> Optional[InternalState]:
-        for key, value in self.bind_dict.items():
-            if value.removeprefix("ha:") == entity_id:
-                return ConfigManager().get().internal_states.find_state_by_name(key)
-        return None
+def ha_value_to_stored(value: Any, state: InternalState) -> StoredInternalState:
+    if isinstance(value, bool):
+        value = "on" if value else "off"
+    return set_value_by_string(str(value), state)
 
-    def handle_new_state(self, entity_id: str, new_state: str):
-        internal_state = self._get_bound_state_by_entity_id(entity_id)
-        assert internal_state
-        SyncInternalStateHandler().set(set_value_by_string(new_state, internal_state))
 
-    def _get_all_actions(self) -> Dict[str, Action]:
-        config = ConfigManager().get()
-        return {action.id: action for action in config.actions.actions}
+class StateScheduler:
+    def __init__(self, base_url, token, service_concurrency: int = 4):
+        self.base_url = base_url
+        self.token = token
+        self.client = WebsocketClient(base_url, token)
+        # the listener owns self.client; service calls use their own connections
+        self.services = HAServiceExecutor(
+            lambda: WebsocketClient(base_url, token), concurrency=service_concurrency
+        )
 
-    def _find_action(self, action_id: ActionKey) -> Action:
-        action = self.actions.get(action_id)
-        if not action:
-            raise KeyError(f"Action {action_id} not found")
-        return action
-
-    def _handle_call_script(self, action: Action) -> None:
-        act = action.call_script
-        assert act
-
-        if act.script_name.startswith("ha:"):
-            service_ = act.script_name.removeprefix("ha:").split(".")
-            if len(service_) != 2:
-                raise ValueError(
-                    f"Can't call {''.join(service_)} HA service; Invalid format!"
-                )
-            domain = service_[0]
-            service = service_[1]
-            kwrags = act.args or {}
-
-            self.client.trigger_service_with_response(domain, service, **kwrags)
-        else:
-            raise NotImplementedError("Currently, only HA scripts are supported")
-
-    def _handle_on_callback(self, action: Action) -> None:
-        act = action.on_callback
-        assert act
-
-        actions = act.actions
-        for _action in actions:
-            self.call_action(_action)
-
-    def _handle_compare(self, action: Action) -> None:
-        cmp = action.compare
-        assert cmp
-
-        left_value = SyncInternalStateHandler().get(cmp.left)
-        assert left_value
-        left_value = left_value.value
-        op = cmp.operator
-        right_value = cmp.right
-        if isinstance(cmp.right, str):
-            right_value = SyncInternalStateHandler().get(cmp.right)
-            assert right_value
-            right_value = right_value.value
-        assert left_value
-        assert right_value
-        result = compare(float(left_value), float(right_value), op)
-        if result:
-            if cmp.on_true:
-                self.call_action(cmp.on_true)
+        self.ha_listener = AsyncWrapperHAListener(self.client)
+        self.throttle = BindThrottle(InternalStateHandler().set)
+        self.rules = RuleEngine(self.run_plan)
+        self.timers = TimerService(self.fire_callback)
+        self.computed = ComputedStates()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.reload(ConfigManager().get())
+        ConfigManager().add_reload_listener(self.reload)
+        InternalStateHandler().add_listener(self.rules.on_states_changed)
+        InternalStateHandler().add_listener(self.timers.on_states_changed)
+        InternalStateHandler().add_listener(self.computed.on_states_changed)
+
+    def reload(self, config: FullConfig, diff: Optional[ConfigDiff] = None) -> None:
+        """
+        Apply a (re)loaded config. Given a diff, only what it touches is
+        rebuilt, and HA entities are re-registered only when binds changed.
+        """
+        full = diff is None or diff.full
+        if full or diff.states:
+            self.bind_dict = get_ha_bind_dict(config.internal_states.states)
+            self.bind_list = list(self.bind_dict.values())
+            self.entity_index = build_entity_index(config.internal_states.states)
+            self.computed.configure(config)
+        if full or diff.states or diff.actions or diff.state_actions:
+            self.plans = compile_actions(config)
+            self.callbacks = compile_callbacks(config, self.plans)
+            self._on_loop(self.rules.reload, config, self.plans)
+            self._spawn(self._seed_rules())
+        if full or diff.states or diff.modules:
+            self.timers.configure(config)
+        if full or diff.binds:
+            self.ha_listener.watch(
+                self.entity_index.keys(), self.handle_new_state, self.handle_sync
+            )
+            # new entities and states that moved to another attribute alike
+            rebound = bound_entity_ids(diff.binds) if not full else set()
+            rebound &= self.ha_listener.entity_ids
+            if rebound:
+                self._spawn(self._sync_entities(rebound))
+        if not full and diff.states:
+            self._spawn(self._seed_states(config, diff.states))
+
+    def _on_loop(self, func: Callable[..., Any], *args: Any) -> None:
+        """Run `func` on the scheduler loop (directly before it is running)."""
+        if self._loop is None:
+            func(*args)
         else:
-            if cmp.on_false:
-                self.call_action(cmp.on_false)
-
-    def _handle_update_state(self, action: Action) -> None:
-        act = action.update_state
-        assert act
-
-        target = act.target
-        value = act.value
-
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _spawn(self, coro: Coroutine[Any, Any, None]) -> None:
+        if self._loop is None:
+            coro.close()  # start() seeds and syncs everything anyway
+            return
+
+        def run() -> None:
+            task = asyncio.ensure_future(coro)
+            task.add_done_callback(log_task_failure("Applying a config reload failed"))
+
+        self._loop.call_soon_threadsafe(run)
+
+    async def _seed_states(self, config: FullConfig, names: Set[str]) -> None:
+        """Give states added by a reload their defaults, refresh computed ones."""
+        states = [
+            config.internal_states.by_name[n]
+            for n in names
+            if n in config.internal_states.by_name
+        ]
+        await InternalStateHandler().bulk_set_if_not_exists(
+            states_to_stored_states(states)
+        )
+        await self.computed.recompute_all()
+
+    async def _seed_rules(self) -> None:
+        """Give state actions the stored values of the states they watch."""
+        self.rules.seed(await InternalStateHandler().get_many(self.rules.unseeded()))
+
+    async def _sync_entities(self, entity_ids: Set[str]) -> None:
+        """Fetch the current state of entities whose binds a reload changed."""
+        states = await asyncio.to_thread(self._fetch_states, entity_ids)
+        await self.handle_sync(states)
+
+    def _fetch_states(self, entity_ids: Set[str]) -> Dict[str, Dict[str, Any]]:
+        # get_state(entity_id=...) fetches every state too, so filter one fetch
+        with self.services.client_factory() as client:
+            return {
+                state.entity_id: {"state": state.state, "attributes": state.attributes}
+                for state in client.get_states()
+                if state.entity_id in entity_ids
+            }
+
+    async def start(self) -> None:
+        """Seed default states, then follow Home Assistant until cancelled."""
+        loop = self._loop = asyncio.get_running_loop()
+        self.rules.attach(loop)
+        self.timers.attach(loop)
+        self.computed.attach(loop)
         config = ConfigManager().get()
-        state = config.internal_states.find_state_by_name(target)
-        assert state
-
-        SyncInternalStateHandler().set(state.to_stored_internal_state(value))
-
-    def call_action(self, action_id: ActionKey) -> None:
-        action = self._find_action(action_id)
-        if action.call_script:
-            self._handle_call_script(action)
-        elif action.on_callback:
-            self._handle_on_callback(action)
-        elif action.compare:
-            self._handle_compare(action)
-        elif action.update_state:
-            self._handle_update_state(action)
+        await InternalStateHandler().bulk_set_if_not_exists(
+            states_to_stored_states(config.internal_states.states)
+        )
+        await self.computed.recompute_all()
+        await self._seed_rules()
+        self.timers.restore()
+        await self.ha_listener.start()
+
+    def _get_bound_states_by_entity_id(self, entity_id: str) -> List[BoundState]:
+        return self.entity_index.get(entity_id, [])
+
+    async def handle_new_state(self, entity_id: str, new_state: Dict[str, Any]):
+        for internal_state, attribute in self._get_bound_states_by_entity_id(entity_id):
+            value = extract_ha_value(new_state, attribute)
+            if value is None:
+                continue
+            await self.throttle.submit(
+                internal_state, ha_value_to_stored(value, internal_state)
+            )
+
+    async def handle_sync(self, states: Dict[str, Dict[str, Any]]) -> None:
+        """Write a full snapshot of bound entities in a single transaction."""
+        stored = []
+        for entity_id, new_state in states.items():
+            for internal_state, attribute in self._get_bound_states_by_entity_id(
+                entity_id
+            ):
+                value = extract_ha_value(new_state, attribute)
+                if value is not None:
+                    stored.append(ha_value_to_stored(value, internal_state))
+        if stored:
+            self.throttle.synced(stored)
+            await InternalStateHandler().bulk_set(stored)
+
+    def get_plan(self, action_id: ActionKey) -> Plan:
+        plan = self.plans.get(action_id)
+        if plan is None:
+            raise KeyError(f"Action {action_id} not found")
+        return plan
+
+    async def run_plan(self, plan: Plan) -> None:
+        for step in plan:
+            await step.run(self)
+
+    async def call_action(self, action_id: ActionKey) -> None:
+        await self.run_plan(self.get_plan(action_id))
+
+    async def fire_callback(self, callback_id: str) -> None:
+        """Run every on_callback action registered for `callback_id`."""
+        plan = self.callbacks.get(callback_id)
+        if plan is None:
+            logging.warning(f"No actions registered for callback '{callback_id}'")
+            return
+        await self.run_plan(plan)
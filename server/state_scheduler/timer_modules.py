@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from internal_states.internal_state_handler import InternalStateHandler
+from models.models import FullConfig, InternalState, Module, StoredInternalState
+from state_scheduler.timing_wheel import TimingWheel, WheelTimer
+from storage.storage_manager import Storage, storage
+from utils.utils import log_task_failure
+
+type CallbackFirer = Callable[[str], Awaitable[None]]
+
+DEADLINES_FILE = "deadlines.json"
+
+
+class Countdown:
+    __slots__ = ("module", "deadline", "wall_deadline", "timer")
+
+    def __init__(self, module: Module, deadline: float, wall_deadline: float):
+        self.module = module
+        self.deadline = deadline  # loop time
+        self.wall_deadline = wall_deadline  # epoch seconds, for persistence
+        self.timer: Optional[WheelTimer] = None
+
+
+class TimerService:
+    """
+    Runs the countdowns of timer modules on the event loop.
+
+    Writing a positive number of seconds to a module's `time_state` starts (or
+    restarts) its countdown and writing 0 cancels it. While running, the
+    remaining seconds are written back every `granularity` seconds; when it
+    reaches zero the module's callback fires. Deadlines are kept in storage so
+    countdowns survive a restart.
+    """
+
+    def __init__(
+        self,
+        fire: CallbackFirer,
+        store: Optional[Storage] = None,
+        tick: float = 0.1,
+        wall: Callable[[], float] = time.time,
+    ):
+        self._fire = fire
+        # deadlines change on every start/cancel; persist bursts once
+        self._store = store or storage.namespace("timers", indent=None, coalesce=0.5)
+        self.tick = tick
+        self._wall = wall
+        self._wheel = TimingWheel()
+        self._origin = 0.0  # loop time of wheel tick 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tick_handle: Optional[asyncio.TimerHandle] = None
+        self._modules: Dict[str, Module] = {}
+        self._by_state: Dict[str, str] = {}  # time_state -> module id
+        self._running: Dict[str, Countdown] = {}
+        self._states: Dict[str, InternalState] = {}
+        # progress writes not yet seen back, by identity: a user writing the
+        # value currently shown must still restart the countdown
+        self._own: Dict[int, StoredInternalState] = {}
+        self._advancing = False
+
+    def configure(self, config: FullConfig) -> None:
+        modules = config.modules
+        self._modules = {module.id: module for module in modules}
+        self._by_state = {module.timer.time_state: module.id for module in modules}
+        self._states = {
+            name: config.internal_states.by_name[name] for name in self._by_state
+        }
+        for module_id in list(self._running):
+            if module_id not in self._modules:
+                self.cancel(module_id)
+            else:
+                self._running[module_id].module = self._modules[module_id]
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._origin = loop.time()
+
+    def restore(self) -> None:
+        """Re-arm the countdowns stored before the last shutdown."""
+        deadlines: Dict[str, float] = self._store.read_json(DEADLINES_FILE, default={})
+        now = self._wall()
+        for module_id, wall_deadline in deadlines.items():
+            if module_id not in self._modules:
+                continue
+            # a countdown that ran out while the server was down fires now
+            self.start(module_id, max(0.0, wall_deadline - now))
+        self._persist()
+
+    # ------------------------------------------------------------------
+    # state listener
+    # ------------------------------------------------------------------
+
+    def on_states_changed(self, states: List[StoredInternalState]) -> None:
+        if self._loop is None:
+            return
+        for state in states:
+            if state.name in self._by_state:
+                self._loop.call_soon_threadsafe(self._on_time_state, state)
+
+    def _on_time_state(self, state: StoredInternalState) -> None:
+        if self._own.pop(id(state), None) is state:
+            return  # our own progress update
+        module_id = self._by_state.get(state.name)
+        if module_id is None:
+            return
+        try:
+            seconds = float(state.value)
+        except (TypeError, ValueError):
+            logging.warning(
+                f"Timer '{module_id}' ignored non-numeric value {state.value!r}"
+            )
+            return
+        if seconds > 0:
+            self.start(module_id, seconds)
+        else:
+            self.cancel(module_id)
+
+    # ------------------------------------------------------------------
+    # countdowns
+    # ------------------------------------------------------------------
+
+    def start(self, module_id: str, seconds: float) -> None:
+        assert self._loop is not None
+        self._drop(module_id)
+        countdown = Countdown(
+            self._modules[module_id],
+            self._loop.time() + seconds,
+            self._wall() + seconds,
+        )
+        self._running[module_id] = countdown
+        self._arm_next(module_id, countdown)
+        self._persist()
+
+    def cancel(self, module_id: str) -> None:
+        if self._drop(module_id):
+            self._persist()
+
+    def _drop(self, module_id: str) -> bool:
+        countdown = self._running.pop(module_id, None)
+        if countdown is None:
+            return False
+        if countdown.timer is not None:
+            self._wheel.cancel(countdown.timer)
+        return True
+
+    def _arm_next(self, module_id: str, countdown: Countdown) -> None:
+        """Arm the next progress update, or the expiry if none is left."""
+        granularity = countdown.module.timer.granularity
+        remaining = countdown.deadline - self._loop.time()
+        steps = math.ceil(remaining / granularity - 1e-9) - 1
+        at = countdown.deadline - max(0, steps) * granularity
+        countdown.timer = self._arm_at(at, lambda: self._on_timer(module_id))
+
+    def _on_timer(self, module_id: str) -> None:
+        countdown = self._running.get(module_id)
+        if countdown is None:
+            return
+        countdown.timer = None
+        remaining = countdown.deadline - self._loop.time()
+        granularity = countdown.module.timer.granularity
+        if remaining > granularity / 2:
+            self._write(countdown.module, round(remaining / granularity) * granularity)
+            self._arm_next(module_id, countdown)
+            return
+        del self._running[module_id]
+        self._persist()
+        self._write(countdown.module, 0)
+        if countdown.module.timer.callback:
+            self._spawn(self._fire(countdown.module.timer.callback))
+
+    def _write(self, module: Module, value: float) -> None:
+        name = module.timer.time_state
+        stored = self._states[name].to_stored_internal_state(round(value, 6))
+        self._own[id(stored)] = stored
+        self._spawn(self._set_own(stored))
+
+    async def _set_own(self, stored: StoredInternalState) -> None:
+        try:
+            await InternalStateHandler().set(stored)
+        except BaseException:
+            self._own.pop(id(stored), None)
+            raise
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(log_task_failure("Timer module action failed"))
+
+    def _persist(self) -> None:
+        self._store.write_json(
+            DEADLINES_FILE,
+            {
+                module_id: countdown.wall_deadline
+                for module_id, countdown in self._running.items()
+            },
+        )
+
+    # ------------------------------------------------------------------
+    # wheel driver
+    # ------------------------------------------------------------------
+
+    def _arm_at(self, at: float, callback: Callable[[], None]) -> WheelTimer:
+        if not self._wheel and not self._advancing:
+            # idle wheel: move tick 0 so the current wheel position is now
+            self._origin = self._loop.time() - self._wheel.now * self.tick
+        due_tick = math.ceil((at - self._origin) / self.tick)
+        timer = self._wheel.arm(due_tick - self._wheel.now + 1, callback)
+        self._schedule()
+        return timer
+
+    def _schedule(self) -> None:
+        if self._tick_handle is None and self._wheel:
+            self._tick_handle = self._loop.call_at(
+                self._origin + self._wheel.now * self.tick, self._on_tick
+            )
+
+    def _on_tick(self) -> None:
+        self._tick_handle = None
+        due = math.floor((self._loop.time() - self._origin) / self.tick)
+        self._advancing = True
+        try:
+            self._wheel.advance(max(0, due - self._wheel.now + 1))
+        finally:
+            self._advancing = False
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
+        self._store.flush()
@@ -0,0 +1,102 @@
+from typing import Callable, Dict, List, Optional
+
+
+class WheelTimer:
+    __slots__ = ("expires", "callback", "slot")
+
+    def __init__(self, expires: int, callback: Callable[[], None]):
+        self.expires = expires
+        self.callback = callback
+        self.slot: Optional[Dict["WheelTimer", None]] = None
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel counting in integer ticks.
+
+    Level 0 holds timers due within `2**bits` ticks, one slot per tick; every
+    higher level covers `2**bits` times the range of the one below and is
+    cascaded down a level each time the lower level wraps around. Arming and
+    cancelling are O(1); `advance` costs O(1) per tick plus the timers it fires
+    or cascades.
+
+    The wheel has no notion of time or threads: its owner decides what a tick
+    is and calls `advance` from a single thread.
+    """
+
+    def __init__(self, bits: int = 6, levels: int = 4):
+        self.bits = bits
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.levels = levels
+        self.now = 0
+        self._wheels: List[List[Dict[WheelTimer, None]]] = [
+            [{} for _ in range(self.size)] for _ in range(levels)
+        ]
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def arm(self, delay: int, callback: Callable[[], None]) -> WheelTimer:
+        """Fire `callback` once `delay` ticks (at least one) have passed."""
+        # `now` is the next tick `advance` processes
+        timer = WheelTimer(self.now + max(1, delay) - 1, callback)
+        self._place(timer)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer: WheelTimer) -> bool:
+        if timer.slot is None:
+            return False
+        del timer.slot[timer]
+        timer.slot = None
+        self._count -= 1
+        return True
+
+    def _place(self, timer: WheelTimer) -> None:
+        delta = timer.expires - self.now
+        if delta < 0:
+            # overdue timers land in the slot processed next
+            level, index = 0, self.now & self.mask
+        else:
+            level = 0
+            while level < self.levels - 1 and delta >= 1 << (self.bits * (level + 1)):
+                level += 1
+            # beyond the top level's range, park in its furthest slot and let
+            # cascading bring the timer closer
+            limit = 1 << (self.bits * self.levels)
+            expires = self.now + limit - 1 if delta >= limit else timer.expires
+            index = (expires >> (self.bits * level)) & self.mask
+        slot = self._wheels[level][index]
+        slot[timer] = None
+        timer.slot = slot
+
+    def _cascade(self, level: int) -> int:
+        index = (self.now >> (self.bits * level)) & self.mask
+        slot = self._wheels[level][index]
+        self._wheels[level][index] = {}
+        for timer in slot:
+            self._place(timer)
+        return index
+
+    def advance(self, ticks: int = 1) -> int:
+        """Move the wheel forward, firing due timers; returns how many fired."""
+        fired = 0
+        for _ in range(ticks):
+            index = self.now & self.mask
+            level = 1
+            # cascade higher levels whenever the one below wraps around
+            while index == 0 and level < self.levels:
+                index = self._cascade(level)
+                level += 1
+            index = self.now & self.mask
+            slot = self._wheels[0][index]
+            self._wheels[0][index] = {}
+            self.now += 1
+            for timer in slot:
+                timer.slot = None
+                self._count -= 1
+                fired += 1
+                timer.callback()
+        return fired
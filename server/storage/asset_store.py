@@ -0,0 +1,157 @@
+import hashlib
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from storage.storage_manager import Storage, storage
+from utils.utils import singleton
+
+DIGEST = re.compile(r"[0-9a-f]{64}")
+MANIFEST = "manifest.json"
+
+
+def _check_digest(digest: str) -> str:
+    if not isinstance(digest, str) or not DIGEST.fullmatch(digest):
+        raise ValueError(f"Invalid asset hash {digest!r}")
+    return digest
+
+
+@singleton
+class AssetStore:
+    """
+    Content-addressed blobs (icons, fonts, images) under `esp_storage/assets`.
+
+    Blobs are stored once per sha256 at `objects/ab/cdef...` and read through
+    memory maps. `manifest.json` maps asset names to hashes, so a device can
+    compare hashes with its cache and only fetch what it lacks, in chunks.
+    """
+
+    def init(
+        self,
+        store: Optional[Storage] = None,
+        chunk_size: int = 4096,
+        max_chunk: int = 16384,
+        max_open: int = 32,
+    ) -> None:
+        # always plain files: blobs are read through memory maps
+        self.storage = store or Storage(storage.root / "assets")
+        self.chunk_size = chunk_size
+        self.max_chunk = max_chunk
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._maps: "OrderedDict[str, Optional[mmap.mmap]]" = OrderedDict()
+        self.names: Dict[str, str] = self.storage.read_json(MANIFEST, default={})
+
+    def path(self, digest: str) -> Path:
+        _check_digest(digest)
+        return self.storage.root / "objects" / digest[:2] / digest[2:]
+
+    def has(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def size(self, digest: str) -> int:
+        try:
+            return self.path(digest).stat().st_size
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+    def put(self, data: bytes, name: Optional[str] = None) -> str:
+        """Store `data` unless it is already present; returns its sha256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            self.storage.write_bytes(path.relative_to(self.storage.root), data)
+        if name is not None:
+            self.name(name, digest)
+        return digest
+
+    def put_file(self, source: str | Path, name: Optional[str] = None) -> str:
+        return self.put(Path(source).read_bytes(), name)
+
+    def name(self, name: str, digest: str) -> None:
+        if self.names.get(name) == _check_digest(digest):
+            return
+        with self._lock:
+            self.names[name] = digest
+            self.storage.write_json(MANIFEST, self.names)
+
+    def import_directory(self, directory: str | Path) -> int:
+        """Store every file below `directory`, named by its relative path."""
+        directory = Path(directory)
+        count = 0
+        for path in sorted(directory.rglob("*")):
+            if path.is_file():
+                self.put_file(path, path.relative_to(directory).as_posix())
+                count += 1
+        return count
+
+    def manifest(self) -> Dict[str, Dict[str, int | str]]:
+        return {
+            name: {"sha256": digest, "size": self.size(digest)}
+            for name, digest in sorted(self.names.items())
+            if self.has(digest)
+        }
+
+    def digests(self) -> Iterator[str]:
+        for path in (self.storage.root / "objects").glob("*/*"):
+            digest = path.parent.name + path.name
+            if DIGEST.fullmatch(digest):
+                yield digest
+
+    def _map(self, digest: str) -> Optional[mmap.mmap]:
+        """Open (or reuse) a read-only map; None for an empty blob."""
+        if digest in self._maps:
+            self._maps.move_to_end(digest)
+            return self._maps[digest]
+        try:
+            with self.path(digest).open("rb") as f:
+                mapped = (
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    if os.fstat(f.fileno()).st_size
+                    else None
+                )
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+        self._maps[digest] = mapped
+        while len(self._maps) > self.max_open:
+            _, old = self._maps.popitem(last=False)
+            if old is not None:
+                old.close()
+        return mapped
+
+    def read(self, digest: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Bytes `offset` .. `offset + length` of a blob (to the end without length)."""
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("Offset and length must not be negative")
+        with self._lock:
+            mapped = self._map(digest)
+            if mapped is None:
+                return b""
+            end = len(mapped) if length is None else offset + length
+            return mapped[offset:end]
+
+    def chunk(self, digest: str, offset: int = 0, length: Optional[int] = None) -> dict:
+        """One range of a blob for a device download; resume from any offset."""
+        if length is not None and not 0 <= length <= self.max_chunk:
+            raise ValueError(f"Chunk length must be between 0 and {self.max_chunk}")
+        length = length or self.chunk_size
+        data = self.read(digest, offset, length)
+        size = self.size(digest)
+        return {
+            "sha256": digest,
+            "offset": offset,
+            "size": size,
+            "data": data,
+            "eof": offset + len(data) >= size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for mapped in self._maps.values():
+                if mapped is not None:
+                    mapped.close()
+            self._maps.clear()
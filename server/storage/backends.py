@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+class StorageBackend:
+    """
+    Raw bytes by key for `Storage`. Keys are "/"-separated paths relative to
+    the storage root, so a namespace is simply a key prefix.
+    """
+
+    def read(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def write(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def write_many(self, items: Dict[str, bytes]) -> None:
+        for key, data in items.items():
+            self.write(key, data)
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def keys(self, prefix: str = "") -> List[str]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileBackend(StorageBackend):
+    """
+    One file per key under `root`. Each file is written to a temporary
+    sibling and renamed over the target, so a crash never leaves it
+    half-written; a batch is not atomic as a whole.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._dirs: Set[Path] = set()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if path.parent not in self._dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(path.parent)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp.open("wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def keys(self, prefix: str = "") -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(
+            key
+            for path in self.root.rglob("*")
+            if path.is_file()
+            and not path.name.endswith(".tmp")
+            and (key := path.relative_to(self.root).as_posix()).startswith(prefix)
+        )
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Every key of every namespace in one SQLite file. Writes are single-row
+    upserts, batches are one transaction, and reads go through SQLite's
+    memory-mapped I/O (`mmap_size`). WAL mode lets readers run while a
+    write is in progress.
+    """
+
+    def __init__(self, path: str | Path, mmap_size: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            " WITHOUT ROWID"
+        )
+
+    def read(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def write(self, key: str, data: bytes) -> None:
+        self.write_many({key: data})
+
+    def write_many(self, items: Dict[str, bytes]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO kv (key, value) VALUES (?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    list(items.items()),
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            if not prefix:
+                rows = self._db.execute("SELECT key FROM kv ORDER BY key")
+            else:
+                # range scan on the primary key instead of LIKE
+                upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                rows = self._db.execute(
+                    "SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY key",
+                    (prefix, upper),
+                )
+            return [key for (key,) in rows.fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Set
+
+from pydantic import BaseModel
+
+from models.models import FullConfig, TemplateConfig
+
+
+class ConfigDiff(BaseModel):
+    """
+    What a reload changed, by name/id. Entries cover added, removed and
+    modified items alike; `full` marks a first load where everything is new.
+    """
+
+    full: bool = False
+    states: Set[str] = set()
+    binds: Set[str] = set()  # bind targets added, removed or moved
+    actions: Set[str] = set()
+    state_actions: bool = False
+    screens: Set[str] = set()
+    modules: Set[str] = set()
+    templates: Set[str] = set()
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.full
+            or self.states
+            or self.binds
+            or self.actions
+            or self.state_actions
+            or self.screens
+            or self.modules
+            or self.templates
+        )
+
+
+def _changed(old: Dict[str, BaseModel], new: Dict[str, BaseModel]) -> Set[str]:
+    return {
+        key
+        for key in old.keys() | new.keys()
+        if key not in old
+        or key not in new
+        or old[key].model_dump() != new[key].model_dump()
+    }
+
+
+def _binds(config: FullConfig, names: Iterable[str]) -> Set[str]:
+    by_name = config.internal_states.by_name
+    return {
+        by_name[name].bind for name in names if name in by_name and by_name[name].bind
+    }
+
+
+def diff_configs(old: Optional[FullConfig], new: FullConfig) -> ConfigDiff:
+    if old is None:
+        return ConfigDiff(full=True)
+    states = _changed(old.internal_states.by_name, new.internal_states.by_name)
+    return ConfigDiff(
+        states=states,
+        binds=_binds(old, states) ^ _binds(new, states),
+        actions=_changed(old.actions.by_id, new.actions.by_id),
+        state_actions=old.actions.state_actions != new.actions.state_actions,
+        screens=_changed(old.screens_by_id, new.screens_by_id),
+        modules=_changed(old.modules_by_id, new.modules_by_id),
+    )
+
+
+def diff_templates(old: Optional[TemplateConfig], new: TemplateConfig) -> ConfigDiff:
+    if old is None:
+        return ConfigDiff(full=True)
+    return ConfigDiff(templates=_changed(old.by_name, new.by_name))
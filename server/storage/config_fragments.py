@@ -0,0 +1,115 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.models import Actions, ConfigFragment, InternalStates
+from storage.snapshot_cache import SnapshotCache, load_yaml
+from storage.storage_manager import Storage
+
+YAML_SUFFIXES = (".yaml", ".yml")
+
+
+def resolve_includes(root: Path, patterns: List[str]) -> Tuple[List[Path], List[Path]]:
+    """
+    Expand the root file's `include` entries into fragment files, in order.
+    An entry is a file, a directory (all YAML files in it, sorted) or a glob.
+    Returns the files and the directories whose contents they came from.
+    """
+    base = root.parent
+    files: List[Path] = []
+    directories: List[Path] = []
+    for pattern in patterns:
+        target = base / pattern
+        if target.is_dir():
+            directories.append(target.resolve())
+            matches = sorted(p for p in target.iterdir() if p.suffix in YAML_SUFFIXES)
+        elif any(char in pattern for char in "*?["):
+            directories.append(Path(base, pattern).parent.resolve())
+            matches = sorted(base.glob(pattern))
+        elif target.is_file():
+            matches = [target]
+        else:
+            raise FileNotFoundError(f"Included config {target} does not exist")
+        for match in matches:
+            match = match.resolve()
+            if match != root.resolve() and match not in files:
+                files.append(match)
+    return files, directories
+
+
+class FragmentCache:
+    """
+    Validated config fragments by file. A fragment is parsed and validated
+    only when its content changes; otherwise it comes from memory or, after a
+    restart, from its own snapshot under `store`.
+    """
+
+    def __init__(self, store: Optional[Storage] = None):
+        self.store = store
+        self._memory: Dict[Path, Tuple[bytes, ConfigFragment]] = {}
+
+    def _snapshot(self, path: Path) -> Optional[SnapshotCache[ConfigFragment]]:
+        if self.store is None:
+            return None
+        name = hashlib.sha256(str(path).encode()).hexdigest()[:16]
+        return SnapshotCache(self.store, name, ConfigFragment)
+
+    def load(self, path: Path, source: bytes) -> ConfigFragment:
+        digest = hashlib.sha256(source).digest()
+        cached = self._memory.get(path)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        snapshot = self._snapshot(path)
+        key = snapshot.key(source) if snapshot else b""
+        fragment = snapshot.load(key) if snapshot else None
+        if fragment is None:
+            fragment = ConfigFragment.model_validate(load_yaml(source) or {})
+            if snapshot:
+                snapshot.save(key, fragment)
+        self._memory[path] = (digest, fragment)
+        return fragment
+
+    def forget_except(self, paths: List[Path]) -> None:
+        keep = set(paths)
+        for path in list(self._memory):
+            if path not in keep:
+                del self._memory[path]
+
+
+def merge_fragments(fragments: List[Tuple[Path, ConfigFragment]]) -> Dict[str, Any]:
+    """
+    Concatenate validated fragments into FullConfig input. The models are
+    passed through as they are, so FullConfig only checks references.
+    Sections no fragment sets are left out, so FullConfig reports them.
+    """
+    owners: Dict[Tuple[str, str], Path] = {}
+
+    def claim(kind: str, key: str, path: Path) -> None:
+        other = owners.setdefault((kind, key), path)
+        if other != path:
+            raise ValueError(f"{kind} '{key}' is defined in both {other} and {path}")
+
+    screens, states, actions, state_actions, modules = [], [], [], [], []
+    sections = set()
+    for path, fragment in fragments:
+        sections |= fragment.model_fields_set
+        for screen in fragment.screens:
+            claim("Screen", screen.id, path)
+        for state in fragment.internal_states.states:
+            claim("Internal state", state.name, path)
+        for action in fragment.actions.actions:
+            claim("Action", action.id, path)
+        for module in fragment.modules:
+            claim("Module", module.id, path)
+        screens.extend(fragment.screens)
+        states.extend(fragment.internal_states.states)
+        actions.extend(fragment.actions.actions)
+        state_actions.extend(fragment.actions.state_actions)
+        modules.extend(fragment.modules)
+    merged = {
+        "screens": screens,
+        "internal_states": InternalStates(states=states),
+        "actions": Actions(actions=actions, state_actions=state_actions),
+        "modules": modules,
+    }
+    return {section: merged[section] for section in merged if section in sections}
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
-import yaml
 from pydantic import ValidationError
 
-from models.models import FullConfig
+from models.models import ConfigFragment, FullConfig
+from storage.config_diff import ConfigDiff, diff_configs
+from storage.config_fragments import FragmentCache, merge_fragments, resolve_includes
+from storage.snapshot_cache import SnapshotCache
+from storage.storage_manager import storage
 from utils.utils import singleton
 
+type ReloadListener = Callable[[FullConfig, ConfigDiff], None]
+
 
 class ConfigError(RuntimeError):
     """Raised when configuration cannot be loaded or validated."""
@@ -19,6 +24,20 @@ class ConfigManager:
     def __init__(self, path: str | Path = "config.yaml") -> None:
         self.path = Path(path)
         self._config: Optional[FullConfig] = None
+        self.cache: Optional[SnapshotCache[FullConfig]] = SnapshotCache(
+            storage.namespace("snapshots"), "config", FullConfig
+        )
+        self.fragments = FragmentCache(storage.namespace("snapshots/fragments"))
+        self._watched: List[Path] = []
+        self._reload_listeners: List[ReloadListener] = []
+
+    def add_reload_listener(self, listener: ReloadListener) -> None:
+        """
+        Register a callback invoked with the new config and a `ConfigDiff` of
+        what changed after every reload. Reloads that change nothing are not
+        reported.
+        """
+        self._reload_listeners.append(listener)
 
     def init(self, path: str | Path | None = None) -> FullConfig:
         """Initialise and load configuration from disk."""
@@ -26,21 +45,72 @@ class ConfigManager:
             self.path = Path(path)
         return self.reload()
 
-    def _read_raw(self) -> dict:
+    def _read_source(self) -> bytes:
         if not self.path.exists():
             raise ConfigError(f"Config file not found at {self.path.resolve()}")
-        try:
-            return yaml.safe_load(self.path.read_text(encoding="utf-8")) or {}
-        except Exception as exc:  # pragma: no cover - defensive guard
-            raise ConfigError(f"Failed to read config: {exc}") from exc
+        return self.path.read_bytes()
 
-    def reload(self) -> FullConfig:
-        """Force re-read of the file and validate via Pydantic models."""
-        raw = self._read_raw()
+    def _fragment(self, path: Path, source: bytes) -> ConfigFragment:
         try:
-            self._config = FullConfig.model_validate(raw)
+            return self.fragments.load(path, source)
         except ValidationError as exc:
-            raise ConfigError(f"Invalid configuration: {exc}") from exc
+            raise ConfigError(f"Invalid configuration in {path}: {exc}") from exc
+        except Exception as exc:
+            raise ConfigError(f"Failed to read config {path}: {exc}") from exc
+
+    def _includes(self, root: ConfigFragment) -> Tuple[List[Path], List[Path]]:
+        try:
+            return resolve_includes(self.path, root.include)
+        except OSError as exc:
+            raise ConfigError(str(exc)) from exc
+
+    def watch_paths(self) -> List[Path]:
+        """The root file, its fragments and the directories they come from."""
+        return self._watched or [self.path.resolve()]
+
+    def reload(self) -> FullConfig:
+        """
+        Force re-read of the config and its included fragments. Fragments
+        are validated on their own and only when their content changed; the
+        merged config only checks cross-references. An unchanged set of files
+        is served from the snapshot cache instead.
+        """
+        source = self._read_source()
+        root_path = self.path.resolve()
+        root = self._fragment(root_path, source)
+        files, directories = self._includes(root)
+        sources = [(path, path.read_bytes()) for path in files]
+        key = (
+            self.cache.key(
+                source, *(part for p, src in sources for part in (bytes(p), src))
+            )
+            if self.cache
+            else b""
+        )
+        config = self.cache.load(key) if self.cache else None
+        if config is None:
+            fragments = [(root_path, root)]
+            for path, fragment_source in sources:
+                fragment = self._fragment(path, fragment_source)
+                if fragment.include:
+                    raise ConfigError(
+                        f"Only {self.path.name} may include files ({path})"
+                    )
+                fragments.append((path, fragment))
+            try:
+                config = FullConfig.model_validate(merge_fragments(fragments))
+            except ValueError as exc:  # ValidationError included
+                raise ConfigError(f"Invalid configuration: {exc}") from exc
+            if self.cache:
+                self.cache.save(key, config)
+        self.fragments.forget_except([root_path, *files])
+        self._watched = [root_path, *files, *directories]
+        diff = diff_configs(self._config, config)
+        self._config = config
+        if diff.empty:
+            return self._config
+        for listener in list(self._reload_listeners):
+            listener(self._config, diff)
         return self._config
 
     def get(self) -> FullConfig:
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.models import FullConfig
+from storage.config_diff import ConfigDiff
+from utils.json_patch import Operation, make_patch
+from utils.utils import singleton
+
+
+def config_version(dump: Dict[str, Any]) -> str:
+    """Content hash of a dumped config, stable across restarts."""
+    canonical = json.dumps(dump, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+@singleton
+class ConfigVersions:
+    """
+    The last `keep` config versions, so a device that reports the version it
+    has can be sent an RFC 6902 patch to the current one instead of the full
+    config. Versions are content hashes.
+
+    Register `on_config_reload` with the ConfigManager before any listener
+    that reads `latest`.
+    """
+
+    def init(self, config: FullConfig, keep: int = 8) -> None:
+        self.keep = max(2, keep)  # the previous version is needed for a push
+        self._lock = threading.Lock()
+        self._versions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._patches: Dict[Tuple[str, str], List[Operation]] = {}
+        # the update for devices at the version before the current one
+        self.latest: Dict[str, Any] = self.record(config)
+
+    @property
+    def current(self) -> str:
+        return next(reversed(self._versions))
+
+    def record(self, config: FullConfig) -> Dict[str, Any]:
+        """
+        Make `config` the current version. Returns the update for devices at
+        the previous version (see `update_for`).
+        """
+        dump = config.model_dump(mode="json")
+        version = config_version(dump)
+        with self._lock:
+            previous = next(reversed(self._versions), None)
+            self._versions.pop(version, None)  # a revert becomes current again
+            self._versions[version] = dump
+            while len(self._versions) > self.keep:
+                self._versions.popitem(last=False)
+            self._patches = {
+                pair: ops
+                for pair, ops in self._patches.items()
+                if pair[0] in self._versions and pair[1] == version
+            }
+            if previous is None or previous == version:
+                return {"version": version, "patch": []}
+            update = {"version": version, "patch": self._patch(previous, version)}
+        return {"base": previous, **update}
+
+    def on_config_reload(self, config: FullConfig, diff: ConfigDiff) -> None:
+        self.latest = self.record(config)
+
+    def update_for(self, base: Optional[str]) -> Dict[str, Any]:
+        """
+        What a device at `base` needs: `{"version", "patch"}`, or
+        `{"version", "config"}` when `base` is too old or unknown.
+        """
+        with self._lock:
+            current = self.current
+            if base not in self._versions:
+                return {"version": current, "config": self._versions[current]}
+            return {"version": current, "patch": self._patch(base, current)}
+
+    def _patch(self, base: str, current: str) -> List[Operation]:
+        pair = (base, current)
+        if pair not in self._patches:
+            self._patches[pair] = make_patch(
+                self._versions[base], self._versions[current]
+            )
+        return self._patches[pair]
@@ -0,0 +1,159 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+type ChangeCallback = Callable[[Path], None]
+type Signature = Optional[Tuple[int, int]]  # (mtime_ns, size)
+
+# IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM
+WATCH_MASK = 0x002 | 0x008 | 0x080 | 0x100 | 0x200 | 0x040
+IN_NONBLOCK_CLOEXEC = 0o4000 | 0o2000000
+
+
+def _inotify_init() -> Tuple[Optional[ctypes.CDLL], int]:
+    """libc and an inotify fd, or (None, -1) where inotify is unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None, -1
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        return libc, libc.inotify_init1(IN_NONBLOCK_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, -1
+
+
+def _signature(path: Path) -> Signature:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileWatcher:
+    """
+    Calls `callback(path)` on a daemon thread for each watched path whose
+    mtime or size changed. A watched directory changes when files are added
+    to or removed from it.
+
+    inotify on the paths' directories wakes the check (editors that save by
+    replacing a file are caught); without inotify the paths are polled every
+    `interval` seconds.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[str | Path],
+        callback: ChangeCallback,
+        interval: float = 1.0,
+        debounce: float = 0.1,
+        use_inotify: bool = True,
+    ):
+        self.paths: List[Path] = []
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self._libc, self._fd = _inotify_init() if use_inotify else (None, -1)
+        self._watched: Set[Path] = set()
+        self._signatures: Dict[Path, Signature] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.set_paths(paths)
+
+    def set_paths(self, paths: Iterable[str | Path]) -> None:
+        """Replace the watched paths, keeping what is known about existing ones."""
+        self.paths = list(dict.fromkeys(Path(path).resolve() for path in paths))
+        self._signatures = {
+            path: self._signatures[path]
+            if path in self._signatures
+            else _signature(path)
+            for path in self.paths
+        }
+        if self._fd >= 0:
+            self._add_watches()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._fd >= 0 else "polling"
+
+    def _add_watches(self) -> None:
+        directories = {path.parent for path in self.paths}
+        directories.update(path for path in self.paths if path.is_dir())
+        for directory in directories - self._watched:
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), WATCH_MASK
+            )
+            if wd < 0:
+                logging.warning(f"Cannot watch {directory}, polling instead")
+                self._close()
+                return
+            self._watched.add(directory)
+
+    def _close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+            self._watched.clear()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="file-watcher", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"Watching {len(self.paths)} config files ({self.mode})")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + self.debounce + 1)
+            self._thread = None
+        self._close()
+
+    def check(self) -> List[Path]:
+        """Compare signatures and fire the callback for changed files."""
+        changed = []
+        for path in self.paths:
+            signature = _signature(path)
+            if signature == self._signatures.get(path):
+                continue
+            self._signatures[path] = signature
+            if signature is None:
+                continue  # deleted; wait for it to come back
+            changed.append(path)
+            try:
+                self.callback(path)
+            except Exception:
+                logging.exception(f"Handling a change of {path} failed")
+        return changed
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._fd < 0:
+                self._stop.wait(self.interval)
+            elif self._wait_for_events():
+                self._stop.wait(self.debounce)  # let the writer finish
+                self._drain()
+            self.check()
+
+    def _wait_for_events(self) -> bool:
+        ready, _, _ = select.select([self._fd], [], [], self.interval)
+        return bool(ready) and self._drain()
+
+    def _drain(self) -> bool:
+        """Discard pending events; the signatures tell what changed."""
+        try:
+            return bool(os.read(self._fd, 64 * 1024))
+        except (BlockingIOError, OSError):
+            return False
@@ -0,0 +1,123 @@
+import ast
+import hashlib
+import importlib.util
+import logging
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Dict, Generic, Optional, Type, TypeVar
+
+import pydantic
+import yaml
+from pydantic import BaseModel
+
+import models.models
+from storage.storage_manager import Storage
+
+try:
+    YAML_LOADER: Type[yaml.SafeLoader] = yaml.CSafeLoader
+except AttributeError:  # PyYAML built without libyaml
+    YAML_LOADER = yaml.SafeLoader
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def load_yaml(text: str | bytes) -> Any:
+    """`yaml.safe_load` using the libyaml parser when it is available."""
+    return yaml.load(text, Loader=YAML_LOADER)
+
+
+def _project_sources(module: str) -> Dict[str, Path]:
+    """`module` and every project module it imports, directly or not."""
+    root = Path(models.models.__file__).resolve().parents[1]
+    sources: Dict[str, Path] = {}
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        if name in sources:
+            continue
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            continue
+        if spec is None or spec.origin is None:
+            continue
+        path = Path(spec.origin).resolve()
+        if path.suffix != ".py" or not path.is_relative_to(root):
+            continue  # third party; covered by the versions below
+        sources[name] = path
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module)
+    return sources
+
+
+def _model_fingerprint() -> bytes:
+    """
+    Changes whenever the config models, the project modules their validators
+    import or the libraries behind them do.
+    """
+    digest = hashlib.sha256()
+    for _, path in sorted(_project_sources(models.models.__name__).items()):
+        digest.update(path.read_bytes())
+    digest.update(pydantic.VERSION.encode())
+    digest.update(sys.version.encode())
+    return digest.digest()
+
+
+MODEL_FINGERPRINT = _model_fingerprint()
+
+
+class SnapshotCache(Generic[M]):
+    """
+    Caches a validated config model as a pickle keyed by the sha256 of its
+    source bytes and the models' fingerprint, so an unchanged config loads
+    without parsing or validating it again.
+
+    File layout: 32-byte key followed by the pickled model. The key is
+    checked before anything is unpickled.
+    """
+
+    def __init__(self, store: Storage, name: str, model: Type[M]):
+        self.store = store
+        self.name = name
+        self.model = model
+
+    @property
+    def path(self) -> Path:
+        return self.store.root / f"{self.name}.snapshot"
+
+    def key(self, *sources: bytes) -> bytes:
+        digest = hashlib.sha256(MODEL_FINGERPRINT)
+        digest.update(self.model.__qualname__.encode())
+        for source in sources:
+            # length prefix, so moving bytes between sources changes the key
+            digest.update(len(source).to_bytes(8, "little"))
+            digest.update(source)
+        return digest.digest()
+
+    def load(self, key: bytes) -> Optional[M]:
+        try:
+            with self.path.open("rb") as f:
+                if f.read(len(key)) != key:
+                    return None
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logging.warning(f"Ignoring unreadable config snapshot {self.path}: {exc}")
+            return None
+        return snapshot if isinstance(snapshot, self.model) else None
+
+    def save(self, key: bytes, config: M) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            with tmp.open("wb") as f:
+                f.write(key)
+                pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            logging.warning(f"Could not write config snapshot {self.path}: {exc}")
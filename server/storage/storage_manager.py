@@ -1,6 +1,15 @@
+import atexit
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Dict, Iterator, List, Optional
+
+from storage.backends import FileBackend, SQLiteBackend, StorageBackend
+
+# "files" (one file per key) or "sqlite" (every key in esp_storage/storage.db)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "files")
 
 
 class Storage:
@@ -8,50 +17,172 @@ class Storage:
     Lightweight storage helper for reading/writing JSON or text files under a
     configurable root directory. Namespaces can be created for easy separation
     of concerns (e.g. sessions/, configs/).
+
+    The bytes live in a `StorageBackend`: files under `root` by default (each
+    replaced atomically), or a single SQLite file shared by all namespaces.
+    With `coalesce` > 0, writes are held for that many seconds and rapid
+    rewrites of a file are flushed once; reads see the pending data.
+    `indent=None` writes compact JSON. `transaction()` groups writes.
     """
 
-    def __init__(self, root: Path = Path("./esp_storage")):
+    def __init__(
+        self,
+        root: Path = Path("./esp_storage"),
+        indent: Optional[int] = 2,
+        coalesce: float = 0.0,
+        backend: Optional[StorageBackend] = None,
+        prefix: str = "",
+    ):
         self.root = root
+        self.indent = indent
+        self.coalesce = coalesce
+        self.backend = backend or FileBackend(root)
+        self.prefix = prefix
         self.root.mkdir(parents=True, exist_ok=True)
+        self._pending: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps flushed versions in order
+        self._timer: Optional[threading.Timer] = None
+        self._local = threading.local()  # per-thread transaction batch
+        if coalesce > 0:
+            atexit.register(self.flush)
+
+    def namespace(self, name: str, **options: Any) -> "Storage":
+        """
+        Return a new Storage rooted at a child directory. `indent` and
+        `coalesce` are inherited unless given.
+        """
+        options = {"indent": self.indent, "coalesce": self.coalesce, **options}
+        return Storage(
+            self.root / name,
+            backend=self.backend,
+            prefix=f"{self.prefix}{name}/",
+            **options,
+        )
+
+    def _key(self, filename: str | Path) -> str:
+        return self.prefix + Path(filename).as_posix()
+
+    def _encode_json(self, data: Any) -> bytes:
+        if self.indent is None:
+            return json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return json.dumps(data, indent=self.indent).encode("utf-8")
+
+    def _write(self, key: str, data: bytes) -> None:
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch[key] = data
+        elif self.coalesce <= 0:
+            self.backend.write(key, data)
+        else:
+            self._queue({key: data})
+
+    def _queue(self, items: Dict[str, bytes]) -> None:
+        with self._lock:
+            self._pending.update(items)  # latest write wins
+            if self._timer is None:
+                self._timer = threading.Timer(self.coalesce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
 
-    def namespace(self, name: str) -> "Storage":
-        """Return a new Storage rooted at a child directory."""
-        return Storage(self.root / name)
+    def _read(self, key: str) -> Optional[bytes]:
+        batch = getattr(self._local, "batch", None)
+        if batch is not None and key in batch:
+            return batch[key]
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            return pending
+        return self.backend.read(key)
 
-    def _resolve(self, filename: str | Path) -> Path:
-        path = self.root / Path(filename)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        return path
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group the writes made through this Storage on this thread. They reach
+        the backend together when the block ends (atomically with SQLite)
+        and are discarded if it raises.
+        """
+        if getattr(self._local, "batch", None) is not None:
+            yield  # nested: part of the outer transaction
+            return
+        self._local.batch = {}
+        try:
+            yield
+            batch = self._local.batch
+        finally:
+            self._local.batch = None
+        if not batch:
+            return
+        if self.coalesce > 0:
+            self._queue(batch)
+        else:
+            self.backend.write_many(batch)
+
+    def flush(self) -> None:
+        """Write every pending (coalesced) file now."""
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if pending:
+                self.backend.write_many(pending)
+            with self._lock:
+                # reads are served from memory until the backend has the data
+                for key, data in pending.items():
+                    if self._pending.get(key) is data:
+                        del self._pending[key]
+
+    def write_bytes(self, filename: str | Path, data: bytes) -> None:
+        self._write(self._key(filename), data)
+
+    def read_bytes(self, filename: str | Path) -> Optional[bytes]:
+        return self._read(self._key(filename))
 
     def write_json(self, filename: str | Path, data: Any) -> None:
-        path = self._resolve(filename)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        self._write(self._key(filename), self._encode_json(data))
 
     def read_json(self, filename: str | Path, default: Optional[Any] = None) -> Any:
-        path = self._resolve(filename)
-        if not path.exists():
+        raw = self._read(self._key(filename))
+        if raw is None:
             if default is not None:
                 self.write_json(filename, default)
                 return default
-            raise FileNotFoundError(f"Missing file: {path}")
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+            raise FileNotFoundError(f"Missing file: {self.root / filename}")
+        return json.loads(raw)
 
     def write_text(self, filename: str | Path, data: str) -> None:
-        path = self._resolve(filename)
-        with path.open("w", encoding="utf-8") as f:
-            f.write(data)
+        self._write(self._key(filename), data.encode("utf-8"))
 
     def read_text(self, filename: str | Path, default: Optional[str] = None) -> str:
-        path = self._resolve(filename)
-        if not path.exists():
+        raw = self._read(self._key(filename))
+        if raw is None:
             if default is not None:
                 self.write_text(filename, default)
                 return default
-            raise FileNotFoundError(f"Missing file: {path}")
-        with path.open("r", encoding="utf-8") as f:
-            return f.read()
+            raise FileNotFoundError(f"Missing file: {self.root / filename}")
+        return raw.decode("utf-8")
+
+    def delete(self, filename: str | Path) -> None:
+        key = self._key(filename)
+        # after any flush in progress, which could otherwise write it back
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+            self.backend.delete(key)
+
+    def list(self) -> List[str]:
+        """Names of the stored entries in this namespace, nested ones included."""
+        self.flush()
+        return [key[len(self.prefix) :] for key in self.backend.keys(self.prefix)]
+
+
+def _default_storage() -> Storage:
+    root = Path("./esp_storage")
+    if STORAGE_BACKEND == "sqlite":
+        return Storage(root, backend=SQLiteBackend(root / "storage.db"))
+    return Storage(root)
 
 
-storage = Storage()
+storage = _default_storage()
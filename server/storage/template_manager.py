@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
 
-import yaml
 from pydantic import ValidationError
 
 from models.models import TemplateConfig
+from storage.config_diff import ConfigDiff, diff_templates
+from storage.snapshot_cache import SnapshotCache, load_yaml
+from storage.storage_manager import storage
 from utils.utils import singleton
 
+type ReloadListener = Callable[[TemplateConfig, ConfigDiff], None]
+
 
 class TemplateError(RuntimeError):
     """Raised when configuration cannot be loaded or validated."""
@@ -19,6 +23,18 @@ class TemplateManager:
     def __init__(self, path: str | Path = "templates.yaml") -> None:
         self.path = Path(path)
         self._config: Optional[TemplateConfig] = None
+        self.cache: Optional[SnapshotCache[TemplateConfig]] = SnapshotCache(
+            storage.namespace("snapshots"), "templates", TemplateConfig
+        )
+        self._reload_listeners: List[ReloadListener] = []
+
+    def add_reload_listener(self, listener: ReloadListener) -> None:
+        """
+        Register a callback invoked with the new config and a `ConfigDiff` of
+        what changed after every reload. Reloads that change nothing are not
+        reported.
+        """
+        self._reload_listeners.append(listener)
 
     def init(self, path: str | Path | None = None) -> TemplateConfig:
         """Initialise and load configuration from disk."""
@@ -26,21 +42,41 @@ class TemplateManager:
             self.path = Path(path)
         return self.reload()
 
-    def _read_raw(self) -> dict:
+    def _read_source(self) -> bytes:
         if not self.path.exists():
             raise TemplateError(f"Config file not found at {self.path.resolve()}")
+        return self.path.read_bytes()
+
+    def _parse(self, source: bytes) -> dict:
         try:
-            return yaml.safe_load(self.path.read_text(encoding="utf-8")) or {}
+            return load_yaml(source) or {}
         except Exception as exc:  # pragma: no cover - defensive guard
             raise TemplateError(f"Failed to read config: {exc}") from exc
 
+    def watch_paths(self) -> List[Path]:
+        return [self.path.resolve()]
+
     def reload(self) -> TemplateConfig:
-        """Force re-read of the file and validate via Pydantic models."""
-        raw = self._read_raw()
-        try:
-            self._config = TemplateConfig.model_validate(raw)
-        except ValidationError as exc:
-            raise TemplateError(f"Invalid configuration: {exc}") from exc
+        """
+        Force re-read of the file and validate via Pydantic models. An
+        unchanged file is served from the snapshot cache instead.
+        """
+        source = self._read_source()
+        key = self.cache.key(source) if self.cache else b""
+        config = self.cache.load(key) if self.cache else None
+        if config is None:
+            try:
+                config = TemplateConfig.model_validate(self._parse(source))
+            except ValidationError as exc:
+                raise TemplateError(f"Invalid configuration: {exc}") from exc
+            if self.cache:
+                self.cache.save(key, config)
+        diff = diff_templates(self._config, config)
+        self._config = config
+        if diff.empty:
+            return self._config
+        for listener in list(self._reload_listeners):
+            listener(self._config, diff)
         return self._config
 
     def get(self) -> TemplateConfig:
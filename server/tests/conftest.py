@@ -0,0 +1,17 @@
+import pytest
+
+from internal_states.internal_state_handler import InternalStateHandler
+
+
+@pytest.fixture
+def state_handler(tmp_path):
+    """The InternalStateHandler on a fresh database; added listeners are dropped."""
+    handler = InternalStateHandler()
+    original_path = handler.path
+    original_listeners = list(handler._listeners)
+    handler.path = str(tmp_path / "internal_state.db")
+    handler._initialized = False
+    yield handler
+    handler.path = original_path
+    handler._initialized = False
+    handler._listeners[:] = original_listeners
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from models.models import Action, Actions, FullConfig
+from state_scheduler.action_plan import (
+    ActionCycleError,
+    ScriptBatchStep,
+    ScriptStep,
+    UnsupportedStep,
+    UpdateStep,
+    compile_actions,
+)
+
+
+class FakeServices:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, domain, service, **data):
+        self.calls.append((domain, service, data))
+
+    async def call_many(self, calls):
+        self.calls.append(list(calls))
+
+
+class FakeEngine:
+    def __init__(self):
+        self.services = FakeServices()
+
+    async def run_plan(self, plan):
+        for step in plan:
+            await step.run(self)
+
+
+def _config(actions):
+    return {
+        "screens": [],
+        "modules": [],
+        "internal_states": {
+            "states": [
+                {"name": "temp", "definition": {"type": "number", "default": 22}},
+                {
+                    "name": "power",
+                    "definition": {"type": "boolean", "default": False},
+                    "bind": "ha:climate.living_room.hvac_mode",
+                },
+            ]
+        },
+        "actions": {"actions": actions},
+    }
+
+
+def _script(action_id, service):
+    return {"id": action_id, "call_script": {"script_name": f"ha:script.{service}"}}
+
+
+def test_on_callback_is_flattened_and_parallel_scripts_batched():
+    config = FullConfig(
+        **_config(
+            [
+                _script("a", "one"),
+                _script("b", "two"),
+                {"id": "c", "update_state": {"target": "temp", "value": 5}},
+                {
+                    "id": "all",
+                    "on_callback": {
+                        "callback_id": "cb",
+                        "actions": ["a", "b", "c", "a"],
+                        "parallel": True,
+                    },
+                },
+            ]
+        )
+    )
+
+    plan = compile_actions(config)["all"]
+
+    assert [type(step) for step in plan] == [ScriptBatchStep, UpdateStep, ScriptStep]
+    assert plan[1].state.name == "temp"
+
+
+def test_ha_targets_are_not_written_into_the_mirror():
+    config = FullConfig(
+        **_config(
+            [
+                {
+                    "id": "p",
+                    "update_state": {
+                        "target": "ha:climate.living_room.hvac_mode",
+                        "value": True,
+                    },
+                },
+                {"id": "x", "update_state": {"target": "ha:light.unbound", "value": 1}},
+                {"id": "s", "call_script": {"script_name": "system.log"}},
+            ]
+        )
+    )
+
+    plans = compile_actions(config)
+
+    assert isinstance(plans["p"][0], UnsupportedStep)
+    assert isinstance(plans["x"][0], UnsupportedStep)
+    assert isinstance(plans["s"][0], UnsupportedStep)
+
+
+def test_cycles_are_rejected_by_config_and_compiler():
+    actions = [
+        {
+            "id": "check",
+            "compare": {
+                "left": "temp",
+                "operator": "gt",
+                "right": 1,
+                "on_true": "loop",
+            },
+        },
+        {"id": "loop", "on_callback": {"callback_id": "cb", "actions": ["check"]}},
+    ]
+
+    with pytest.raises(ValueError, match="cycle"):
+        FullConfig(**_config(actions))
+    # model_copy skips validation, so the compiler sees the cycle itself
+    cyclic = FullConfig(**_config([])).model_copy(
+        update={"actions": Actions(actions=[Action(**a) for a in actions])}
+    )
+    with pytest.raises(ActionCycleError):
+        compile_actions(cyclic)
+
+
+def test_compare_runs_the_precompiled_branch(state_handler):
+    config = FullConfig(
+        **_config(
+            [
+                _script("hot", "cool_down"),
+                _script("cold", "heat_up"),
+                {
+                    "id": "check",
+                    "compare": {
+                        "left": "temp",
+                        "operator": "gt",
+                        "right": 25,
+                        "on_true": "hot",
+                        "on_false": "cold",
+                    },
+                },
+            ]
+        )
+    )
+    plans = compile_actions(config)
+    engine = FakeEngine()
+
+    async def runner():
+        await state_handler.bulk_set(
+            [s.to_stored_internal_state() for s in config.internal_states.states]
+        )
+        await engine.run_plan(plans["check"])
+
+    asyncio.run(runner())
+
+    assert engine.services.calls == [("script", "heat_up", {})]
@@ -0,0 +1,77 @@
+import base64
+
+import pytest
+
+from rpc.rpc_methods import get_asset_chunk
+from storage.asset_store import AssetStore
+from storage.storage_manager import Storage
+
+
+@pytest.fixture
+def assets(tmp_path):
+    store = AssetStore()
+    store.init(Storage(tmp_path / "assets"), chunk_size=4, max_open=2)
+    yield store
+    store.close()
+
+
+def test_blobs_are_content_addressed_and_deduplicated(assets):
+    first = assets.put(b"fan icon", name="icons/fan.png")
+    second = assets.put(b"fan icon", name="icons/fan_copy.png")
+
+    assert first == second and len(first) == 64
+    assert list(assets.digests()) == [first]
+    assert assets.manifest() == {
+        "icons/fan.png": {"sha256": first, "size": 8},
+        "icons/fan_copy.png": {"sha256": first, "size": 8},
+    }
+
+
+def test_chunks_resume_from_any_offset(assets):
+    digest = assets.put(b"0123456789")
+
+    parts, offset = [], 0
+    while True:
+        chunk = assets.chunk(digest, offset)
+        parts.append(chunk["data"])
+        offset += len(chunk["data"])
+        if chunk["eof"]:
+            break
+
+    assert b"".join(parts) == b"0123456789"
+    assert len(parts) == 3
+    assert assets.read(digest, 7) == b"789"
+    assert assets.chunk(digest, 10)["data"] == b""
+
+
+def test_reads_survive_map_eviction(assets):
+    digests = [assets.put(bytes([n]) * 3) for n in range(4)]
+    empty = assets.put(b"")
+
+    for _ in range(2):
+        assert [assets.read(d, 1, 1) for d in digests] == [bytes([n]) for n in range(4)]
+    assert assets.read(empty) == b""
+
+
+def test_manifest_is_persisted_and_hashes_are_checked(assets, tmp_path):
+    (tmp_path / "src" / "icons").mkdir(parents=True)
+    (tmp_path / "src" / "icons" / "sun.bin").write_bytes(b"sun")
+    assert assets.import_directory(tmp_path / "src") == 1
+
+    reopened = AssetStore()
+    reopened.init(Storage(tmp_path / "assets"))
+    assert "icons/sun.bin" in reopened.manifest()
+    with pytest.raises(ValueError):
+        reopened.read("../../etc/passwd")
+    with pytest.raises(KeyError):
+        reopened.read("0" * 64)
+
+
+def test_chunk_length_is_converted_and_bounded(assets):
+    digest = assets.put(b"0123456789")
+
+    chunk = get_asset_chunk({"sha256": digest, "offset": "2", "length": "3"}, None)
+    assert base64.b64decode(chunk["data"]) == b"234"
+    for length in (-1, assets.max_chunk + 1, "many"):
+        reply = get_asset_chunk({"sha256": digest, "length": length}, None)
+        assert "error" in reply
@@ -0,0 +1,99 @@
+import asyncio
+
+from models.models import InternalState, NumberState
+from state_scheduler.bind_throttle import BindThrottle
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _state(**kwargs):
+    return InternalState(
+        name="power",
+        definition=NumberState(default=0),
+        bind="ha:sensor.power",
+        **kwargs,
+    )
+
+
+def test_min_interval_keeps_only_latest_value():
+    written = []
+    clock = FakeClock()
+
+    async def write(stored):
+        written.append(stored.value)
+
+    async def runner():
+        throttle = BindThrottle(write, clock=clock)
+        state = _state(min_interval=0.05)
+        for value in (1.0, 2.0, 3.0, 4.0):
+            await throttle.submit(state, state.to_stored_internal_state(value))
+        assert written == [1.0]
+        clock.now += 0.05
+        await asyncio.sleep(0.08)
+
+    asyncio.run(runner())
+
+    assert written == [1.0, 4.0]
+
+
+def test_deadband_drops_small_changes():
+    written = []
+
+    async def write(stored):
+        written.append(stored.value)
+
+    async def runner():
+        throttle = BindThrottle(write, clock=FakeClock())
+        state = _state(deadband=0.5)
+        for value in (10.0, 10.2, 10.4, 11.0, 10.7):
+            await throttle.submit(state, state.to_stored_internal_state(value))
+
+    asyncio.run(runner())
+
+    assert written == [10.0, 11.0]
+
+
+def test_unthrottled_states_write_through():
+    written = []
+
+    async def write(stored):
+        written.append(stored.value)
+
+    async def runner():
+        throttle = BindThrottle(write, clock=FakeClock())
+        state = _state()
+        for value in (1.0, 1.0, 2.0):
+            await throttle.submit(state, state.to_stored_internal_state(value))
+
+    asyncio.run(runner())
+
+    assert written == [1.0, 1.0, 2.0]
+
+
+def test_sync_resets_last_value_and_parked_value():
+    written = []
+    clock = FakeClock()
+
+    async def write(stored):
+        written.append(stored.value)
+
+    async def runner():
+        throttle = BindThrottle(write, clock=clock)
+        state = _state(min_interval=0.05, deadband=0.5)
+        for value in (10.0, 12.0):
+            await throttle.submit(state, state.to_stored_internal_state(value))
+        throttle.synced([state.to_stored_internal_state(20.0)])
+        clock.now += 0.1
+        await asyncio.sleep(0.08)
+        # within the deadband of 10.0 (the last value before the sync)
+        await throttle.submit(state, state.to_stored_internal_state(10.2))
+
+    asyncio.run(runner())
+
+    assert written == [10.0, 10.2]
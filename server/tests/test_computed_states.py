@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from internal_states.computed_states import ComputedStates
+from pydantic import ValidationError
+
+from models.models import FullConfig
+
+
+def _number(name, default=0):
+    return {"name": name, "definition": {"type": "number", "default": default}}
+
+
+def _computed(name, expression, default=0):
+    return {
+        "name": name,
+        "definition": {
+            "type": "computed",
+            "expression": expression,
+            "default": default,
+        },
+    }
+
+
+def _config(states):
+    return FullConfig(
+        screens=[],
+        modules=[],
+        actions={"actions": []},
+        internal_states={"states": states},
+    )
+
+
+def _setup(state_handler, config):
+    computed = ComputedStates()
+    computed.configure(config)
+    written = []
+    state_handler.add_listener(lambda states: written.append([s.name for s in states]))
+    seed = [s.to_stored_internal_state() for s in config.internal_states.states]
+    return computed, written, seed
+
+
+def test_dependency_cycles_are_rejected():
+    with pytest.raises(ValueError, match="depend on each other"):
+        _config([_computed("a", "b + 1"), _computed("b", "a + 1")])
+    with pytest.raises(ValueError, match="unknown internal state 'nope'"):
+        _config([_computed("a", "nope + 1")])
+
+
+def test_malformed_computed_states_raise_validation_errors():
+    missing = _computed("a", "1")
+    del missing["definition"]["expression"]
+    for state in (missing, {"name": "a", "definition": "computed"}):
+        with pytest.raises(ValidationError):
+            _config([state])
+
+
+def test_only_downstream_states_recompute_in_order(state_handler):
+    config = _config(
+        [
+            _number("a", 1),
+            _number("b", 2),
+            _number("c", 6),
+            # declared before its input to exercise the topological order
+            _computed("hot", "mean > 2", default=False),
+            _computed("mean", "avg(a, b, c)"),
+            _computed("b_double", "b * 2"),
+        ]
+    )
+    computed, written, seed = _setup(state_handler, config)
+
+    async def runner():
+        await state_handler.bulk_set(seed)
+        await computed.recompute_all()
+        snapshot = await state_handler.snapshot()
+        assert snapshot["mean"].value == 3.0
+        assert snapshot["hot"].value is True
+        assert snapshot["b_double"].value == 4.0
+
+        written.clear()
+        assert [n.state.name for n in computed.affected(["a"])] == ["mean", "hot"]
+        await state_handler.set(
+            config.internal_states.states[0].to_stored_internal_state(-2)
+        )
+        await computed.recompute(["a"])
+        return await state_handler.snapshot()
+
+    snapshot = asyncio.run(runner())
+
+    assert snapshot["mean"].value == 2.0
+    assert snapshot["hot"].value is False
+    # the source write, then one bulk write of both changed computed states
+    assert written == [["a"], ["mean", "hot"]]
+
+
+def test_unchanged_results_are_not_written(state_handler):
+    config = _config([_number("a", 5), _computed("capped", "min(a, 3)")])
+    computed, written, seed = _setup(state_handler, config)
+
+    async def runner():
+        await state_handler.bulk_set(seed)
+        await computed.recompute_all()
+        written.clear()
+        await computed.recompute(["a"])
+
+    asyncio.run(runner())
+
+    assert written == []
@@ -1,5 +1,33 @@
+import pickle
+
+import pytest
+
 from storage.config_manager import ConfigManager
 
 
 def test_parse_config():
     ConfigManager().get()
+
+
+def test_config_indexes_lookups():
+    config = ConfigManager().get()
+
+    assert config.find_screen("ac_screen") is config.screens[0]
+    assert config.internal_states.find_state_by_name("temp").name == "temp"
+    assert config.internal_states.by_bind["ha:climate.living_room.hvac_mode"].name == (
+        "power"
+    )
+    assert config.actions.find_action("sync_ac_temp").update_state.target == (
+        "ha:climate.living_room.temperature"
+    )
+    assert config.find_screen("missing") is None
+
+
+def test_config_indexes_are_read_only_and_survive_pickling():
+    config = ConfigManager().get()
+
+    with pytest.raises(TypeError):
+        config.internal_states.by_name["temp"] = None
+    clone = pickle.loads(pickle.dumps(config))
+    assert clone.internal_states.find_state_by_name("fan").name == "fan"
+    assert clone.screens_by_id.keys() == config.screens_by_id.keys()
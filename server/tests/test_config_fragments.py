@@ -0,0 +1,126 @@
+import pytest
+import yaml
+
+import storage.config_fragments as fragments
+from storage.config_fragments import FragmentCache
+from storage.config_manager import ConfigError, ConfigManager
+
+
+@pytest.fixture
+def manager():
+    manager = ConfigManager()
+    original = (manager.path, manager.cache, manager.fragments)
+    manager._config = None
+    manager.cache = None
+    manager.fragments = FragmentCache()
+    yield manager
+    manager.path, manager.cache, manager.fragments = original
+    manager._config = None
+    manager._watched = []
+
+
+def _split_config(tmp_path):
+    """The repo config as a root file plus a screens/ directory and actions.yaml."""
+    with open("config.yaml", "r") as f:
+        data = yaml.safe_load(f)
+    (tmp_path / "screens").mkdir()
+    (tmp_path / "screens" / "ac.yaml").write_text(
+        yaml.safe_dump({"screens": data["screens"]})
+    )
+    (tmp_path / "actions.yaml").write_text(
+        yaml.safe_dump({"actions": data["actions"], "modules": data["modules"]})
+    )
+    root = tmp_path / "config.yaml"
+    root.write_text(
+        yaml.safe_dump(
+            {
+                "include": ["screens", "actions.yaml"],
+                "internal_states": data["internal_states"],
+            }
+        )
+    )
+    return root, data
+
+
+def test_fragments_merge_into_one_config(tmp_path, manager):
+    root, data = _split_config(tmp_path)
+
+    config = manager.init(root)
+
+    assert config.find_screen("ac_screen") is not None
+    assert len(config.actions.actions) == len(data["actions"]["actions"])
+    assert len(config.internal_states.states) == len(data["internal_states"]["states"])
+    assert set(manager.watch_paths()) == {
+        root.resolve(),
+        (tmp_path / "screens").resolve(),
+        (tmp_path / "screens" / "ac.yaml").resolve(),
+        (tmp_path / "actions.yaml").resolve(),
+    }
+
+
+def test_only_the_changed_fragment_is_revalidated(tmp_path, manager, monkeypatch):
+    root, data = _split_config(tmp_path)
+    manager.init(root)
+    parsed = []
+    load_yaml = fragments.load_yaml
+    monkeypatch.setattr(
+        fragments,
+        "load_yaml",
+        lambda source: parsed.append(source) or load_yaml(source),
+    )
+    data["screens"][0]["state_bindings"]["fan_button"] = "power"
+    (tmp_path / "screens" / "ac.yaml").write_text(
+        yaml.safe_dump({"screens": data["screens"]})
+    )
+
+    config = manager.reload()
+
+    assert len(parsed) == 1
+    assert config.find_screen("ac_screen").state_bindings["fan_button"] == "power"
+
+
+def test_cross_fragment_references_are_checked(tmp_path, manager):
+    root, data = _split_config(tmp_path)
+    data["screens"][0]["state_bindings"]["field"] = "missing"
+    (tmp_path / "screens" / "ac.yaml").write_text(
+        yaml.safe_dump({"screens": data["screens"]})
+    )
+
+    with pytest.raises(ConfigError, match="missing"):
+        manager.init(root)
+
+
+def test_duplicate_ids_across_fragments_raise(tmp_path, manager):
+    root, data = _split_config(tmp_path)
+    (tmp_path / "screens" / "copy.yaml").write_text(
+        yaml.safe_dump({"screens": data["screens"]})
+    )
+
+    with pytest.raises(ConfigError, match="defined in both"):
+        manager.init(root)
+
+
+def test_invalid_fragment_names_its_file(tmp_path, manager):
+    root, _ = _split_config(tmp_path)
+    (tmp_path / "actions.yaml").write_text("actions: {actions: [{id: 1}]}\n")
+
+    with pytest.raises(ConfigError, match="actions.yaml"):
+        manager.init(root)
+
+
+def test_sections_missing_from_every_fragment_raise(tmp_path, manager):
+    root, data = _split_config(tmp_path)
+    (tmp_path / "actions.yaml").write_text(yaml.safe_dump({"actions": data["actions"]}))
+
+    with pytest.raises(ConfigError, match="modules"):
+        manager.init(root)
+
+
+def test_unknown_top_level_keys_raise(tmp_path, manager):
+    root, data = _split_config(tmp_path)
+    (tmp_path / "actions.yaml").write_text(
+        yaml.safe_dump({"actions": data["actions"], "module": data["modules"]})
+    )
+
+    with pytest.raises(ConfigError, match="(?s)actions.yaml.*Extra inputs"):
+        manager.init(root)
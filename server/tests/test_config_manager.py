@@ -58,3 +58,28 @@ def test_duplicate_bind_raises(tmp_path, reset_config_manager):
 
     with pytest.raises(ConfigError):
         reset_config_manager.init(path)
+
+
+def test_reload_reports_a_structural_diff(tmp_path, reset_config_manager):
+    data = _valid_config()
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(data))
+    reset_config_manager.init(path)
+    diffs = []
+    reset_config_manager.add_reload_listener(lambda config, diff: diffs.append(diff))
+
+    try:
+        reset_config_manager.reload()  # nothing changed, nobody is told
+        data["internal_states"]["states"][1]["bind"] = "ha:sensor.outside"
+        data["screens"][0]["state_bindings"]["fan_button"] = "power"
+        path.write_text(yaml.safe_dump(data))
+        reset_config_manager.reload()
+    finally:
+        reset_config_manager._reload_listeners.clear()
+
+    assert len(diffs) == 1
+    diff = diffs[0]
+    assert diff.states == {"temp"}
+    assert diff.binds == {"ha:climate.living_room.temperature", "ha:sensor.outside"}
+    assert diff.screens == {"ac_screen"}
+    assert not diff.actions and not diff.modules and not diff.full
@@ -0,0 +1,90 @@
+import pytest
+
+from rpc.rpc_methods import get_config
+from storage.config_diff import ConfigDiff
+from storage.config_manager import ConfigManager
+from storage.config_versions import ConfigVersions
+from utils.json_patch import PatchError, apply_patch, make_patch
+
+
+@pytest.fixture
+def versions():
+    versions = ConfigVersions()
+    versions.init(ConfigManager().get(), keep=3)
+    return versions
+
+
+def _edited(config, state):
+    config = config.model_copy(deep=True)
+    config.screens[0].state_bindings["fan_button"] = state
+    return config
+
+
+@pytest.mark.parametrize(
+    "old,new",
+    [
+        ({"a": 1, "b": [1, 2, 3]}, {"a": 2, "b": [1, 3], "c": {"x/y": "~"}}),
+        ([{"id": "a"}], [{"id": "a", "v": 1}, {"id": "b"}]),
+        ({"a": {"b": None}}, {"a": {"b": 0}}),
+        ({"a": 1}, {}),
+    ],
+)
+def test_patch_round_trips(old, new):
+    assert apply_patch(old, make_patch(old, new)) == new
+
+
+def test_patch_only_touches_what_changed():
+    old = {"screens": [{"id": "a", "title": "A", "rows": list(range(50))}]}
+    new = {"screens": [{"id": "a", "title": "B", "rows": list(range(50))}]}
+
+    assert make_patch(old, new) == [
+        {"op": "replace", "path": "/screens/0/title", "value": "B"}
+    ]
+
+
+def test_patch_to_a_missing_path_fails():
+    with pytest.raises(PatchError):
+        apply_patch({"a": 1}, [{"op": "replace", "path": "/b/c", "value": 1}])
+
+
+def test_reload_produces_a_patch_from_the_previous_version(versions):
+    config = ConfigManager().get()
+    base = versions.current
+    update = versions.record(_edited(config, "power"))
+
+    assert update["base"] == base
+    assert update["patch"] == [
+        {
+            "op": "replace",
+            "path": "/screens/0/state_bindings/fan_button",
+            "value": "power",
+        }
+    ]
+    assert versions.update_for(base) == {
+        "version": update["version"],
+        "patch": update["patch"],
+    }
+    assert versions.update_for(update["version"])["patch"] == []
+
+
+def test_old_versions_fall_back_to_the_full_config(versions):
+    config = ConfigManager().get()
+    first = versions.current
+    for state in ("one", "two", "three"):
+        versions.record(_edited(config, state))
+
+    update = versions.update_for(first)
+
+    assert "patch" not in update
+    assert update["config"]["screens"][0]["state_bindings"]["fan_button"] == "three"
+
+
+def test_reload_listener_records_the_update_for_the_publisher(versions):
+    config = ConfigManager().get()
+    assert get_config(None, None)["version"] == versions.current
+    base = versions.current
+
+    versions.on_config_reload(_edited(config, "power"), ConfigDiff(screens={"s"}))
+
+    assert versions.latest["base"] == base
+    assert versions.latest["version"] == versions.current != base
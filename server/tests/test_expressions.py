@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from models.models import FullConfig
+from state_scheduler.action_plan import (
+    ExpressionUpdateStep,
+    UpdateStep,
+    compile_actions,
+)
+from utils.expressions import ExpressionError, as_expression, compile_expression
+
+
+@pytest.mark.parametrize(
+    "source, values, expected",
+    [
+        ("not fan", {"fan": True}, False),
+        ("not power", {"power": "off"}, True),
+        ("1 + 2 * 3", {}, 7),
+        ("(1 + 2) * 3", {}, 9),
+        ("-temp + 1", {"temp": 4}, -3),
+        ("temp > 25 and not fan", {"temp": 26, "fan": False}, True),
+        ("temp > 25 or fan", {"temp": 20, "fan": False}, False),
+        ("not temp == 1", {"temp": 1}, False),
+        ("clamp(temp + 5, 16, 30)", {"temp": 28}, 30),
+        ("avg(a, b, c)", {"a": 1, "b": 2, "c": 6}, 3),
+        ("any(a, b)", {"a": "off", "b": "on"}, True),
+        ("round(abs(a), 1)", {"a": -1.26}, 1.3),
+        ("mode == 'cool'", {"mode": "cool"}, True),
+    ],
+)
+def test_expressions_evaluate(source, values, expected):
+    assert compile_expression(source)(values) == expected
+
+
+def test_and_or_short_circuit():
+    # the right operand is missing or not comparable, and never evaluated
+    assert compile_expression("fan and temp > 25")({"fan": False}) is False
+    assert compile_expression("fan or temp > 25")({"fan": True, "temp": "x"}) is True
+    with pytest.raises(KeyError):
+        compile_expression("fan and temp > 25")({"fan": True})
+
+
+def test_compile_extracts_dependencies_and_caches():
+    expression = compile_expression("max(a, b) - c * 2")
+
+    assert expression.deps == {"a", "b", "c"}
+    assert compile_expression("max(a, b) - c * 2") is expression
+
+
+def test_constant_subexpressions_are_folded():
+    assert compile_expression("clamp(40, 16, 30)").constant
+    assert not compile_expression("clamp(t, 16, 30)").constant
+
+
+@pytest.mark.parametrize("source", ["1 +", "foo(1)", "(a", "a b", "1 / 0", "a $ b"])
+def test_invalid_expressions_are_rejected(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+
+def test_only_braced_values_are_expressions():
+    assert as_expression("power") is None
+    assert as_expression(3) is None
+    assert as_expression("{not fan}").deps == {"fan"}
+
+
+def _config(value):
+    return {
+        "screens": [],
+        "modules": [],
+        "internal_states": {
+            "states": [
+                {"name": "temp", "definition": {"type": "number", "default": 22}},
+                {"name": "fan", "definition": {"type": "boolean", "default": True}},
+            ]
+        },
+        "actions": {
+            "actions": [
+                {"id": "set", "update_state": {"target": "fan", "value": value}}
+            ]
+        },
+    }
+
+
+def test_update_state_expression_is_compiled_and_evaluated(state_handler):
+    config = FullConfig(**_config("{not fan and temp < 30}"))
+    plan = compile_actions(config)["set"]
+    assert isinstance(plan[0], ExpressionUpdateStep)
+
+    async def runner():
+        await state_handler.bulk_set(
+            [s.to_stored_internal_state() for s in config.internal_states.states]
+        )
+        await plan[0].run(None)
+        return await state_handler.get("fan")
+
+    assert asyncio.run(runner()).value is False
+
+
+def test_constant_expressions_compile_to_plain_updates():
+    plan = compile_actions(FullConfig(**_config("{1 > 0}")))["set"]
+
+    assert isinstance(plan[0], UpdateStep)
+    assert plan[0].value is True
+
+
+def test_config_rejects_unknown_expression_states():
+    with pytest.raises(ValueError, match="unknown internal state 'window'"):
+        FullConfig(**_config("{not window}"))
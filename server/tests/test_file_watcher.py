@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from storage.file_watcher import FileWatcher
+
+
+def _watch(path, use_inotify=False):
+    changed = threading.Event()
+    seen = []
+
+    def callback(changed_path):
+        seen.append(changed_path)
+        changed.set()
+
+    watcher = FileWatcher(
+        [path], callback, interval=0.05, debounce=0.05, use_inotify=use_inotify
+    )
+    return watcher, changed, seen
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reports_changed_files(tmp_path, use_inotify):
+    path = tmp_path / "config.yaml"
+    path.write_text("a: 1\n")
+    (tmp_path / "other.yaml").write_text("")
+    watcher, changed, seen = _watch(path, use_inotify)
+    assert watcher.mode == ("inotify" if use_inotify else "polling")
+    watcher.start()
+    try:
+        (tmp_path / "other.yaml").write_text("ignored\n")
+        # replace the file like an editor saving atomically
+        replacement = tmp_path / "config.yaml.tmp"
+        replacement.write_text("a: 2\nb: 3\n")
+        replacement.replace(path)
+        assert changed.wait(2)
+    finally:
+        watcher.stop()
+
+    assert seen == [path.resolve()]
+
+
+def test_check_skips_untouched_files(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("a: 1\n")
+    watcher, _, seen = _watch(path)
+
+    assert watcher.check() == []
+    path.write_text("a: 22\n")
+    assert watcher.check() == [path.resolve()]
+    assert watcher.check() == []
+    assert seen == [path.resolve()]
+
+
+def test_directories_report_added_files(tmp_path):
+    fragments = tmp_path / "screens"
+    fragments.mkdir()
+    path = tmp_path / "config.yaml"
+    path.write_text("a: 1\n")
+    watcher, _, seen = _watch(path)
+    watcher.set_paths([path, fragments])
+
+    (fragments / "extra.yaml").write_text("screens: []\n")
+
+    assert watcher.check() == [fragments.resolve()]
+    assert seen == [fragments.resolve()]
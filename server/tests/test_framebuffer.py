@@ -0,0 +1,130 @@
+import pytest
+
+from internal_states.internal_state_handler import InternalStateHandler
+from state_publisher.frame_publisher import FramePublisher, frame_topic
+from state_publisher.framebuffer import (
+    TileCache,
+    compose_frame,
+    decode_frame,
+    dirty_tiles,
+    encode_frame,
+    mono_to_rgb565,
+    render_widget,
+    stride,
+    tile_bytes,
+)
+from state_publisher.screen_documents import ScreenDocuments
+from storage.config_manager import ConfigManager
+
+
+def _apply(frame, tiles, width, height, fmt, tile):
+    """Paint decoded tiles onto a frame, like a device would."""
+    line = stride(width, fmt)
+    frame = bytearray(frame)
+    for (column, row), raw in tiles.items():
+        start = stride(column * tile, fmt)
+        rows = min(tile, height - row * tile)
+        size = len(raw) // rows
+        for y in range(rows):
+            offset = (row * tile + y) * line + start
+            frame[offset : offset + size] = raw[y * size : (y + 1) * size]
+    return bytes(frame)
+
+
+def test_widgets_are_rendered_once_per_value():
+    render_widget.cache_clear()
+    first = render_widget("temp: 22.5", 64, 16, "mono")
+    assert render_widget("temp: 22.5", 64, 16, "mono") is first
+    assert render_widget.cache_info().hits == 1
+    assert len(first) == 64 // 8 * 16 and any(first)
+
+
+def test_rgb565_expands_mono_pixels():
+    assert mono_to_rgb565(b"\x80") == b"\xff\xff" + b"\x00\x00" * 7
+
+
+@pytest.mark.parametrize("fmt", ["mono", "rgb565"])
+def test_only_changed_tiles_are_sent(fmt):
+    width, height, tile = 64, 48, 16
+    old = compose_frame([("temp", 21.0), ("power", "on")], width, height, fmt, 16)
+    new = compose_frame([("temp", 21.0), ("power", "off")], width, height, fmt, 16)
+
+    tiles = dirty_tiles(old, new, width, height, fmt, tile)
+
+    assert tiles and all(row == 1 for _, row in tiles)
+    payload = encode_frame(new, tiles, width, height, fmt, tile, 7, TileCache())
+    header, decoded = decode_frame(payload)
+    assert header["sequence"] == 7 and not header["full"]
+    assert decoded == {
+        pos: tile_bytes(new, width, height, fmt, tile, pos) for pos in tiles
+    }
+    assert _apply(old, decoded, width, height, fmt, tile) == new
+
+
+def test_identical_tiles_are_compressed_once():
+    cache = TileCache()
+    frame = compose_frame([], 64, 32, "rgb565", 16)
+    tiles = dirty_tiles(None, frame, 64, 32, "rgb565", 16)
+
+    encode_frame(frame, tiles, 64, 32, "rgb565", 16, 0, cache, full=True)
+
+    assert len(tiles) == 8 and len(cache) == 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+class FakeHandler:
+    def __init__(self, uuid, client):
+        self.uuid = uuid
+        self.client = client
+
+
+@pytest.fixture
+def frames(tmp_path):
+    state_handler = InternalStateHandler()
+    original_path = state_handler.path
+    state_handler.path = str(tmp_path / "internal_state.db")
+    state_handler._initialized = False
+    ScreenDocuments().init()
+    client = FakeClient()
+    frames = FramePublisher()
+    frames.init(window=60)
+    yield frames, client
+    frames.stop()
+    state_handler.path = original_path
+    state_handler._initialized = False
+
+
+def test_devices_share_a_view_and_get_changed_tiles(frames):
+    frames, client = frames
+    frames.subscribe(FakeHandler(0, client), "ac_screen", 128, 64, "mono")
+    frames.subscribe(FakeHandler(1, client), "ac_screen", 128, 64, "mono")
+    assert len(frames.views) == 1
+    header, full = decode_frame(client.published[0][1])
+    assert header["full"] and len(full) == 8 * 4
+    client.published.clear()
+
+    temp = ConfigManager().get().internal_states.find_state_by_name("temp")
+    changed = [temp.to_stored_internal_state(30.0)]
+    ScreenDocuments().on_states_changed(changed)
+    frames.on_states_changed(changed)
+    frames.flush()
+
+    assert [topic for topic, _ in client.published] == [frame_topic(0), frame_topic(1)]
+    header, tiles = decode_frame(client.published[0][1])
+    assert header["sequence"] == 1
+    assert 0 < len(tiles) < len(full)
+    assert {row for _, row in tiles} == {1}  # the temp row only
+
+
+def test_invalid_geometry_is_rejected(frames):
+    frames, client = frames
+    with pytest.raises(ValueError):
+        frames.subscribe(FakeHandler(0, client), "ac_screen", 100, 64, "mono")
+    assert not frames.views and not client.published
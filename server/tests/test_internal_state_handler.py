@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+from internal_states.internal_state_handler import SyncInternalStateHandler
+from models.models import BooleanState, InternalState, NumberState
+
+
+def _states():
+    return [
+        InternalState(name="temp", definition=NumberState(default=21)),
+        InternalState(name="fan", definition=BooleanState(default=True)),
+        InternalState(name="humidity", definition=NumberState(default=40)),
+    ]
+
+
+def test_get_many_returns_only_requested_states(state_handler):
+    async def runner():
+        await state_handler.bulk_set([s.to_stored_internal_state() for s in _states()])
+        return await state_handler.get_many(["temp", "fan", "missing", "temp"])
+
+    result = asyncio.run(runner())
+
+    assert set(result) == {"temp", "fan"}
+    assert result["temp"].value == 21
+    assert result["fan"].value is True
+
+
+def test_snapshot_returns_every_state(state_handler):
+    async def runner():
+        await state_handler.bulk_set([s.to_stored_internal_state() for s in _states()])
+        return await state_handler.snapshot()
+
+    result = asyncio.run(runner())
+
+    assert set(result) == {"temp", "fan", "humidity"}
+
+
+def test_listeners_receive_written_states(state_handler):
+    received = []
+    state_handler.add_listener(received.append)
+    try:
+        stored = _states()[0].to_stored_internal_state(25)
+        asyncio.run(state_handler.set(stored))
+    finally:
+        state_handler.remove_listener(received.append)
+
+    assert [[s.name for s in batch] for batch in received] == [["temp"]]
+
+
+def test_sync_handler_runs_concurrently_from_several_threads(state_handler):
+    sync = SyncInternalStateHandler()
+    sync.bulk_set([s.to_stored_internal_state() for s in _states()])
+    errors = []
+    start = threading.Barrier(4)
+
+    def reader():
+        start.wait()
+        try:
+            for _ in range(20):
+                assert set(sync.get_many(["temp", "fan"])) == {"temp", "fan"}
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
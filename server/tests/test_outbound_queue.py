@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from rpc.outbound_queue import OutboundQueue, merge_params
+from rpc.rpc_protocol import deserialize
+from rpc.rpc_session_handler import DeviceOffline, RPCSessionHandler
+from storage.storage_manager import Storage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def subscribe(self, topic, callback, json_payload=False):
+        pass
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return Storage(tmp_path / "outbox", indent=None)
+
+
+def test_merge_params_keeps_latest_value_per_key():
+    old = {"screens": {"a": {"x": 1, "y": 2}}, "states": {"s": True}}
+    new = {"screens": {"a": {"x": 3}, "b": {"z": 4}}}
+
+    assert merge_params(old, new) == {
+        "screens": {"a": {"x": 3, "y": 2}, "b": {"z": 4}},
+        "states": {"s": True},
+    }
+
+
+def test_keyed_entries_coalesce_and_move_to_the_end(store):
+    queue = OutboundQueue(store, 1)
+    queue.put("state_delta", {"states": {"a": 1, "b": 1}}, key="state_delta")
+    queue.put("config_changed", {"version": "v2"})
+    queue.put("state_delta", {"states": {"a": 2}}, key="state_delta")
+
+    assert queue.drain() == [
+        ("config_changed", {"version": "v2"}),
+        ("state_delta", {"states": {"a": 2, "b": 1}}),
+    ]
+    assert queue.drain() == []
+    assert store.list() == []
+
+
+def test_entries_expire_and_are_bounded(store):
+    clock = FakeClock()
+    queue = OutboundQueue(store, 1, ttl=10, max_entries=2, clock=clock)
+    queue.put("a", 1)
+    queue.put("b", 2, ttl=100)
+    clock.now += 20
+
+    assert len(queue) == 1
+    queue.put("c", 3)
+    queue.put("d", 4)
+
+    assert queue.drain() == [("c", 3), ("d", 4)]
+
+
+def test_queue_survives_a_restart(store):
+    OutboundQueue(store, 7).put("screens_changed", {"screens": ["s"]})
+    store.flush()
+
+    assert OutboundQueue(store, 7).drain() == [("screens_changed", {"screens": ["s"]})]
+    assert OutboundQueue(store, 8).drain() == []
+
+
+def test_offline_device_gets_queued_messages_in_order(store):
+    client = FakeClient()
+    handler = RPCSessionHandler(
+        3, client, default_timeout=0.01, outbox=OutboundQueue(store, 3)
+    )
+
+    with pytest.raises(TimeoutError):
+        handler.call("get_time", None)
+    assert not handler.online
+    client.published.clear()
+
+    with pytest.raises(DeviceOffline):
+        handler.call("get_time", None)
+    handler.notify("state_delta", {"states": {"a": 1}}, key="state_delta")
+    handler.notify("screens_changed", {"screens": ["s"]})
+    handler.notify("state_delta", {"states": {"a": 2}}, key="state_delta")
+    assert client.published == []
+
+    handler._on_message(
+        json.dumps({"jsonrpc": "2.0", "method": "ping", "params": 1, "id": "9"})
+    )
+
+    assert handler.online
+    assert {topic for topic, _ in client.published} == {"espdisplay/3/server"}
+    # what a device (or client.py) parses from the replay
+    *replay, (_, reply) = client.published
+    notes = [deserialize(payload).request for _, payload in replay]
+    assert [(note.method, note.params) for note in notes] == [
+        ("screens_changed", {"screens": ["s"]}),
+        ("state_delta", {"states": {"a": 2}}),
+    ]
+    assert reply.result == {"pong": 1}
+
+
+def test_sleep_notification_takes_device_offline(store):
+    client = FakeClient()
+    handler = RPCSessionHandler(4, client, outbox=OutboundQueue(store, 4))
+
+    handler._on_message(json.dumps({"jsonrpc": "2.0", "method": "sleep"}))
+    handler.notify("screens_changed", {"screens": ["s"]})
+
+    assert client.published == []
+    assert json.loads(store.read_bytes("4.json"))[0]["method"] == "screens_changed"
+
+
+def test_without_outbox_notifications_are_sent_directly():
+    client = FakeClient()
+    handler = RPCSessionHandler(5, client, default_timeout=0.01)
+
+    with pytest.raises(TimeoutError):
+        handler.call("get_time", None)
+    handler.notify("screens_changed", {"screens": ["s"]})
+
+    assert handler.online
+    assert len(client.published) == 2
@@ -21,13 +21,13 @@ def test_update_subscriptions_creates_handlers(monkeypatch, tmp_path, reset_rpc)
     created = []
 
     class FakeHandler:
-        def __init__(self, uuid, client, default_timeout):
+        def __init__(self, uuid, client, default_timeout, outbox=None):
             created.append((uuid, client, default_timeout))
             self.uuid = uuid
 
     monkeypatch.setattr(rh, "RPCSessionHandler", FakeHandler)
 
-    reset_rpc.init(client="client", default_timeout=3.0)
+    reset_rpc.init(client="client", default_timeout=3.0, outbox=Storage(tmp_path))
     session_manager = SessionManager()
     session_manager.sessions = [1, 2]
     reset_rpc.handlers = []
@@ -0,0 +1,110 @@
+import asyncio
+
+from models.models import InternalState, NumberState, StateBasedAction
+from state_scheduler.rule_engine import RuleEngine, compile_rules
+
+
+class Marker:
+    """A plan step that records when it starts and finishes."""
+
+    def __init__(self, log, name, delay=0.02):
+        self.log = log
+        self.name = name
+        self.delay = delay
+
+    async def run(self, engine):
+        self.log.append(f"start {self.name}")
+        await asyncio.sleep(self.delay)
+        self.log.append(f"end {self.name}")
+
+
+def _stored(value, name="temp"):
+    state = InternalState(name=name, definition=NumberState(default=0))
+    return state.to_stored_internal_state(value)
+
+
+def _engine(log, policy, watched="temp"):
+    async def run(plan):
+        for step in plan:
+            await step.run(None)
+
+    engine = RuleEngine(run)
+    plans = {"mark": (Marker(log, "mark"),)}
+    engine._rules = compile_rules(
+        [StateBasedAction(on_state=watched, actions=["mark"], policy=policy)], plans
+    )
+    return engine
+
+
+def _flap(engine, values):
+    async def runner():
+        engine.attach(asyncio.get_running_loop())
+        for value in values:
+            engine.on_states_changed([_stored(value)])
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(runner())
+
+
+def test_rules_are_indexed_by_state():
+    index = compile_rules(
+        [
+            StateBasedAction(on_state="temp", actions=["a", "b"]),
+            StateBasedAction(on_state="fan", actions=["b"]),
+        ],
+        {"a": ("A",), "b": ("B",)},
+    )
+
+    assert [rule.plan for rule in index["temp"]] == [("A", "B")]
+    assert [rule.plan for rule in index["fan"]] == [("B",)]
+
+
+def test_queue_coalesces_triggers_into_one_follow_up_run():
+    log = []
+    _flap(_engine(log, "queue"), [1, 2, 3])
+
+    assert log == ["start mark", "end mark", "start mark", "end mark"]
+
+
+def test_drop_ignores_triggers_while_running():
+    log = []
+    _flap(_engine(log, "drop"), [1, 2, 3])
+
+    assert log == ["start mark", "end mark"]
+
+
+def test_restart_cancels_the_running_execution():
+    log = []
+    _flap(_engine(log, "restart"), [1, 2, 3])
+
+    assert log == ["start mark", "start mark", "start mark", "end mark"]
+
+
+def test_unchanged_and_unwatched_values_do_not_trigger():
+    log = []
+    engine = _engine(log, "queue")
+
+    async def runner():
+        engine.attach(asyncio.get_running_loop())
+        engine.on_states_changed([_stored(1)])
+        await asyncio.sleep(0.05)
+        engine.on_states_changed([_stored(1), _stored(5, name="fan")])
+        await asyncio.sleep(0.05)
+
+    asyncio.run(runner())
+
+    assert log == ["start mark", "end mark"]
+
+
+def test_seeded_values_do_not_trigger_until_they_change():
+    log = []
+    engine = _engine(log, "queue")
+    engine.seed({"temp": _stored(1), "fan": _stored(5, name="fan")})
+
+    assert engine.unseeded() == set()
+    _flap(engine, [1])
+    assert log == []
+
+    _flap(engine, [2])
+    assert log == ["start mark", "end mark"]
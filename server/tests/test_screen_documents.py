@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from internal_states.internal_state_handler import (
+    InternalStateHandler,
+    SyncInternalStateHandler,
+)
+from rpc.rpc_protocol import RawResult, make_raw_response
+from state_publisher.screen_documents import ScreenDocuments
+from storage.config_diff import ConfigDiff
+from storage.config_manager import ConfigManager
+
+
+@pytest.fixture
+def documents(tmp_path):
+    handler = InternalStateHandler()
+    original_path = handler.path
+    handler.path = str(tmp_path / "internal_state.db")
+    handler._initialized = False
+    documents = ScreenDocuments()
+    documents.init()
+    yield documents
+    handler.path = original_path
+    handler._initialized = False
+
+
+def _stored(name, value):
+    state = ConfigManager().get().internal_states.find_state_by_name(name)
+    return state.to_stored_internal_state(value)
+
+
+def test_document_joins_template_bindings_and_values(documents):
+    SyncInternalStateHandler().set(_stored("temp", 22.5))
+
+    document = json.loads(documents.render("ac_screen"))
+
+    assert document["template"] == "ac_template"
+    assert list(document["fields"]) == ["power_button", "temp_display", "fan_button"]
+    assert document["fields"]["temp_display"] == {
+        "state": "temp",
+        "value": 22.5,
+        "callback": None,
+    }
+    assert document["fields"]["fan_button"]["callback"] == "fan_toggle"
+    assert documents.render("missing") is None
+
+
+def test_state_changes_patch_the_document(documents):
+    first = documents.render("ac_screen")
+    assert documents.render("ac_screen") is first  # shared until something changes
+
+    documents.on_states_changed([_stored("temp", 30.0), _stored("too_hot", True)])
+    document = json.loads(documents.render("ac_screen"))
+
+    assert document["fields"]["temp_display"]["value"] == 30.0
+    assert document["revision"] == json.loads(first)["revision"] + 1
+
+
+def test_reload_rebuilds_only_changed_screens(documents):
+    documents.on_states_changed([_stored("temp", 21.0)])
+    before = documents.render("ac_screen")
+
+    documents.on_config_reload(None, ConfigDiff(actions={"fan_toggle"}))
+    assert documents.render("ac_screen") is before
+
+    documents.on_config_reload(None, ConfigDiff(templates={"ac_template"}))
+    after = json.loads(documents.render("ac_screen"))
+    assert after["revision"] == json.loads(before)["revision"] + 1
+    assert after["fields"]["temp_display"]["value"] == 21.0
+
+
+def test_raw_results_are_spliced_into_the_response():
+    response = make_raw_response(RawResult(b'{"a":[1,2]}'), "7")
+
+    assert json.loads(response) == {
+        "jsonrpc": "2.0",
+        "result": {"a": [1, 2]},
+        "id": "7",
+    }
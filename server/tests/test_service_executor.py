@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from homeassistant_api.errors import RequestError
+
+from state_scheduler.service_executor import HAServiceExecutor
+
+
+class FakeClient:
+    """Stands in for a WebsocketClient; records calls made through it."""
+
+    def __init__(self, log, fail_first=0, delay=0.0):
+        self.log = log
+        self.fail_first = fail_first
+        self.delay = delay
+        self.entered = False
+
+    def __enter__(self):
+        self.entered = True
+        return self
+
+    def __exit__(self, *exc):
+        self.entered = False
+
+    def trigger_service_with_response(self, domain, service, **data):
+        time.sleep(self.delay)
+        with self.log["lock"]:
+            self.log["calls"].append((domain, service, data))
+            if self.log["failures"] < self.fail_first:
+                self.log["failures"] += 1
+                raise ConnectionError("socket closed")
+        return {"ok": data}
+
+
+def _log():
+    return {"lock": threading.Lock(), "calls": [], "failures": 0}
+
+
+def test_identical_in_flight_calls_share_one_round_trip():
+    log = _log()
+    executor = HAServiceExecutor(lambda: FakeClient(log, delay=0.05))
+
+    async def runner():
+        return await asyncio.gather(
+            executor.call("light", "turn_on", entity_id="light.a"),
+            executor.call("light", "turn_on", entity_id="light.a"),
+            executor.call("light", "turn_on", entity_id="light.b"),
+        )
+
+    results = asyncio.run(runner())
+
+    assert results[0] == results[1] == {"ok": {"entity_id": "light.a"}}
+    assert len(log["calls"]) == 2
+
+
+def test_failed_calls_are_retried_with_fresh_connections():
+    log = _log()
+    clients = []
+
+    def factory():
+        clients.append(FakeClient(log, fail_first=2))
+        return clients[-1]
+
+    executor = HAServiceExecutor(factory, retries=3, backoff=0.001)
+    result = asyncio.run(executor.call("script", "run"))
+
+    assert result == {"ok": {}}
+    assert len(log["calls"]) == 3
+    assert len(clients) == 3
+
+
+def test_request_errors_are_not_retried():
+    calls = []
+
+    class Rejecting(FakeClient):
+        def trigger_service_with_response(self, domain, service, **data):
+            calls.append(service)
+            raise RequestError("not_found", "unknown service")
+
+    executor = HAServiceExecutor(lambda: Rejecting(_log()), backoff=0.001)
+
+    with pytest.raises(RequestError):
+        asyncio.run(executor.call("script", "missing"))
+    assert calls == ["missing"]
+
+
+def test_call_many_respects_concurrency_limit():
+    log = _log()
+    active = {"now": 0, "peak": 0}
+
+    class Tracking(FakeClient):
+        def trigger_service_with_response(self, domain, service, **data):
+            with log["lock"]:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.02)
+            with log["lock"]:
+                active["now"] -= 1
+            return service
+
+    executor = HAServiceExecutor(lambda: Tracking(log), concurrency=2)
+    calls = [("script", f"s{i}", {}) for i in range(6)]
+
+    results = asyncio.run(executor.call_many(calls))
+
+    assert results == [f"s{i}" for i in range(6)]
+    assert active["peak"] == 2
+
+
+def test_cancelled_leader_leaves_the_shared_call_to_followers():
+    log = _log()
+    executor = HAServiceExecutor(lambda: FakeClient(log, delay=0.05))
+
+    async def runner():
+        leader = asyncio.ensure_future(
+            executor.call("light", "turn_on", entity_id="light.a")
+        )
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(
+            executor.call("light", "turn_on", entity_id="light.a")
+        )
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    result, leader_cancelled = asyncio.run(runner())
+
+    assert leader_cancelled
+    assert result == {"ok": {"entity_id": "light.a"}}
+    assert len(log["calls"]) == 1
+
+
+def test_non_idempotent_calls_are_not_shared():
+    log = _log()
+    executor = HAServiceExecutor(lambda: FakeClient(log, delay=0.02))
+
+    async def runner():
+        await asyncio.gather(
+            executor.call("light", "toggle", entity_id="light.a"),
+            executor.call("light", "toggle", entity_id="light.a"),
+        )
+
+    asyncio.run(runner())
+
+    assert len(log["calls"]) == 2
@@ -0,0 +1,70 @@
+import pytest
+import yaml
+
+from models.models import FullConfig
+from storage.config_manager import ConfigManager
+from storage.snapshot_cache import SnapshotCache, _project_sources
+from storage.storage_manager import Storage
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConfigManager()
+    original = (manager.path, manager.cache)
+    manager._config = None
+    manager.cache = SnapshotCache(Storage(tmp_path / "snapshots"), "config", FullConfig)
+    yield manager
+    manager.path, manager.cache = original
+    manager._config = None
+
+
+def _write_config(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(open("config.yaml").read())
+    return path
+
+
+def test_warm_start_skips_parsing_and_validation(tmp_path, manager, monkeypatch):
+    path = _write_config(tmp_path)
+    cold = manager.init(path)
+    assert manager.cache.path.exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("snapshot should have been used")
+
+    monkeypatch.setattr(FullConfig, "model_validate", fail)
+    monkeypatch.setattr("storage.config_fragments.load_yaml", fail)
+    manager._config = None
+    warm = manager.init(path)
+
+    assert warm == cold
+    assert warm.internal_states.find_state_by_name("temp") is not None
+
+
+def test_changed_source_misses_the_snapshot(tmp_path, manager):
+    path = _write_config(tmp_path)
+    manager.init(path)
+    data = yaml.safe_load(path.read_text())
+    data["internal_states"]["states"][0]["definition"]["default"] = "on"
+    path.write_text(yaml.safe_dump(data))
+
+    config = manager.reload()
+
+    assert config.internal_states.find_state_by_name("power").definition.default == "on"
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path, manager):
+    path = _write_config(tmp_path)
+    manager.init(path)
+    key = manager.cache.key(path.read_bytes())
+    manager.cache.path.write_bytes(key + b"not a pickle")
+
+    assert manager.cache.load(key) is None
+    assert manager.reload().find_screen("ac_screen") is not None
+
+
+def test_fingerprint_covers_the_modules_the_validators_import():
+    sources = _project_sources("models.models")
+
+    assert {"models.models", "utils.expressions"} <= sources.keys()
+    assert "pydantic" not in sources
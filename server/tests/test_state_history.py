@@ -0,0 +1,64 @@
+import pytest
+
+from internal_states.state_history import Ring, StateHistory, StateSeries
+from models.models import BooleanState, HistoryConfig, InternalState, NumberState
+
+
+def test_ring_keeps_newest_rows():
+    ring = Ring(3, 1)
+    for i in range(5):
+        ring.append((float(i), float(i * 10)))
+
+    assert list(ring.rows()) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+    assert ring.oldest() == 2.0
+
+
+def test_series_rolls_samples_into_minute_and_hour_buckets():
+    series = StateSeries(HistoryConfig(raw_size=4, minute_size=10, hour_size=10))
+    series.record(0.0, 1.0)
+    series.record(30.0, 3.0)
+    series.record(60.0, 10.0)
+    series.record(3600.0, 20.0)
+
+    assert list(series.minute.rows()) == [
+        (0.0, 2.0, 1.0, 3.0),
+        (60.0, 10.0, 10.0, 10.0),
+    ]
+    # both closed minutes sit in the still-open first hour bucket
+    assert list(series.hour.rows()) == []
+    assert series.query(0.0, 10_000.0, "hour")[1] == [(0.0, 14.0 / 3, 1.0, 10.0)]
+    assert series.query(0.0, 10_000.0, "raw")[1][-1] == (3600.0, 20.0)
+
+
+def test_query_picks_finest_tier_covering_range():
+    series = StateSeries(HistoryConfig(raw_size=2, minute_size=10, hour_size=10))
+    for t in (0.0, 60.0, 120.0, 180.0):
+        series.record(t, t)
+
+    assert series.pick_resolution(150.0) == "raw"
+    assert series.pick_resolution(0.0) == "minute"
+
+
+def test_history_round_trips_through_disk(tmp_path):
+    path = tmp_path / "state_history.bin"
+    history = StateHistory()
+    history.init(path)
+    history.series = {"temp": StateSeries(HistoryConfig(raw_size=5))}
+    history.series["temp"].record(100.0, 21.5)
+    history.save()
+
+    history.init(path)
+
+    assert history.query("temp", 0.0, 200.0, "raw") == ("raw", [(100.0, 21.5)])
+    with pytest.raises(KeyError):
+        history.query("missing")
+
+
+def test_history_rejects_non_number_states():
+    InternalState(
+        name="temp", definition=NumberState(default=1), history=HistoryConfig()
+    )
+    with pytest.raises(ValueError):
+        InternalState(
+            name="fan", definition=BooleanState(default=False), history=HistoryConfig()
+        )
@@ -0,0 +1,138 @@
+import pytest
+
+from models.models import (
+    BooleanState,
+    InternalState,
+    NumberState,
+    Screen,
+    Template,
+    TemplateField,
+)
+from rpc.rpc_handler import RPCHandler
+from state_publisher.state_publisher import CONFIG_CHANGED_METHOD, StatePublisher
+from storage.config_diff import ConfigDiff
+from storage.config_manager import ConfigManager
+from storage.config_versions import ConfigVersions
+
+
+class FakeHandler:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.sent = []
+
+    def notify(self, method, params, key=None):
+        self.sent.append((method, params))
+
+
+@pytest.fixture
+def publisher():
+    rpc = RPCHandler()
+    original = getattr(rpc, "handlers", None)
+    rpc.handlers = [FakeHandler(0), FakeHandler(1)]
+    publisher = StatePublisher()
+    publisher.init(window=60)
+    yield publisher
+    publisher.stop()
+    rpc.handlers = original
+
+
+def _stored(name, value):
+    definition = (
+        BooleanState(default=False)
+        if isinstance(value, bool)
+        else NumberState(default=0)
+    )
+    return InternalState(name=name, definition=definition).to_stored_internal_state(
+        value
+    )
+
+
+def test_screen_bindings_override_template_defaults():
+    template = Template(
+        name="card",
+        fields=[
+            TemplateField(name="title", bind_to_internal="a"),
+            TemplateField(name="value", bind_to_internal="b"),
+        ],
+    )
+    screen = Screen(id="s", template="card", state_bindings={"value": "c"})
+
+    assert screen.resolve_bindings(template) == {"title": "a", "value": "c"}
+
+
+def test_index_maps_states_to_screen_fields(publisher):
+    assert publisher.index["temp"] == [("ac_screen", "temp_display")]
+    assert "timer_module_state" not in publisher.index
+
+
+def test_changes_are_coalesced_per_device(publisher):
+    publisher.on_states_changed([_stored("temp", 21.0)])
+    publisher.on_states_changed([_stored("temp", 23.5), _stored("fan", True)])
+    publisher.on_states_changed([_stored("timer_module_state", 5.0)])
+    publisher.flush()
+
+    for handler in RPCHandler().handlers:
+        assert handler.sent == [
+            (
+                "state_delta",
+                {"screens": {"ac_screen": {"temp_display": 23.5, "fan_button": True}}},
+            )
+        ]
+
+
+def test_devices_only_receive_declared_screens(publisher):
+    publisher.set_interest(1, screens=["other_screen"])
+    publisher.on_states_changed([_stored("temp", 20.0)])
+    publisher.flush()
+
+    first, second = RPCHandler().handlers
+    assert len(first.sent) == 1
+    assert second.sent == []
+    assert publisher.devices_for_screen("ac_screen") == [0]
+
+
+def test_only_interested_devices_are_visited(publisher):
+    assert publisher.set_interest(0, states=["timer_module_state"]) == {
+        "timer_module_state"
+    }
+    assert publisher.set_interest(1, screens=["ac_screen"]) == {"power", "temp", "fan"}
+
+    publisher.on_states_changed([_stored("timer_module_state", 3.0)])
+    publisher.on_states_changed([_stored("temp", 19.0)])
+    publisher.flush()
+
+    first, second = RPCHandler().handlers
+    assert first.sent == [("state_delta", {"states": {"timer_module_state": 3.0}})]
+    assert second.sent == [
+        ("state_delta", {"screens": {"ac_screen": {"temp_display": 19.0}}})
+    ]
+    assert publisher.interest.devices_for("temp") == {1}
+
+
+def test_config_reload_notifies_only_devices_on_changed_screens(publisher):
+    publisher.set_interest(0, screens=["ac_screen"])
+    publisher.set_interest(1, screens=["other"])
+
+    publisher.on_config_reload(None, ConfigDiff(screens={"ac_screen"}))
+    publisher.on_config_reload(None, ConfigDiff(actions={"unrelated"}))
+
+    handlers = RPCHandler().handlers
+    assert handlers[0].sent == [("screens_changed", {"screens": ["ac_screen"]})]
+    assert handlers[1].sent == []
+
+
+def test_config_reload_pushes_a_patch_to_every_device(publisher):
+    config = ConfigManager().get()
+    ConfigVersions().init(config)
+    edited = config.model_copy(deep=True)
+    edited.screens[0].state_bindings["fan_button"] = "power"
+
+    diff = ConfigDiff(screens={"ac_screen"})
+    ConfigVersions().on_config_reload(edited, diff)
+    publisher.on_config_reload(edited, diff)
+
+    for handler in RPCHandler().handlers:
+        method, update = handler.sent[0]
+        assert method == CONFIG_CHANGED_METHOD
+        assert update["version"] == ConfigVersions().current
+        assert update["patch"][0]["path"] == "/screens/0/state_bindings/fan_button"
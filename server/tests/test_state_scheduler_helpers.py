@@ -1,7 +1,15 @@
+import asyncio
+
+from homeassistant_api import State
+
 from models.models import BooleanState, InternalState, NumberState
+from state_scheduler.ha_listener import AsyncWrapperHAListener
 from state_scheduler.state_scheduler import (
-    bulk_add_trigger,
+    bound_entity_ids,
+    build_entity_index,
+    extract_ha_value,
     get_ha_bind_dict,
+    split_ha_bind,
     states_to_stored_states,
 )
 
@@ -33,19 +41,98 @@ def test_get_ha_bind_dict_filters_and_strips_prefix():
     assert result == {"switch": "light.kitchen"}
 
 
-def test_bulk_add_trigger_registers_all_entities():
-    recorded = []
+def test_split_ha_bind_separates_attributes():
+    assert split_ha_bind("light.kitchen") == ("light.kitchen", None)
+    assert split_ha_bind("climate.living_room.temperature") == (
+        "climate.living_room",
+        "temperature",
+    )
+
+
+def test_build_entity_index_groups_states_by_entity():
+    mode = InternalState(
+        name="mode", definition=NumberState(default=0), bind="ha:climate.room"
+    )
+    target = InternalState(
+        name="target",
+        definition=NumberState(default=20),
+        bind="ha:climate.room.temperature",
+    )
+    free = InternalState(name="free", definition=BooleanState(default=False))
+
+    index = build_entity_index([mode, target, free])
+
+    assert index == {"climate.room": [(mode, None), (target, "temperature")]}
+
+
+def test_bound_entity_ids_covers_attribute_binds():
+    binds = {
+        "ha:climate.living_room.temperature",
+        "ha:climate.living_room.hvac_mode",
+        "ha:switch.fan",
+        "mqtt:fan",
+    }
+
+    assert bound_entity_ids(binds) == {"climate.living_room", "switch.fan"}
+
+
+def test_extract_ha_value_reads_state_or_attribute():
+    new_state = {"state": "heat", "attributes": {"temperature": 23}}
+
+    assert extract_ha_value(new_state, None) == "heat"
+    assert extract_ha_value(new_state, "temperature") == 23
+    assert extract_ha_value(new_state, "missing") is None
+
+
+def test_listener_dispatches_only_watched_entities():
+    received = []
+
+    async def callback(entity_id, new_state):
+        received.append((entity_id, new_state["state"]))
+
+    async def runner():
+        listener = AsyncWrapperHAListener(client=None)
+        listener._loop = asyncio.get_running_loop()
+        listener.watch(["light.kitchen"], callback)
+        listener.handle_event(
+            {"entity_id": "light.kitchen", "new_state": {"state": "on"}}
+        )
+        listener.handle_event(
+            {"entity_id": "light.other", "new_state": {"state": "on"}}
+        )
+        listener.handle_event({"entity_id": "light.kitchen", "new_state": None})
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    asyncio.run(runner())
+
+    assert received == [("light.kitchen", "on")]
+
+
+def test_listener_sync_keeps_only_watched_entities():
+    synced = []
+
+    class FakeClient:
+        def get_states(self):
+            return (
+                State(entity_id="light.kitchen", state="on"),
+                State(entity_id="sensor.other", state="12"),
+            )
+
+    async def on_state(entity_id, new_state):
+        pass
 
-    class FakeListener:
-        def add_trigger(self, trigger_type, callback, **kwargs):
-            recorded.append((trigger_type, kwargs, callback))
+    async def on_sync(states):
+        synced.append(states)
 
-    entities = ["light.kitchen", "sensor.outdoor"]
-    callback = lambda *args, **kwargs: None  # noqa: E731
-    listener = FakeListener()
+    async def runner():
+        listener = AsyncWrapperHAListener(client=FakeClient())
+        listener._loop = asyncio.get_running_loop()
+        listener.watch(["light.kitchen"], on_state, on_sync)
+        listener.sync_states()
+        for _ in range(3):
+            await asyncio.sleep(0)
 
-    bulk_add_trigger(entities, listener, callback, type="state")
+    asyncio.run(runner())
 
-    assert len(recorded) == 2
-    for entity_id, (_, kwargs, _) in zip(entities, recorded):
-        assert kwargs["entity_id"] == entity_id
+    assert synced == [{"light.kitchen": {"state": "on", "attributes": {}}}]
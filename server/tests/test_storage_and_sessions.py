@@ -1,3 +1,9 @@
+import json
+import threading
+
+import pytest
+
+from storage.backends import SQLiteBackend
 from storage.session_manager import SessionManager
 from storage.storage_manager import Storage
 
@@ -27,6 +33,65 @@ def test_storage_handles_text_and_namespaces(tmp_path):
     assert (tmp_path / "child" / "hello.txt").exists()
 
 
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    store = Storage(tmp_path)
+    store.write_json("sessions.json", {"sessions": [1]})
+
+    with pytest.raises(TypeError):
+        store.write_json("sessions.json", {"sessions": object()})
+
+    assert store.read_json("sessions.json") == {"sessions": [1]}
+    assert [p.name for p in tmp_path.iterdir()] == ["sessions.json"]
+
+
+def test_coalesced_writes_flush_once_in_compact_json(tmp_path, monkeypatch):
+    store = Storage(tmp_path, indent=None, coalesce=60)
+    flushed = []
+    write_many = store.backend.write_many
+    monkeypatch.setattr(
+        store.backend,
+        "write_many",
+        lambda items: flushed.append(list(items)) or write_many(items),
+    )
+
+    for n in range(5):
+        store.write_json("timers.json", {"n": n})
+    assert store.read_json("timers.json") == {"n": 4}  # served before flushing
+    assert not (tmp_path / "timers.json").exists()
+    store.flush()
+
+    assert flushed == [["timers.json"]]
+    assert (tmp_path / "timers.json").read_text() == '{"n":4}'
+    child = store.namespace("child", coalesce=0)
+    child.write_json("a.json", [1, 2])
+    assert json.loads((tmp_path / "child" / "a.json").read_text()) == [1, 2]
+
+
+def test_delete_during_a_flush_stays_deleted(tmp_path, monkeypatch):
+    store = Storage(tmp_path, indent=None, coalesce=60)
+    writing, release = threading.Event(), threading.Event()
+    write_many = store.backend.write_many
+
+    def slow_write_many(items):
+        writing.set()
+        release.wait(2)
+        write_many(items)
+
+    monkeypatch.setattr(store.backend, "write_many", slow_write_many)
+    store.write_json("outbox.json", [1])
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    assert writing.wait(2)
+    deleter = threading.Thread(target=store.delete, args=("outbox.json",))
+    deleter.start()
+    release.set()
+    flusher.join()
+    deleter.join()
+
+    assert not (tmp_path / "outbox.json").exists()
+    assert store.read_bytes("outbox.json") is None
+
+
 def test_session_manager_cleans_and_persists(tmp_path):
     store = Storage(tmp_path)
     sessions_file = "sessions.json"
@@ -51,3 +116,46 @@ def test_session_manager_adds_sessions_once(tmp_path):
     assert manager.list_sessions() == [3]
     assert store.read_json("other.json")["sessions"] == [3]
     assert manager.get_free_session_id() == 4
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    backend = SQLiteBackend(tmp_path / "storage.db")
+    yield Storage(tmp_path, backend=backend)
+    backend.close()
+
+
+def test_sqlite_backend_keeps_namespaces_in_one_file(tmp_path, sqlite_store):
+    sqlite_store.write_json("sessions.json", {"sessions": [1]})
+    devices = sqlite_store.namespace("devices")
+    devices.write_json("1.json", {"screen": "ac_screen"})
+    devices.write_text("2.txt", "hi")
+
+    assert devices.read_json("1.json") == {"screen": "ac_screen"}
+    assert devices.list() == ["1.json", "2.txt"]
+    assert sqlite_store.list() == ["devices/1.json", "devices/2.txt", "sessions.json"]
+    assert not (tmp_path / "sessions.json").exists()
+    devices.delete("2.txt")
+    assert devices.list() == ["1.json"]
+
+
+def test_transactions_commit_together_or_not_at_all(sqlite_store):
+    with sqlite_store.transaction():
+        sqlite_store.write_json("a.json", 1)
+        sqlite_store.write_json("b.json", 2)
+        assert sqlite_store.read_json("a.json") == 1  # visible inside
+        assert sqlite_store.backend.read("a.json") is None
+    assert sqlite_store.read_json("b.json") == 2
+
+    with pytest.raises(RuntimeError):
+        with sqlite_store.transaction():
+            sqlite_store.write_json("a.json", 10)
+            raise RuntimeError("abort")
+    assert sqlite_store.read_json("a.json") == 1
+
+
+def test_session_manager_on_sqlite(sqlite_store):
+    manager = SessionManager()
+    manager.init(store=sqlite_store)
+
+    assert sqlite_store.read_json("sessions.json") == {"sessions": []}
@@ -1,6 +1,7 @@
 import yaml
 import pytest
 
+from models.models import Screen
 from storage.template_manager import TemplateError, TemplateManager
 
 
@@ -52,3 +53,15 @@ def test_invalid_template_structure_raises(tmp_path, reset_template_manager):
 
     with pytest.raises(TemplateError):
         reset_template_manager.init(path)
+
+
+def test_templates_index_fields_and_screens(tmp_path, reset_template_manager):
+    path = tmp_path / "templates.yaml"
+    path.write_text(yaml.safe_dump(_valid_templates()))
+
+    config = reset_template_manager.init(path)
+    screen = Screen(id="s", template="card", state_bindings={})
+
+    assert config.template_for(screen) is config.templates[0]
+    assert config.fields_of("card")["action"].callback == "cb"
+    assert dict(config.fields_of("missing")) == {}
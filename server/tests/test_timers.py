@@ -0,0 +1,131 @@
+import asyncio
+
+from models.models import FullConfig
+from state_scheduler.timer_modules import DEADLINES_FILE, TimerService
+from state_scheduler.timing_wheel import TimingWheel
+from storage.storage_manager import Storage
+
+
+def _config(granularity=0.05):
+    return FullConfig(
+        screens=[],
+        internal_states={
+            "states": [
+                {"name": "countdown", "definition": {"type": "number", "default": 0}}
+            ]
+        },
+        actions={"actions": []},
+        modules=[
+            {
+                "id": "timer",
+                "timer": {
+                    "callback": "timer_up",
+                    "time_state": "countdown",
+                    "granularity": granularity,
+                },
+            }
+        ],
+    )
+
+
+def test_wheel_fires_each_timer_on_its_tick_across_levels():
+    wheel = TimingWheel(bits=2, levels=3)
+    fired = []
+    for delay in (1, 3, 4, 5, 17, 63, 64, 200):
+        wheel.arm(delay, lambda delay=delay: fired.append((delay, wheel.now)))
+
+    wheel.advance(300)
+
+    # a timer armed with `delay` fires while the wheel processes tick delay - 1
+    assert fired == [(d, d) for d in (1, 3, 4, 5, 17, 63, 64, 200)]
+    assert len(wheel) == 0
+
+
+def test_wheel_cancel_removes_the_timer():
+    wheel = TimingWheel(bits=2, levels=2)
+    fired = []
+    keep = wheel.arm(10, lambda: fired.append("keep"))
+    drop = wheel.arm(10, lambda: fired.append("drop"))
+
+    assert wheel.cancel(drop)
+    assert not wheel.cancel(drop)
+    wheel.advance(20)
+
+    assert fired == ["keep"]
+    assert not wheel.cancel(keep)
+
+
+def _countdown(seconds):
+    return (
+        _config().internal_states.by_name["countdown"].to_stored_internal_state(seconds)
+    )
+
+
+def test_countdown_updates_state_and_fires_callback(state_handler, tmp_path):
+    fired = []
+    written = []
+
+    async def fire(callback_id):
+        fired.append(callback_id)
+
+    service = TimerService(fire, store=Storage(tmp_path / "timers"), tick=0.01)
+    service.configure(_config(granularity=0.05))
+    state_handler.add_listener(lambda states: written.extend(s.value for s in states))
+
+    async def runner():
+        service.attach(asyncio.get_running_loop())
+        service._on_time_state(_countdown(0.15))
+        assert Storage(tmp_path / "timers").read_json(DEADLINES_FILE)["timer"] > 0
+        await asyncio.sleep(0.3)
+
+    asyncio.run(runner())
+
+    assert fired == ["timer_up"]
+    assert written == [0.1, 0.05, 0]
+    assert Storage(tmp_path / "timers").read_json(DEADLINES_FILE) == {}
+
+
+def test_deadlines_are_restored_after_restart(state_handler, tmp_path):
+    fired = []
+
+    async def fire(callback_id):
+        fired.append(callback_id)
+
+    store = Storage(tmp_path / "timers")
+    store.write_json(DEADLINES_FILE, {"timer": 1000.05, "removed_module": 900.0})
+    service = TimerService(fire, store=store, tick=0.01, wall=lambda: 1000.0)
+    service.configure(_config(granularity=1.0))
+
+    async def runner():
+        service.attach(asyncio.get_running_loop())
+        service.restore()
+        assert set(store.read_json(DEADLINES_FILE)) == {"timer"}
+        await asyncio.sleep(0.15)
+
+    asyncio.run(runner())
+
+    assert fired == ["timer_up"]
+
+
+def test_writing_the_shown_value_restarts_the_countdown(state_handler, tmp_path):
+    async def fire(callback_id):
+        pass
+
+    service = TimerService(fire, store=Storage(tmp_path / "timers"), tick=0.01)
+    service.configure(_config(granularity=0.05))
+    state_handler.add_listener(service.on_states_changed)
+
+    async def runner():
+        service.attach(asyncio.get_running_loop())
+        service._on_time_state(_countdown(0.15))
+        await asyncio.sleep(0.07)  # the service has written 0.1 and seen it back
+        assert service._own == {}
+        deadline = service._running["timer"].deadline
+        service._on_time_state(_countdown(0.1))
+        restarted = service._running["timer"].deadline
+        service.cancel("timer")
+        return deadline, restarted
+
+    deadline, restarted = asyncio.run(runner())
+
+    assert restarted > deadline
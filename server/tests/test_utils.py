@@ -8,7 +8,13 @@ from models.models import (
     InternalState,
     NumberState,
 )
-from utils.utils import AsyncLoopBase, is_json, set_value_by_string, singleton
+from utils.utils import (
+    AsyncLoopBase,
+    is_json,
+    log_task_failure,
+    set_value_by_string,
+    singleton,
+)
 
 
 def test_is_json_handles_valid_and_invalid_strings():
@@ -77,3 +83,23 @@ def test_async_loop_base_runs_iterations(monkeypatch):
     iterations = asyncio.run(runner())
 
     assert iterations >= 1
+
+
+def test_log_task_failure_logs_only_failed_tasks(caplog):
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        pass
+
+    async def runner():
+        for coro in (fail(), succeed()):
+            task = asyncio.ensure_future(coro)
+            task.add_done_callback(log_task_failure("Task failed"))
+            await asyncio.wait([task])
+        await asyncio.sleep(0)
+
+    asyncio.run(runner())
+
+    assert [record.message for record in caplog.records] == ["Task failed"]
+    assert caplog.records[0].exc_info[1].args == ("boom",)
@@ -0,0 +1,271 @@
+"""
+Small expression language for values computed from internal states, e.g.
+`update_state` values written as `"{not fan}"` or `"{clamp(temp + 1, 16, 30)}"`.
+
+- literals: numbers, `'text'`/`"text"`, `true`, `false`
+- state references by name
+- `not`, `and`, `or`, comparisons (`== != < > <= >=`), `+ - * / %`
+- functions: clamp, min, max, avg, any, all, abs, round
+
+Expressions are parsed once into nested closures and cached by source, so
+evaluating one is a plain function call over a mapping of state values.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+type Values = Mapping[str, Any]
+type Evaluator = Callable[[Values], Any]
+
+
+class ExpressionError(ValueError):
+    """Raised for expressions that cannot be parsed."""
+
+
+def truthy(value: Any) -> bool:
+    """Truthiness that understands the on/off strings of enum and HA states."""
+    if isinstance(value, str):
+        return value.lower() not in ("", "off", "false", "0")
+    return bool(value)
+
+
+def _avg(*values):
+    if not values:
+        raise ValueError("avg() needs at least one value")
+    return sum(values) / len(values)
+
+
+def _clamp(value, low, high):
+    return min(max(value, low), high)
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "clamp": _clamp,
+    "min": min,
+    "max": max,
+    "avg": _avg,
+    "any": lambda *values: any(truthy(v) for v in values),
+    "all": lambda *values: all(truthy(v) for v in values),
+    "abs": abs,
+    "round": round,
+}
+
+# `and` and `or` get their right operand as a thunk, so they short-circuit
+LAZY = {"and", "or"}
+BINARY: Dict[str, Tuple[int, Callable[[Any, Any], Any]]] = {
+    "or": (1, lambda a, b: truthy(a) or truthy(b())),
+    "and": (2, lambda a, b: truthy(a) and truthy(b())),
+    "==": (4, lambda a, b: a == b),
+    "!=": (4, lambda a, b: a != b),
+    "<": (4, lambda a, b: a < b),
+    ">": (4, lambda a, b: a > b),
+    "<=": (4, lambda a, b: a <= b),
+    ">=": (4, lambda a, b: a >= b),
+    "+": (5, lambda a, b: a + b),
+    "-": (5, lambda a, b: a - b),
+    "*": (6, lambda a, b: a * b),
+    "/": (6, lambda a, b: a / b),
+    "%": (6, lambda a, b: a % b),
+}
+NOT_POWER = 3
+UNARY_POWER = 7
+
+KEYWORDS = {"true": True, "false": False}
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<number>\d+\.?\d*|\.\d+)
+      | (?P<string>"[^"]*"|'[^']*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>==|!=|<=|>=|[-+*/%<>(),])
+    )""",
+    re.VERBOSE,
+)
+
+type Token = Tuple[str, str]  # (kind, text)
+
+
+def _tokenize(source: str) -> List[Token]:
+    tokens: List[Token] = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = _TOKEN.match(source, pos)
+        if match is None or match.end() == pos:
+            raise ExpressionError(f"Unexpected character at {pos} in '{source}'")
+        kind = match.lastgroup
+        assert kind
+        text = match.group(kind)
+        if kind == "name" and text in ("and", "or", "not"):
+            kind = "op"
+        tokens.append((kind, text))
+        pos = match.end()
+    tokens.append(("end", ""))
+    return tokens
+
+
+class Expression:
+    __slots__ = ("source", "deps", "_evaluate", "constant")
+
+    def __init__(
+        self, source: str, evaluate: Evaluator, deps: FrozenSet[str], constant: bool
+    ):
+        self.source = source
+        self.deps = deps  # state names the expression reads
+        self._evaluate = evaluate
+        self.constant = constant
+
+    def __call__(self, values: Values) -> Any:
+        return self._evaluate(values)
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+class _Node:
+    """A compiled sub-expression: its evaluator and whether it is constant."""
+
+    __slots__ = ("evaluate", "constant")
+
+    def __init__(self, evaluate: Evaluator, constant: bool = False):
+        self.evaluate = evaluate
+        self.constant = constant
+
+
+def _const(value: Any) -> _Node:
+    return _Node(lambda values: value, constant=True)
+
+
+def _fold(node: _Node) -> _Node:
+    """Evaluate constant sub-trees once, at compile time."""
+    if not node.constant:
+        return node
+    try:
+        return _const(node.evaluate({}))
+    except Exception as exc:
+        raise ExpressionError(f"Invalid constant expression: {exc}") from exc
+
+
+class _Parser:
+    """Pratt parser compiling straight to closures."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.deps: set = set()
+
+    def peek(self) -> Token:
+        return self.tokens[self.pos]
+
+    def next(self) -> Token:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, text: str) -> None:
+        kind, found = self.next()
+        if found != text:
+            raise ExpressionError(
+                f"Expected '{text}' but found '{found or 'end'}' in '{self.source}'"
+            )
+
+    def parse(self) -> _Node:
+        node = self.expression(0)
+        if self.peek()[0] != "end":
+            raise ExpressionError(f"Unexpected '{self.peek()[1]}' in '{self.source}'")
+        return node
+
+    def expression(self, min_power: int) -> _Node:
+        left = self.prefix()
+        while True:
+            kind, text = self.peek()
+            if kind != "op" or text not in BINARY:
+                return left
+            power, op = BINARY[text]
+            if power <= min_power:
+                return left
+            self.next()
+            right = self.expression(power)
+            left = self.binary(text, op, left, right)
+
+    @staticmethod
+    def binary(
+        text: str, op: Callable[[Any, Any], Any], left: _Node, right: _Node
+    ) -> _Node:
+        lhs, rhs = left.evaluate, right.evaluate
+        if text in LAZY:
+
+            def evaluate(values: Values) -> Any:
+                return op(lhs(values), lambda: rhs(values))
+        else:
+
+            def evaluate(values: Values) -> Any:
+                return op(lhs(values), rhs(values))
+
+        return _fold(_Node(evaluate, left.constant and right.constant))
+
+    def prefix(self) -> _Node:
+        kind, text = self.next()
+        if kind == "number":
+            return _const(float(text) if "." in text else int(text))
+        if kind == "string":
+            return _const(text[1:-1])
+        if kind == "name":
+            if text in KEYWORDS:
+                return _const(KEYWORDS[text])
+            if self.peek()[1] == "(":
+                return self.call(text)
+            self.deps.add(text)
+            return _Node(lambda values: values[text])
+        if text == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if text == "not":
+            operand = self.expression(NOT_POWER)
+            inner = operand.evaluate
+            return _fold(
+                _Node(lambda values: not truthy(inner(values)), operand.constant)
+            )
+        if text in ("-", "+"):
+            operand = self.expression(UNARY_POWER)
+            inner = operand.evaluate
+            sign = -1 if text == "-" else 1
+            return _fold(_Node(lambda values: sign * inner(values), operand.constant))
+        raise ExpressionError(f"Unexpected '{text or 'end'}' in '{self.source}'")
+
+    def call(self, name: str) -> _Node:
+        func = FUNCTIONS.get(name)
+        if func is None:
+            raise ExpressionError(f"Unknown function '{name}' in '{self.source}'")
+        self.expect("(")
+        args: List[_Node] = []
+        if self.peek()[1] != ")":
+            args.append(self.expression(0))
+            while self.peek()[1] == ",":
+                self.next()
+                args.append(self.expression(0))
+        self.expect(")")
+        evaluators = tuple(arg.evaluate for arg in args)
+        return _fold(
+            _Node(
+                lambda values: func(*(arg(values) for arg in evaluators)),
+                all(arg.constant for arg in args),
+            )
+        )
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Expression:
+    parser = _Parser(source)
+    node = parser.parse()
+    return Expression(source, node.evaluate, frozenset(parser.deps), node.constant)
+
+
+def as_expression(value: Any) -> Optional[Expression]:
+    """Compile `"{...}"` values; anything else is a literal and returns None."""
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}"):
+        return compile_expression(value[1:-1])
+    return None
@@ -0,0 +1,111 @@
+import copy
+import json
+from typing import Any, Dict, List
+
+type Operation = Dict[str, Any]
+
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply to a document."""
+
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+def make_patch(old: Any, new: Any) -> List[Operation]:
+    """
+    RFC 6902 operations turning `old` into `new` (both JSON-compatible).
+
+    Objects are diffed key by key and lists position by position. A list
+    whose patch would be larger than the list itself is replaced whole.
+    """
+    ops: List[Operation] = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: List[Operation]) -> None:
+    if old == new and type(old) is type(new):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key in old:
+                _diff(old[key], value, child, ops)
+            else:
+                ops.append({"op": "add", "path": child, "value": value})
+    elif isinstance(old, list) and isinstance(new, list):
+        list_ops: List[Operation] = []
+        for index in range(min(len(old), len(new))):
+            _diff(old[index], new[index], f"{path}/{index}", list_ops)
+        # remove from the back so earlier indexes stay valid
+        for index in range(len(old) - 1, len(new) - 1, -1):
+            list_ops.append({"op": "remove", "path": f"{path}/{index}"})
+        for value in new[len(old) :]:
+            list_ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        if _size(list_ops) < _size(new):
+            ops.extend(list_ops)
+        else:
+            ops.append({"op": "replace", "path": path, "value": new})
+    else:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def _parent(doc: Any, path: str) -> tuple[Any, str]:
+    if not path.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer {path!r}")
+    tokens = [_unescape(token) for token in path[1:].split("/")]
+    target = doc
+    for token in tokens[:-1]:
+        try:
+            target = target[int(token) if isinstance(target, list) else token]
+        except (KeyError, IndexError, ValueError, TypeError) as exc:
+            raise PatchError(f"Path {path!r} does not exist") from exc
+    return target, tokens[-1]
+
+
+def apply_patch(doc: Any, ops: List[Operation]) -> Any:
+    """Apply `add`, `remove` and `replace` operations to a copy of `doc`."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        kind, path = op["op"], op["path"]
+        if path == "":
+            if kind not in ("add", "replace"):
+                raise PatchError(f"Cannot {kind} the whole document")
+            doc = copy.deepcopy(op["value"])
+            continue
+        parent, token = _parent(doc, path)
+        try:
+            if isinstance(parent, list):
+                index = len(parent) if token == "-" else int(token)
+                if kind == "add":
+                    parent.insert(index, copy.deepcopy(op["value"]))
+                elif kind == "remove":
+                    del parent[index]
+                elif kind == "replace":
+                    parent[index] = copy.deepcopy(op["value"])
+                else:
+                    raise PatchError(f"Unsupported operation {kind!r}")
+            elif kind in ("add", "replace"):
+                if kind == "replace" and token not in parent:
+                    raise KeyError(token)
+                parent[token] = copy.deepcopy(op["value"])
+            elif kind == "remove":
+                del parent[token]
+            else:
+                raise PatchError(f"Unsupported operation {kind!r}")
+        except (KeyError, IndexError, ValueError, TypeError) as exc:
+            raise PatchError(f"Cannot {kind} {path!r}") from exc
+    return doc
@@ -1,6 +1,7 @@
 import json
 import asyncio
-from typing import Literal
+import logging
+from typing import Callable, Literal
 
 from models.models import InternalState, StoredInternalState
 
@@ -53,6 +54,16 @@ def set_value_by_string(value: str, state: InternalState) -> StoredInternalState
     return state.to_stored_internal_state()
 
 
+def log_task_failure(message: str) -> Callable[[asyncio.Future], None]:
+    """A task done-callback that logs `message` with the task's exception."""
+
+    def callback(task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(message, exc_info=task.exception())
+
+    return callback
+
+
 class AsyncLoopBase:
     def __init__(self, interval):
         self.interval = interval
@@ -63,13 +74,13 @@ class AsyncLoopBase:
         raise NotImplementedError
 
     async def _runner(self):
-        try:
-            while not self._stop.is_set():
-                # run sync code in a thread
-                await asyncio.to_thread(self.on_iteration)
+        while not self._stop.is_set():
+            # run sync code in a thread
+            await asyncio.to_thread(self.on_iteration)
+            try:
                 await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
-        except asyncio.TimeoutError:
-            pass
+            except asyncio.TimeoutError:
+                pass
 
     def start(self):
         if self._task is None: